@@ -63,7 +63,7 @@ mal_xml_status_ids() {
 	local st mtype
 	st="${1:-Watching}"
 	mtype="${2:-anime}"
-	malexport parse xml "${MALEXPORT_DIR}/${MAL_USERNAME}"/"${mtype}"list.xml | jq "$(printf '.entries | .[] | select(.status == "%s")' "$st")" -r | jq ".${mtype}_id" | sort
+	malexport parse xml -s "${MALEXPORT_DIR}/${MAL_USERNAME}"/"${mtype}"list.xml.gz | jq "$(printf 'select(.status == "%s")' "$st")" -r | jq ".${mtype}_id" | sort
 }
 
 # e.g. mal_status Dropped | mal_filter_unscored | mal_describe
@@ -1,7 +1,8 @@
 import os
 import sys
 from pathlib import Path
-from typing import Callable, Optional, Any, Literal, List
+from datetime import datetime
+from typing import Callable, Optional, Any, Literal, List, Iterable
 
 import click
 
@@ -43,6 +44,86 @@ STREAM = click.option(
 )
 
 
+SINCE = click.option(
+    "--since",
+    type=click.DateTime(),
+    default=None,
+    help="Only include history on or after this date",
+)
+
+UNTIL = click.option(
+    "--until",
+    type=click.DateTime(),
+    default=None,
+    help="Only include history before this date",
+)
+
+HISTORY_TYPE = click.option(
+    "--type",
+    "_type",
+    type=click.Choice(["anime", "manga"], case_sensitive=False),
+    default=None,
+    help="Only include anime or manga history",
+)
+
+HISTORY_ID = click.option(
+    "--id",
+    "mal_id",
+    type=int,
+    default=None,
+    help="Only include history for this MAL ID",
+)
+
+# same as exporter.account.SOURCES
+SOURCES = click.option(
+    "-s",
+    "--source",
+    "sources",
+    multiple=True,
+    type=click.Choice(
+        ["lists", "api-lists", "export", "history", "forum", "friends", "messages"]
+    ),
+    help="Only update these sources, can be passed multiple times (default: all)",
+)
+
+DRIVER_TYPE = click.option(
+    "--driver-type",
+    default="chrome",
+    type=click.Choice(["chrome", "firefox"]),
+    help="whether to use chromedriver/geckodriver as the selenium browser",
+)
+
+USE_MERGED_FILE = click.option(
+    "--use-merged-file",
+    default=False,
+    is_flag=True,
+    envvar="MALEXPORT_USE_MERGED_FILE",
+    help="use a single merged JSON file instead of storing history data in individual files",
+)
+
+
+def _parse_time_budget(
+    ctx: click.Context, param: click.Parameter, value: Optional[str]
+) -> Optional[int]:
+    from .common import parse_interval
+
+    if value is None:
+        return None
+    try:
+        return parse_interval(value)
+    except ValueError:
+        raise click.BadParameter(f"Could not parse {value}, use e.g. 3600, 30m or 2h")
+
+
+TIME_BUDGET = click.option(
+    "--time-budget",
+    "time_budget",
+    default=None,
+    callback=_parse_time_budget,
+    help="Stop after this long (e.g. 30m or 2h), requesting the most important things first. What's left is saved and requested first next time",
+)
+
+
 def apply_shared(*chosen: Any) -> Any:
     """
     Decorator to apply the username argument
@@ -56,11 +137,39 @@ def apply_shared(*chosen: Any) -> Any:
     return _add_options
 
 
+def echo_items(items: Iterable[Any], stream: bool) -> None:
+    """
+    Serialize items to STDOUT as they're generated,
+    either as JSON lines or as one JSON array
+    """
+    from .common import write_jsonl, write_json_array
+
+    if stream:
+        write_jsonl(items, sys.stdout)
+    else:
+        write_json_array(items, sys.stdout)
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+
+
 @main.group()
 def update() -> None:
     """
     update data for an account
     """
+    import atexit
+    from .common import WRITE_STATS, default_http_cache
+    from .log import logger
+
+    def _report_writes() -> None:
+        if WRITE_STATS.written > 0 or WRITE_STATS.unchanged > 0:
+            logger.info(f"Finished updating, {WRITE_STATS}")
+        cache = default_http_cache()
+        if cache is not None and cache.stats.total > 0:
+            logger.info(f"HTTP cache: {cache.stats}")
+
+    # registered before anything else, so this runs after any files written when exiting
+    atexit.register(_report_writes)
 
 
 @update.command(name="all", short_help="update all data")
@@ -94,7 +203,7 @@ def _lists_update(only: str, username: str) -> None:
 
 
 @update.command(name="messages", short_help="update messages (DMs)")
-@apply_shared(USERNAME)
+@apply_shared(USERNAME, TIME_BUDGET)
 @click.option(
     "--thread-count",
     type=int,
@@ -105,12 +214,17 @@ def _lists_update(only: str, username: str) -> None:
     "--start-page", type=int, default=1, help="which page to start requesting from"
 )
 def _messages_update(
-    username: str, start_page: int, thread_count: Optional[int] = None
+    username: str,
+    start_page: int,
+    time_budget: Optional[int],
+    thread_count: Optional[int] = None,
 ) -> None:
     from .exporter import Account
 
     acc = Account.from_username(username)
-    acc.update_messages(start_page=start_page, thread_count=thread_count)
+    acc.update_messages(
+        start_page=start_page, thread_count=thread_count, time_budget=time_budget
+    )
 
 
 @update.command(
@@ -146,25 +260,14 @@ def _export(username: str) -> None:
     type=int,
     help="Only request the first 'count' entries in the users episode history",
 )
-@click.option(
-    "--driver-type",
-    default="chrome",
-    type=click.Choice(["chrome", "firefox"]),
-    help="whether to use chromedriver/geckodriver as the selenium browser",
-)
-@click.option(
-    "--use-merged-file",
-    default=False,
-    is_flag=True,
-    envvar="MALEXPORT_USE_MERGED_FILE",
-    help="use a single merged JSON file instead of storing history data in individual files",
-)
+@apply_shared(DRIVER_TYPE, USE_MERGED_FILE, TIME_BUDGET)
 def _history(
     username: str,
     only: Optional[str],
     driver_type: str,
     count: Optional[int],
     use_merged_file: bool,
+    time_budget: Optional[int],
 ) -> None:
     from .exporter import Account
 
@@ -177,6 +280,7 @@ def _history(
         count=count,
         driver_type=driver_type,
         use_merged_file=use_merged_file,
+        time_budget=time_budget,
     )
 
 
@@ -198,19 +302,153 @@ def _friends(username: str) -> None:
     acc.update_friends()
 
 
+@update.command(name="batch", short_help="update multiple accounts")
+@click.option(
+    "-u",
+    "--username",
+    "usernames",
+    multiple=True,
+    required=True,
+    envvar="MAL_USERNAME",
+    help="Accounts to update, can be passed multiple times",
+)
+@apply_shared(SOURCES, DRIVER_TYPE, USE_MERGED_FILE)
+def _batch(
+    usernames: List[str],
+    sources: List[str],
+    driver_type: str,
+    use_merged_file: bool,
+) -> None:
+    """
+    Update multiple accounts in one process. Requests for all accounts
+    share one connection pool and are paced together (MAL rate limits per IP),
+    and one browser is shared, logging in to each account in turn
+
+    Sources which don't need the browser run for each account in turn,
+    then the browser sources (export, history, messages) run for one
+    account at a time, so each account is only logged in to once.
+    If updating an account fails, the other accounts are still updated,
+    and this exits with status 1 after printing which failed
+    """
+    from .batch import update_accounts
+
+    results = update_accounts(
+        usernames,
+        sources=sources or None,
+        driver_type=driver_type,
+        use_merged_file=use_merged_file,
+    )
+    failed = [r for r in results if r.error is not None]
+    for r in failed:
+        click.echo(f"Failed to update {r.source} for {r.username}: {r.error}", err=True)
+    if failed:
+        sys.exit(1)
+
+
+@main.group(name="daemon")
+def daemon() -> None:
+    """
+    keep running, updating each source on a schedule
+    """
+
+
+@daemon.command(name="run", short_help="run the daemon for an account")
+@apply_shared(USERNAME, SOURCES, DRIVER_TYPE, USE_MERGED_FILE)
+@click.option(
+    "-e",
+    "--every",
+    "every",
+    multiple=True,
+    metavar="SOURCE=INTERVAL",
+    help="Change how often a source is updated, e.g. lists=30m or history=1d",
+)
+def _daemon_run(
+    username: str,
+    sources: List[str],
+    every: List[str],
+    driver_type: str,
+    use_merged_file: bool,
+) -> None:
+    """
+    Updates each source on its own interval, keeping the API session
+    and the logged in browser between runs. If this was run before,
+    each source is scheduled from when it last finished
+
+    Default intervals: lists 1h, api-lists/history/forum 6h,
+    messages 12h, export/friends 1d
+    """
+    from .daemon import Daemon, DEFAULT_INTERVALS
+    from .common import parse_interval
+    from .paths import LocalDir
+
+    intervals = {
+        name: interval
+        for name, interval in DEFAULT_INTERVALS.items()
+        if not sources or name in sources
+    }
+    for ev in every:
+        name, _, value = ev.partition("=")
+        if name not in intervals:
+            raise click.BadParameter(
+                f"{name} is not one of {list(intervals)}", param_hint="--every"
+            )
+        try:
+            intervals[name] = parse_interval(value)
+        except ValueError:
+            raise click.BadParameter(
+                f"Could not parse interval {value}", param_hint="--every"
+            )
+    Daemon(
+        LocalDir.from_username(username),
+        intervals,
+        driver_type=driver_type,
+        use_merged_file=use_merged_file,
+    ).run_forever()
+
+
+@daemon.command(name="status", short_help="print the daemon status")
+@apply_shared(USERNAME)
+def _daemon_status(username: str) -> None:
+    """
+    Prints the status the daemon for this account last wrote:
+    what its running, and when each source last ran/runs next.
+    Exits with status 1 if the daemon isn't running
+    """
+    from .daemon import read_status, status_path, describe_status
+    from .common import serialize
+
+    status = read_status(status_path(username))
+    if status is None:
+        click.echo(f"The daemon hasn't run for {username}", err=True)
+        sys.exit(1)
+    described = describe_status(status)
+    click.echo(serialize(described))
+    if not described["alive"]:
+        sys.exit(1)
+
+
 @main.group(name="parse")
 def parse() -> None:
     """parse the resulting exported files"""
 
 
 @parse.command(name="xml", short_help="parse the XML export files")
+@apply_shared(STREAM)
 @click.argument("XML_FILE", type=click.Path(exists=True))
-def _xml(xml_file: str) -> None:
+def _xml(xml_file: str, stream: bool) -> None:
+    """
+    If --stream is passed, this prints each entry as it is parsed
+    instead of an object with the 'info' and 'entries'
+    """
     from .parse import parse_xml
+    from .parse.xml import iter_xml_entries
     from .common import serialize
 
-    xml_data = parse_xml(xml_file)
-    click.echo(serialize(xml_data))
+    if stream:
+        echo_items(iter_xml_entries(xml_file), stream=True)
+    else:
+        xml_data = parse_xml(xml_file)
+        click.echo(serialize(xml_data))
 
 
 @parse.command(name="list", short_help="parse the list file")
@@ -225,7 +463,6 @@ def _xml(xml_file: str) -> None:
 @click.argument("LIST_FILE", type=click.Path(exists=True))
 def _list_parse(_type: Optional[str], list_file: str, stream: bool) -> None:
     from .parse import parse_list
-    from .common import serialize
 
     chosen_type: ListType
     if _type is not None:
@@ -235,14 +472,7 @@ def _list_parse(_type: Optional[str], list_file: str, stream: bool) -> None:
         chosen_type = (
             ListType.ANIME if "anime" in os.path.basename(list_file) else ListType.MANGA
         )
-    idata = parse_list(list_file, list_type=chosen_type)
-    if stream:
-        for i in idata:
-            sys.stdout.write(serialize(i))
-            sys.stdout.write("\n")
-        sys.stdout.flush()
-    else:
-        click.echo(serialize(list(idata)))
+    echo_items(parse_list(list_file, list_type=chosen_type), stream=stream)
 
 
 @parse.command(name="api-list", short_help="parse the API list file")
@@ -257,7 +487,6 @@ def _list_parse(_type: Optional[str], list_file: str, stream: bool) -> None:
 @click.argument("API_LIST_FILE", type=click.Path(exists=True))
 def _api_list_file(_type: Optional[str], api_list_file: str, stream: bool) -> None:
     from .parse import iter_api_list
-    from .common import serialize
 
     chosen_type: ListType
     if _type is not None:
@@ -269,27 +498,19 @@ def _api_list_file(_type: Optional[str], api_list_file: str, stream: bool) -> No
             if "anime" in os.path.basename(api_list_file)
             else ListType.MANGA
         )
-    idata = iter_api_list(api_list_file, list_type=chosen_type)
-    if stream:
-        for i in idata:
-            sys.stdout.write(serialize(i))
-            sys.stdout.write("\n")
-        sys.stdout.flush()
-    else:
-        click.echo(serialize(list(idata)))
+    echo_items(iter_api_list(api_list_file, list_type=chosen_type), stream=stream)
 
 
 @parse.command(name="forum", short_help="extract forum posts by your user")
-@apply_shared(USERNAME)
-def _forum_parse(username: str) -> None:
+@apply_shared(USERNAME, STREAM)
+def _forum_parse(username: str, stream: bool) -> None:
     from .parse import iter_forum_posts
-    from .common import serialize
 
-    click.echo(serialize(list(iter_forum_posts(username))))
+    echo_items(iter_forum_posts(username), stream=stream)
 
 
 @parse.command(name="manual-history", short_help="parse manually entered user history")
-@apply_shared(USERNAME)
+@apply_shared(USERNAME, SINCE, UNTIL, HISTORY_TYPE, HISTORY_ID)
 @click.option(
     "-o",
     "--output",
@@ -298,9 +519,14 @@ def _forum_parse(username: str) -> None:
     default="json",
 )
 def _manual_history_parse(
-    username: str, output: Literal["json", "jsonl", "markdown"]
+    username: str,
+    output: Literal["json", "jsonl", "markdown"],
+    since: Optional[datetime],
+    until: Optional[datetime],
+    _type: Optional[str],
+    mal_id: Optional[int],
 ) -> None:
-    from .parse.history import parse_manual_history, History
+    from .parse.history import parse_manual_history, History, filter_histories
     from .paths import LocalDir
     from .common import serialize
 
@@ -308,9 +534,19 @@ def _manual_history_parse(
     data: List[History] = list(
         parse_manual_history(localdir.data_dir / "manual_history.yaml")
     )
+    if any(f is not None for f in (since, until, _type, mal_id)):
+        data = list(
+            filter_histories(
+                data,
+                since=since,
+                until=until,
+                list_type=_type.lower() if _type else None,
+                mal_id=mal_id,
+            )
+        )
 
     if output == "json":
-        click.echo(serialize(data))
+        echo_items(data, stream=False)
     elif output == "jsonl":
         for hist in data:
             for ent in hist.entries:
@@ -326,8 +562,6 @@ def _manual_history_parse(
                 )
 
     else:
-        from datetime import datetime
-
         items = []
         for hist in data:
             for ent in hist.entries:
@@ -345,51 +579,88 @@ def _manual_history_parse(
 @parse.command(
     name="combine", short_help="combines lists, api-lists, xml and history data"
 )
-@apply_shared(USERNAME, ONLY)
-def _combine_parse(only: Optional[str], username: str) -> None:
+@apply_shared(USERNAME, ONLY, STREAM)
+def _combine_parse(only: Optional[str], username: str, stream: bool) -> None:
     """
     This combines relevant info from the lists, xml and history files
     It removes some of the commonly unused fields, and uses the xml for rewatch info/better dates
 
     It doesn't require you have a list export
+
+    If --stream is passed, this prints each anime/manga entry on its own line.
+    Unless --only is passed, each line has a 'type' key ('anime' or 'manga')
     """
+    import itertools
     from .parse.combine import combine
-    from .common import serialize
+    from .common import write_json_array, JSON_SEPARATORS
 
     anime, manga = combine(username)
     if only == "anime":
-        click.echo(serialize(anime))
+        echo_items(anime, stream=stream)
     elif only == "manga":
-        click.echo(serialize(manga))
+        echo_items(manga, stream=stream)
+    elif stream:
+        echo_items(
+            itertools.chain(
+                ({"type": "anime", **a._asdict()} for a in anime),
+                ({"type": "manga", **m._asdict()} for m in manga),
+            ),
+            stream=True,
+        )
     else:
-        click.echo(serialize({"anime": anime, "manga": manga}))
+        item_sep, key_sep = JSON_SEPARATORS
+        sys.stdout.write(f'{{"anime"{key_sep}')
+        write_json_array(anime, sys.stdout)
+        sys.stdout.write(f'{item_sep}"manga"{key_sep}')
+        write_json_array(manga, sys.stdout)
+        sys.stdout.write("}\n")
+        sys.stdout.flush()
 
 
 @parse.command(name="history", short_help="parse downloaded user history")
-@apply_shared(USERNAME)
-def _history_parse(username: str) -> None:
+@apply_shared(USERNAME, SINCE, UNTIL, HISTORY_TYPE, HISTORY_ID, STREAM)
+def _history_parse(
+    username: str,
+    since: Optional[datetime],
+    until: Optional[datetime],
+    _type: Optional[str],
+    mal_id: Optional[int],
+    stream: bool,
+) -> None:
     from .parse import iter_user_history
-    from .common import serialize
+    from .parse.history import HistoryIndex
+    from .paths import LocalDir
 
-    click.echo(serialize(list(iter_user_history(username))))
+    if all(f is None for f in (since, until, _type, mal_id)):
+        echo_items(iter_user_history(username), stream=stream)
+        return
+
+    index = HistoryIndex.from_dir(LocalDir.from_username(username).data_dir)
+    echo_items(
+        index.histories(
+            since=since,
+            until=until,
+            list_type=_type.lower() if _type else None,
+            mal_id=mal_id,
+        ),
+        stream=stream,
+    )
 
 
 @parse.command(name="messages", short_help="parse downloaded message history")
-@apply_shared(USERNAME)
-def _messages_parse(username: str) -> None:
+@apply_shared(USERNAME, STREAM)
+def _messages_parse(username: str, stream: bool) -> None:
     from .parse import iter_user_threads
-    from .common import serialize
 
-    click.echo(serialize(list(iter_user_threads(username))))
+    echo_items(iter_user_threads(username), stream=stream)
 
 
 @parse.command(name="friends", short_help="parse user friends")
-@apply_shared(USERNAME)
-def _friends_parse(username: str) -> None:
-    from .common import serialize
+@apply_shared(USERNAME, STREAM)
+def _friends_parse(username: str, stream: bool) -> None:
     from .parse import iter_friends
 
-    click.echo(serialize(list(iter_friends(username))))
+    echo_items(iter_friends(username), stream=stream)
 
 
 @main.group(short_help="recover data for deleted MAL entries")
@@ -410,7 +681,19 @@ def utcnow() -> str:
 
 @recover_deleted.command(short_help="zips your current malexport dir")
 @apply_shared(USERNAME)
-def backup(username: str) -> None:
+@click.option(
+    "-i",
+    "--incremental",
+    is_flag=True,
+    default=False,
+    help="Create a deduplicated snapshot, which only stores files changed since the last one",
+)
+def backup(username: str, incremental: bool) -> None:
+    """
+    Creates a zip file of the data directory, or with --incremental, adds a
+    snapshot to malexport_zips/<username>/snapshots. Snapshots can be
+    converted to zip files with 'export-snapshot'
+    """
     import shutil
 
     from .paths import default_zip_base
@@ -420,6 +703,21 @@ def backup(username: str) -> None:
     backup_to_dir.mkdir(parents=True, exist_ok=True)
     from_dir = Account.from_username(username).localdir.data_dir
 
+    if incremental:
+        from .snapshots import SnapshotStore
+
+        res = SnapshotStore.from_username(username).create(from_dir, name=utcnow())
+        click.echo(
+            f"Created snapshot {res.name} of {from_dir}, {res.files} files", err=True
+        )
+        click.echo(
+            "Stored {} new files, {:.2f} MB".format(
+                res.new_blobs, res.new_bytes / 1024**2
+            ),
+            err=True,
+        )
+        return
+
     backup_zip_base = str(backup_to_dir / f"{utcnow()}")
     backup_zip_full = f"{backup_zip_base}.zip"
 
@@ -434,6 +732,50 @@ def backup(username: str) -> None:
     )
 
 
+@recover_deleted.command(short_help="list incremental backup snapshots")
+@apply_shared(USERNAME)
+def snapshots(username: str) -> None:
+    from .snapshots import SnapshotStore
+
+    store = SnapshotStore.from_username(username)
+    for name in store.snapshots():
+        files = store.load(name).files
+        click.echo(
+            "{} {} files {:.2f} MB".format(
+                name, len(files), sum(f.size for f in files.values()) / 1024**2
+            )
+        )
+
+
+@recover_deleted.command(short_help="convert a snapshot to a zip file")
+@apply_shared(USERNAME)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Zip file to create, defaults to malexport_zips/<username>/<snapshot>.zip",
+)
+@click.argument("SNAPSHOT", required=False, default=None)
+def export_snapshot(
+    username: str, output: Optional[Path], snapshot: Optional[str]
+) -> None:
+    """
+    Writes a snapshot (defaults to the latest one) as a zip file, the same
+    as what 'backup' creates without --incremental
+    """
+    from .paths import default_zip_base
+    from .snapshots import SnapshotStore
+
+    store = SnapshotStore.from_username(username)
+    name = snapshot or store.latest()
+    if name is None:
+        raise click.ClickException(f"No snapshots found in {store.snapshot_dir}")
+    zip_path = output or default_zip_base / username / f"{name}.zip"
+    store.export_zip(name, zip_path)
+    click.echo(f"Exported snapshot {name} to {zip_path}", err=True)
+
+
 @recover_deleted.command(short_help="stats about mal-id-cache git dir")
 def approved_ids_stats() -> None:
     from .parse.recover_deleted_entries import Approved
@@ -471,24 +813,59 @@ def approved_update() -> None:
     is_flag=True,
     help="only return items which have some activity (read/watched)",
 )
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=False,
+    help="parse every backup, instead of using cached results for backups which were already parsed",
+)
+@click.option(
+    "-j",
+    "--workers",
+    type=int,
+    default=None,
+    help="number of processes to parse backups with [default: MALEXPORT_RECOVER_WORKERS or number of CPUs]",
+)
 @apply_shared(ONLY)
-def recover(data_dir: Path, filter_with_activity: bool, only: str) -> None:
-    from .parse.recover_deleted_entries import recover_deleted as rec_del, Approved
+def recover(
+    data_dir: Path,
+    filter_with_activity: bool,
+    no_cache: bool,
+    workers: Optional[int],
+    only: str,
+) -> None:
+    from .parse.recover_deleted_entries import (
+        recover_deleted_accounts,
+        Approved,
+        RecoveryCache,
+        RECOVER_WORKERS,
+    )
     from .common import serialize
 
-    full_resp = {}
+    from .snapshots import snapshot_paths
 
-    for acc in data_dir.iterdir():
-        username = acc.name
-        zips = sorted(acc.glob("*.zip"), key=lambda x: x.name)
+    cache = None if no_cache else RecoveryCache()
 
-        rec_anime, rec_manga = rec_del(
-            approved=Approved.parse_from_git_dir(),
-            username=username,
-            backups=zips,
-            filter_with_activity=filter_with_activity,
+    # zip backups and incremental snapshots are both named by when they were
+    # created, so sorting by name puts them in order
+    backups = {
+        acc.name: sorted(
+            [*acc.glob("*.zip"), *snapshot_paths(acc)], key=lambda x: x.stem
         )
+        for acc in data_dir.iterdir()
+    }
+
+    recovered = recover_deleted_accounts(
+        approved=Approved.parse_from_git_dir(),
+        backups=backups,
+        filter_with_activity=filter_with_activity,
+        cache=cache,
+        workers=workers or RECOVER_WORKERS,
+    )
 
+    full_resp = {}
+
+    for username, (rec_anime, rec_manga) in recovered.items():
         resp: Any = {
             "anime": rec_anime,
             "manga": rec_manga,
@@ -577,5 +954,322 @@ def manual_history(
             break
 
 
+@main.command(short_help="compress/decompress the JSON files in the data directory")
+@apply_shared(USERNAME)
+@click.option(
+    "-d",
+    "--decompress",
+    is_flag=True,
+    default=False,
+    help="Rewrite compressed files as plain JSON",
+)
+def compress(username: str, decompress: bool) -> None:
+    """
+    Rewrites the JSON files for an account compressed with zstd. For directories
+    with lots of small files (history, messages, forum), a dictionary is trained
+    and saved there, which improves compression a lot for small files
+
+    Files are read whether or not they're compressed. To write new data
+    compressed, set MALEXPORT_COMPRESS_JSON=zstd
+    """
+    from .paths import LocalDir
+    from .common import rewrite_data_dir
+
+    stats = rewrite_data_dir(
+        LocalDir.from_username(username).data_dir, compress=not decompress
+    )
+    click.echo(
+        f"Rewrote {stats.files} files, {stats.before} -> {stats.after} bytes",
+        err=True,
+    )
+
+
+@main.group()
+def manifest() -> None:
+    """
+    the manifest lists the files in the data directory (with their size, mtime
+    and hash). It's updated after each 'malexport update' run
+    """
+
+
+@manifest.command(name="update", short_help="update the manifest for an account")
+@apply_shared(USERNAME)
+def _manifest_update(username: str) -> None:
+    """
+    Update the manifest for an account, and print what changed since it was last updated
+    """
+    from .paths import LocalDir
+    from .manifest import update_manifest
+    from .common import serialize
+
+    diff = update_manifest(LocalDir.from_username(username).data_dir)
+    click.echo(serialize(diff))
+
+
+@manifest.command(name="diff", short_help="diff two manifests")
+@click.argument("OLD", type=click.Path(exists=True, path_type=Path))
+@click.argument("NEW", type=click.Path(exists=True, path_type=Path))
+def _manifest_diff(old: Path, new: Path) -> None:
+    """
+    Print which files were added, removed or changed between two manifests.
+    These can be manifest files, or data directories which contain one
+    """
+    from .manifest import Manifest
+    from .common import serialize
+
+    click.echo(serialize(Manifest.load(old).diff(Manifest.load(new))))
+
+
+def _parse_since(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        raise click.BadParameter(
+            f"{value} is not a unix timestamp or an ISO formatted date"
+        )
+
+
+@main.command(short_help="print what changed when updating")
+@apply_shared(USERNAME, STREAM)
+@click.option(
+    "--since",
+    default=None,
+    help="Only print events on or after this time (a unix timestamp or an ISO formatted date)",
+)
+@click.option(
+    "-t",
+    "--type",
+    "types",
+    multiple=True,
+    help="Only print events of this type, e.g. 'list', 'history', 'message.thread_added'",
+)
+def events(username: str, stream: bool, since: Optional[str], types: List[str]) -> None:
+    """
+    Each 'malexport update' saves events to events.jsonl in the data directory, for
+    entries added/removed/changed on your list (list.added, list.removed, list.changed),
+    new history (history.added), messages (message.thread_added, message.thread_updated)
+    and forum posts (forum.topic_added, forum.topic_updated)
+
+    This prints the events since some time, so that other tools can process
+    what changed without reading/parsing everything again
+    """
+    from .paths import LocalDir
+    from .events import EventLog
+
+    log = EventLog(LocalDir.from_username(username).data_dir)
+    echo_items(
+        (
+            ev
+            for ev in log.since(_parse_since(since))
+            if not types
+            or any(ev.type == t or ev.type.startswith(f"{t}.") for t in types)
+        ),
+        stream,
+    )
+
+
+@main.group(name="list-history")
+def list_history() -> None:
+    """
+    each time your lists are updated, the changes to the status/score/progress/dates
+    for each entry are saved, so you can see what your list looked like in the past
+    """
+
+
+LIST_HISTORY_TYPE = click.option(
+    "--type",
+    "_type",
+    type=click.Choice(["anime", "manga"], case_sensitive=False),
+    default="anime",
+    help="Which list to use",
+)
+
+LIST_HISTORY_API = click.option(
+    "--api",
+    is_flag=True,
+    default=False,
+    help="Use the history of the API list, instead of the load.json list",
+)
+
+
+def _list_history_for(username: str, _type: str, api: bool) -> Any:
+    from .paths import LocalDir
+    from .list_history import ListHistory
+
+    data_dir = LocalDir.from_username(username).data_dir
+    name = f"{_type}list_api.json" if api else f"{_type}list.json"
+    return ListHistory.from_list_file(data_dir / name)
+
+
+def _timestamp(dt: Optional[datetime]) -> Optional[int]:
+    return int(dt.timestamp()) if dt is not None else None
+
+
+@list_history.command(name="state", short_help="print what your list looked like")
+@apply_shared(USERNAME, LIST_HISTORY_TYPE, LIST_HISTORY_API)
+@click.option(
+    "--at",
+    type=click.DateTime(),
+    default=None,
+    help="Print the list as of this date, instead of the latest state",
+)
+def _list_history_state(
+    username: str, _type: str, api: bool, at: Optional[datetime]
+) -> None:
+    from .common import serialize
+    from .list_history import state_to_json
+
+    hist = _list_history_for(username, _type, api)
+    click.echo(serialize(state_to_json(hist.state_at(_timestamp(at)))))
+
+
+@list_history.command(name="changes", short_help="print what changed on your list")
+@apply_shared(USERNAME, LIST_HISTORY_TYPE, LIST_HISTORY_API)
+@click.option(
+    "--since",
+    type=click.DateTime(),
+    default=None,
+    help="Compare against the list as of this date (default: an empty list)",
+)
+@click.option(
+    "--until",
+    type=click.DateTime(),
+    default=None,
+    help="Compare against the list as of this date (default: the latest state)",
+)
+def _list_history_changes(
+    username: str,
+    _type: str,
+    api: bool,
+    since: Optional[datetime],
+    until: Optional[datetime],
+) -> None:
+    """
+    Print the entries which were added, removed or changed between two dates
+    """
+    from .common import serialize
+
+    hist = _list_history_for(username, _type, api)
+    click.echo(serialize(hist.changes(_timestamp(since), _timestamp(until)).to_json()))
+
+
+@list_history.command(name="runs", short_help="list when the list history was saved")
+@apply_shared(USERNAME, LIST_HISTORY_TYPE, LIST_HISTORY_API)
+def _list_history_runs(username: str, _type: str, api: bool) -> None:
+    hist = _list_history_for(username, _type, api)
+    for at in hist.timestamps():
+        click.echo(f"{at} {datetime.fromtimestamp(at).isoformat()}")
+
+
+@main.group()
+def db() -> None:
+    """
+    load the parsed data into a SQLite database, to query it with SQL
+    """
+
+
+DB_PATH = click.option(
+    "--db",
+    "db_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Location of the database [default: ~/.cache/malexport/malexport.sqlite]",
+)
+
+
+@db.command(name="build", short_help="load data into the database")
+@click.option(
+    "-u",
+    "--username",
+    "usernames",
+    multiple=True,
+    required=True,
+    envvar="MAL_USERNAME",
+    help="Accounts to load, can be passed multiple times",
+)
+@DB_PATH
+@click.option(
+    "-f",
+    "--force",
+    is_flag=True,
+    default=False,
+    help="Reload everything, even if the files haven't changed",
+)
+def _db_build(usernames: List[str], db_path: Optional[Path], force: bool) -> None:
+    """
+    Loads the combined list data (entries, genres, studios, history), messages,
+    forum posts and friends into a SQLite database. Only the tables whose
+    files changed since the last build are reloaded
+    """
+    from .db import build_db, default_db_path
+
+    for username in usernames:
+        rebuilt = build_db(username, db_path=db_path or default_db_path, force=force)
+        click.echo(
+            f"{username}: {'reloaded ' + ', '.join(rebuilt) if rebuilt else 'up to date'}",
+            err=True,
+        )
+
+
+@db.command(name="query", short_help="run a SQL query")
+@click.argument("SQL")
+@DB_PATH
+@apply_shared(STREAM)
+def _db_query(sql: str, db_path: Optional[Path], stream: bool) -> None:
+    """
+    Run a SQL query against the database, printing the rows as JSON. For example:
+
+    \b
+    malexport db query "SELECT genre, COUNT(*) AS n FROM genres JOIN entries USING (username, type, id)
+        WHERE entries.status = 'Completed' GROUP BY genre ORDER BY n DESC"
+    """
+    from .db import query, default_db_path
+
+    echo_items(query(sql, db_path=db_path or default_db_path), stream)
+
+
+@main.group(name="export")
+def export_group() -> None:
+    """
+    export the parsed data to other formats
+    """
+
+
+@export_group.command(name="parquet", short_help="export to parquet files")
+@click.option(
+    "-u",
+    "--username",
+    "usernames",
+    multiple=True,
+    required=True,
+    envvar="MAL_USERNAME",
+    help="Accounts to export, can be passed multiple times",
+)
+@click.option(
+    "-o",
+    "--output",
+    "out_dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    required=True,
+    help="Directory to write the tables to",
+)
+def _export_parquet(usernames: List[str], out_dir: Path) -> None:
+    """
+    Exports the combined list data for each account to parquet files: entries,
+    history, genres, studios and api (metadata from the MAL API). Each table
+    is a directory partitioned by username, like entries/username=<username>/data.parquet
+
+    Requires pyarrow, install with pip install 'malexport[parquet]'
+    """
+    from .parquet import export_parquet
+    from .common import serialize
+
+    click.echo(serialize(export_parquet(usernames, out_dir)))
+
+
 if __name__ == "__main__":
     main(prog_name="malexport")
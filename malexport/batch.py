@@ -0,0 +1,86 @@
+"""
+Updates multiple accounts in one process, instead of looping
+over 'malexport update' for each account
+
+Everything in one process shares the request pacing and connection
+pool (common.PACER/HTTP_ADAPTER), and the selenium browser (which
+logs in to each account in turn), so this runs the updates one at a time:
+
+- the sources which only make HTTP requests run for each account in turn
+  (lists for every account, then api-lists for every account...)
+- the sources which use the browser run for one account at a time, so the
+  browser only has to log in to each account once
+
+Each account still saves to its own data directory
+"""
+
+import time
+from typing import NamedTuple, List, Optional, Sequence, Tuple
+
+from .log import logger
+from .exporter import Account
+from .exporter.account import SOURCES, BROWSER_SOURCES
+
+
+class BatchResult(NamedTuple):
+    username: str
+    source: str
+    duration: float
+    error: Optional[str]
+
+
+def batch_order(
+    usernames: Sequence[str], sources: Sequence[str] = SOURCES
+) -> List[Tuple[str, str]]:
+    """
+    The order to run (username, source) in
+    """
+    http = [s for s in SOURCES if s in sources and s not in BROWSER_SOURCES]
+    browser = [s for s in SOURCES if s in sources and s in BROWSER_SOURCES]
+    order = [(username, source) for source in http for username in usernames]
+    order.extend((username, source) for username in usernames for source in browser)
+    return order
+
+
+def update_accounts(
+    usernames: Sequence[str],
+    sources: Optional[Sequence[str]] = None,
+    driver_type: str = "chrome",
+    use_merged_file: bool = False,
+) -> List[BatchResult]:
+    """
+    Update each source for each account. If one fails, logs the
+    error and continues with the rest
+    """
+    unknown = set(sources or []) - set(SOURCES)
+    if unknown:
+        raise ValueError(
+            f"Unknown sources: {sorted(unknown)}, expected one of {SOURCES}"
+        )
+    # remove duplicates, keep order
+    usernames = list(dict.fromkeys(usernames))
+    accounts = {username: Account.from_username(username) for username in usernames}
+    results: List[BatchResult] = []
+    for username, source in batch_order(usernames, sources or SOURCES):
+        logger.info(f"Batch: updating {source} for {username}")
+        started = time.time()
+        error: Optional[str] = None
+        try:
+            accounts[username].update_source(
+                source, driver_type=driver_type, use_merged_file=use_merged_file
+            )
+        except Exception as e:
+            logger.exception(f"Batch: failed to update {source} for {username}")
+            error = f"{type(e).__name__}: {e}"
+            if type(e).__module__.startswith("selenium"):
+                # the browser may have crashed, start a new one next time
+                accounts[username].reset_drivers()
+        results.append(
+            BatchResult(
+                username=username,
+                source=source,
+                duration=time.time() - started,
+                error=error,
+            )
+        )
+    return results
@@ -1,15 +1,52 @@
 import os
 import time
+import threading
 import warnings
+import hashlib
 import datetime
-from typing import Any, Generator, Optional, Callable, Type, cast, Sequence, Union
+from pathlib import Path
+from functools import lru_cache
+from typing import (
+    Any,
+    Generator,
+    Optional,
+    Callable,
+    Type,
+    cast,
+    Sequence,
+    Union,
+    Iterable,
+    Iterator,
+    TextIO,
+    BinaryIO,
+    Dict,
+    List,
+    NamedTuple,
+    Tuple,
+)
 from urllib.parse import urlparse, parse_qs
 
 import requests
 import backoff  # type: ignore[import]
 import simplejson
 
+try:
+    import orjson  # type: ignore[import]
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 from .list_type import ListType
+from .paths import (
+    PathIsh,
+    ZSTD_SUFFIX,
+    ZSTD_DICT_NAME,
+    compressed_path,
+    stored_path,
+    iter_json_files,
+    cache_dir,
+)
 
 Json = Any
 
@@ -17,6 +54,24 @@ from malexport.log import logger
 
 REQUEST_WAIT_TIME: int = int(os.environ.get("MALEXPORT_REQUEST_WAIT_TIME", 10))
 
+# JSON files larger than this (in bytes) are parsed incrementally, if ijson is installed
+STREAM_JSON_THRESHOLD: int = int(
+    os.environ.get("MALEXPORT_STREAM_JSON_THRESHOLD", 8 * 1024 * 1024)
+)
+
+# 'zstd' to compress JSON files written to the data directory, 'none' to write plain JSON
+# files are read either way, this only changes how new data is written
+COMPRESS_JSON: str = os.environ.get("MALEXPORT_COMPRESS_JSON", "none").lower()
+ZSTD_LEVEL: int = int(os.environ.get("MALEXPORT_ZSTD_LEVEL", 10))
+# directories with at least this many JSON files have a dictionary trained for them
+ZSTD_DICT_MIN_FILES: int = int(os.environ.get("MALEXPORT_ZSTD_DICT_MIN_FILES", 50))
+ZSTD_DICT_SIZE: int = int(os.environ.get("MALEXPORT_ZSTD_DICT_SIZE", 64 * 1024))
+
+if COMPRESS_JSON not in ("none", "zstd"):
+    raise ValueError(
+        f"Unknown value for MALEXPORT_COMPRESS_JSON: {COMPRESS_JSON}, expected 'none' or 'zstd'"
+    )
+
 
 def fibo_backoff() -> Generator[float, None, None]:
     """
@@ -37,6 +92,232 @@ def backoff_hdlr(details: Any) -> None:
     warnings.warn(warning_msg)
 
 
+class RequestPacer:
+    """
+    Makes sure requests are at least some amount of time apart. MAL
+    rate limits per IP, so this is shared by everything in the process
+    (every session/account), instead of each one sleeping on its own
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.last_request: Optional[float] = None
+
+    def wait(self, wait_time: float) -> None:
+        """
+        Sleep till its been wait_time seconds since the last request started
+        """
+        with self.lock:
+            if self.last_request is not None:
+                remaining = self.last_request + wait_time - time.monotonic()
+            else:
+                remaining = wait_time
+            if remaining > 0:
+                time.sleep(remaining)
+            self.last_request = time.monotonic()
+
+
+PACER = RequestPacer()
+
+# connections are pooled per adapter, so sessions which mount
+# this share connections to MAL/Jikan
+HTTP_POOL_SIZE: int = int(os.environ.get("MALEXPORT_HTTP_POOL_SIZE", 10))
+HTTP_ADAPTER = requests.adapters.HTTPAdapter(
+    pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE
+)
+
+
+def new_session() -> requests.Session:
+    """
+    Create a requests session which uses the shared connection pool
+    """
+    session = requests.Session()
+    session.mount("https://", HTTP_ADAPTER)
+    session.mount("http://", HTTP_ADAPTER)
+    return session
+
+
+@lru_cache(maxsize=1)
+def default_session() -> requests.Session:
+    return new_session()
+
+
+# '0' to disable the HTTP cache
+HTTP_CACHE_ENABLED: bool = bool(int(os.environ.get("MALEXPORT_HTTP_CACHE", 1)))
+# if a cached response is newer than this (seconds), its used without making a request
+HTTP_CACHE_TTL: int = int(os.environ.get("MALEXPORT_HTTP_CACHE_TTL", 0))
+# cached responses which haven't been used in this long (seconds) are removed
+HTTP_CACHE_MAX_AGE: int = int(
+    os.environ.get("MALEXPORT_HTTP_CACHE_MAX_AGE", 60 * 60 * 24 * 30)
+)
+# how often (seconds) the shared cache is pruned, in long-running processes like the daemon
+HTTP_CACHE_PRUNE_INTERVAL: int = int(
+    os.environ.get("MALEXPORT_HTTP_CACHE_PRUNE_INTERVAL", 60 * 60 * 24)
+)
+default_http_cache_dir = Path(cache_dir) / "malexport" / "http"
+
+
+class HttpCacheStats:
+    """
+    Counts how requests which used the HTTP cache were handled
+    """
+
+    def __init__(self) -> None:
+        # used the cached response without a request (within the TTL)
+        self.fresh = 0
+        # the server responded with 304 Not Modified
+        self.not_modified = 0
+        # downloaded the response
+        self.misses = 0
+
+    @property
+    def total(self) -> int:
+        return self.fresh + self.not_modified + self.misses
+
+    def __str__(self) -> str:
+        return f"{self.fresh} fresh, {self.not_modified} not modified, {self.misses} downloaded"
+
+
+class HttpCache:
+    """
+    An on-disk cache for GET requests. Saves the ETag/Last-Modified
+    headers from each response, so the next request for that URL is
+    conditional, and if the server responds with 304 Not Modified, the
+    saved response is used. If the saved response is newer than
+    ttl seconds, its used without making a request at all
+
+    Responses are keyed by the URL and the account they were requested
+    for. Responses which haven't been used in HTTP_CACHE_MAX_AGE
+    seconds are removed by prune
+    """
+
+    def __init__(
+        self, cache_dir: PathIsh = default_http_cache_dir, ttl: int = HTTP_CACHE_TTL
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+        self.stats = HttpCacheStats()
+        # time.time() when this was last pruned
+        self.pruned_at: Optional[float] = None
+
+    def key(self, url: str, identity: str = "") -> str:
+        # API responses depend on who is logged in, so they're cached per account
+        return hashlib.sha256(f"{url}\n{identity}".encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        base = self.cache_dir / key[:2] / key
+        return base.with_suffix(".meta"), base.with_suffix(".body")
+
+    def load(self, key: str) -> Optional[Tuple[Json, bytes]]:
+        meta_path, body_path = self._paths(key)
+        try:
+            return deserialize(meta_path.read_bytes()), body_path.read_bytes()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, key: str, r: requests.Response) -> None:
+        meta_path, body_path = self._paths(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        write_file(body_path, r.content)
+        # dont save cookies to the cache
+        headers = {k: v for k, v in r.headers.items() if k.lower() != "set-cookie"}
+        self._save_meta(key, r.url, headers)
+
+    def _save_meta(self, key: str, url: str, headers: Dict[str, str]) -> None:
+        meta_path, _ = self._paths(key)
+        write_file(
+            meta_path,
+            serialize_bytes(
+                {"url": url, "headers": headers, "stored_at": int(time.time())}
+            ),
+        )
+
+    def touch(self, key: str) -> None:
+        """
+        Mark a cached response as used, so its not pruned
+        """
+        meta_path, _ = self._paths(key)
+        try:
+            os.utime(meta_path)
+        except FileNotFoundError:
+            pass
+
+    def prune(self, max_age: int = HTTP_CACHE_MAX_AGE) -> int:
+        """
+        Remove responses which haven't been used in max_age
+        seconds, returns how many were removed
+        """
+        if not self.cache_dir.exists():
+            return 0
+        self.pruned_at = time.time()
+        cutoff = self.pruned_at - max_age
+        removed = 0
+        for path in self.cache_dir.glob("*/*.*"):
+            # the body is saved first, so it may not have a .meta file if this was interrupted
+            meta_path = path.with_suffix(".meta")
+            try:
+                if meta_path.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
+                if path.stat().st_mtime >= cutoff:
+                    continue
+            path.unlink(missing_ok=True)
+            if path.suffix == ".meta":
+                removed += 1
+        if removed > 0:
+            logger.info(f"Removed {removed} unused responses from {self.cache_dir}")
+        return removed
+
+    def prune_if_due(self, interval: int = HTTP_CACHE_PRUNE_INTERVAL) -> int:
+        """
+        Prune, if this hasn't been pruned in the last interval seconds
+        """
+        if self.pruned_at is not None and time.time() - self.pruned_at < interval:
+            return 0
+        return self.prune()
+
+    def is_fresh(self, meta: Json) -> bool:
+        return self.ttl > 0 and time.time() - meta["stored_at"] < self.ttl
+
+    @staticmethod
+    def conditional_headers(meta: Json) -> Dict[str, str]:
+        headers = {}
+        cached = {k.lower(): v for k, v in meta["headers"].items()}
+        if "etag" in cached:
+            headers["If-None-Match"] = cached["etag"]
+        if "last-modified" in cached:
+            headers["If-Modified-Since"] = cached["last-modified"]
+        return headers
+
+    @staticmethod
+    def cached_response(meta: Json, body: bytes) -> requests.Response:
+        r = requests.Response()
+        r.status_code = 200
+        r.url = meta["url"]
+        r.headers.update(meta["headers"])
+        r._content = body
+        r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+        return r
+
+
+@lru_cache(maxsize=1)
+def _shared_http_cache() -> HttpCache:
+    return HttpCache()
+
+
+def default_http_cache() -> Optional[HttpCache]:
+    """
+    The HTTP cache shared by everything in this process, None if its disabled.
+    Old responses are pruned the first time this is called, and then again
+    every HTTP_CACHE_PRUNE_INTERVAL seconds
+    """
+    if not HTTP_CACHE_ENABLED:
+        return None
+    cache = _shared_http_cache()
+    cache.prune_if_due()
+    return cache
+
+
 @backoff.on_exception(
     fibo_backoff,
     cast(Sequence[Type[Exception]], (requests.RequestException,)),
@@ -50,27 +331,66 @@ def safe_request(
     session: Optional[requests.Session] = None,
     on_error: Optional[Callable[[requests.Response], Any]] = None,
     wait_time: int = REQUEST_WAIT_TIME,
+    cache: Optional[HttpCache] = None,
+    cache_identity: Optional[str] = None,
     **kwargs: Any,
 ) -> requests.Response:
     """
-    Sleep for a while, make a request, and retry 3 times if the request fails
+    Wait till its been wait_time seconds since the last request, make a request,
+    and retry 3 times if the request fails
     Can supply an on_error function to do some custom behaviour if there's an HTTP error
+
+    If cache is given, GET requests are conditional, using the response
+    saved in the cache if it hasn't changed. cache_identity is who the request
+    is for (e.g. the username), for responses which depend on who is logged in.
+    If its not given, responses are cached per Authorization header
     """
-    time.sleep(wait_time)
     sess: requests.Session
     if session is not None:
         sess = session
     else:
-        sess = requests.Session()
+        sess = default_session()
+    cached: Optional[Tuple[Json, bytes]] = None
+    key = ""
+    if cache is not None and method == "GET":
+        identity = cache_identity
+        if identity is None:
+            headers: Dict[str, Any] = dict(sess.headers)
+            headers.update(kwargs.get("headers", {}))
+            identity = headers.get("Authorization", "")
+        key = cache.key(url, identity)
+        cached = cache.load(key)
+        if cached is not None:
+            if cache.is_fresh(cached[0]):
+                logger.info(f"Using cached response for {url}")
+                cache.stats.fresh += 1
+                cache.touch(key)
+                return cache.cached_response(*cached)
+            kwargs["headers"] = {
+                **kwargs.get("headers", {}),
+                **cache.conditional_headers(cached[0]),
+            }
+    PACER.wait(wait_time)
     logger.info(f"Requesting {url}...")
     kwargs.setdefault("allow_redirects", True)
     r = sess.request(method, url, **kwargs)
+    if cache is not None and cached is not None and r.status_code == 304:
+        logger.info(f"{url} wasn't modified, using cached response")
+        cache.stats.not_modified += 1
+        if cache.ttl > 0:
+            cache._save_meta(key, cached[0]["url"], cached[0]["headers"])
+        cache.touch(key)
+        return cache.cached_response(*cached)
     try:
         r.raise_for_status()
     except requests.RequestException as e:
         if on_error is not None:
             on_error(r)  # do something, e.g. refresh a expired bearer token
         raise e  # raise anyways, so this request retries
+    if cache is not None and method == "GET":
+        cache.stats.misses += 1
+        if "ETag" in r.headers or "Last-Modified" in r.headers or cache.ttl > 0:
+            cache.save(key, r)
     return r
 
 
@@ -83,7 +403,7 @@ def safe_request_json(
     return safe_request(url, session=session, **kwargs).json()
 
 
-def default_encoder(o: Any) -> Any:
+def _default_encoder(o: Any) -> Any:
     if hasattr(o, "_asdict"):
         return o._asdict()
     if isinstance(o, ListType):
@@ -95,19 +415,515 @@ def default_encoder(o: Any) -> Any:
     raise TypeError(f"{o} of type {type(o)} is not serializable")
 
 
+Encoder = Callable[[Any], Any]
+
+# type -> function which converts it to something JSON serializable
+_ENCODERS: Dict[type, Encoder] = {}
+# types whose values repeat a lot (e.g. genres), and are immutable,
+# so the converted dict can be reused each time the value is encountered
+_CACHED_ENCODINGS: Dict[type, Dict[Any, Any]] = {}
+
+
+def cache_encoding(cls: type) -> None:
+    """
+    Mark a (hashable, immutable) NamedTuple type as something which repeats
+    often, so that its encoded dict is reused instead of created each time
+    """
+    _CACHED_ENCODINGS[cls] = {}
+    _ENCODERS.pop(cls, None)
+
+
+def _compile_encoder(cls: type) -> Encoder:
+    fields = getattr(cls, "_fields", None)
+    if fields is None:
+        return _default_encoder
+
+    def _encode_namedtuple(o: Any) -> Any:
+        return dict(zip(fields, o))
+
+    if cls not in _CACHED_ENCODINGS:
+        return _encode_namedtuple
+
+    cache = _CACHED_ENCODINGS[cls]
+
+    def _encode_cached(o: Any) -> Any:
+        encoded = cache.get(o)
+        if encoded is None:
+            encoded = cache[o] = _encode_namedtuple(o)
+        return encoded
+
+    return _encode_cached
+
+
+def default_encoder(o: Any) -> Any:
+    """
+    Called by the JSON library for anything it can't serialize itself,
+    this is called for every NamedTuple, so the conversion for each
+    type is compiled once and then looked up by type
+    """
+    encoder = _ENCODERS.get(type(o))
+    if encoder is None:
+        encoder = _ENCODERS[type(o)] = _compile_encoder(type(o))
+    return encoder(o)
+
+
+def serialize_bytes(data: Any) -> bytes:
+    if HAS_ORJSON:
+        bdata: bytes = orjson.dumps(data, default=default_encoder)
+        return bdata
+    return serialize(data).encode("utf-8")
+
+
+# the item/key separators used by serialize, so JSON which is written
+# in pieces (e.g. write_json_array) matches serializing it all at once
+JSON_SEPARATORS: Tuple[str, str] = (",", ":") if HAS_ORJSON else (", ", ": ")
+
+
 def serialize(data: Any) -> str:
+    if HAS_ORJSON:
+        return serialize_bytes(data).decode("utf-8")
+    return simplejson.dumps(
+        data,
+        default=default_encoder,
+        namedtuple_as_object=True,
+    )
+
+
+def deserialize(data: Union[str, bytes]) -> Json:
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return simplejson.loads(data)
+
+
+class WriteStats:
+    """
+    Counts the files written by write_file, so
+    the amount of changed data can be reported
+    """
+
+    def __init__(self) -> None:
+        self.written = 0
+        self.unchanged = 0
+        self.bytes_written = 0
+
+    def __str__(self) -> str:
+        return f"wrote {self.written} files ({self.bytes_written} bytes), {self.unchanged} unchanged"
+
+
+WRITE_STATS = WriteStats()
+
+# absolute path -> (size, mtime_ns, sha256) for files written by write_file
+_WRITTEN_DIGESTS: Dict[str, Tuple[int, int, str]] = {}
+
+
+def written_digest(path: PathIsh, size: int, mtime_ns: int) -> Optional[str]:
+    """
+    If this process wrote this file with write_file and it hasn't
+    been modified since, return the sha256 hash of its contents
+    """
+    written = _WRITTEN_DIGESTS.get(os.path.abspath(path))
+    if written is not None and written[0] == size and written[1] == mtime_ns:
+        return written[2]
+    return None
+
+
+def forget_written_digests(directory: PathIsh) -> None:
+    """
+    Drop the recorded hashes for files written under this directory,
+    once they've been saved somewhere else (e.g. to the manifest)
+    """
+    prefix = os.path.join(os.path.abspath(directory), "")
+    for path in [p for p in _WRITTEN_DIGESTS if p.startswith(prefix)]:
+        del _WRITTEN_DIGESTS[path]
+
+
+def write_file(path: PathIsh, data: bytes) -> bool:
+    """
+    Write data to a file, if it differs from what's already there. This
+    writes to a temporary file in the same directory, and then renames it
+    over the target, so the file is never left partially written
+
+    Returns True if the file was written, False if it was unchanged
+    """
+    p = Path(path)
+    try:
+        # only read the old file if its the same size
+        if p.stat().st_size == len(data) and p.read_bytes() == data:
+            WRITE_STATS.unchanged += 1
+            return False
+    except FileNotFoundError:
+        pass
+    tmp = p.with_name(f".{p.name}.{os.getpid()}.tmp")
     try:
-        import orjson  # type: ignore[import]
+        with tmp.open("wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, p)
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+    st = p.stat()
+    _WRITTEN_DIGESTS[os.path.abspath(p)] = (
+        st.st_size,
+        st.st_mtime_ns,
+        hashlib.sha256(data).hexdigest(),
+    )
+    WRITE_STATS.written += 1
+    WRITE_STATS.bytes_written += len(data)
+    return True
 
-        bdata: bytes = orjson.dumps(data, default=default_encoder)
-        return bdata.decode("utf-8")
 
-    except ImportError:
-        return simplejson.dumps(
-            data,
-            default=default_encoder,
-            namedtuple_as_object=True,
-        )
+def _last_line_end(f: BinaryIO, size: int) -> int:
+    """
+    The offset just after the last newline in the file, 0 if there isn't one
+    """
+    pos = size
+    while pos > 0:
+        start = max(0, pos - 1024)
+        f.seek(start)
+        i = f.read(pos - start).rfind(b"\n")
+        if i != -1:
+            return start + i + 1
+        pos = start
+    return 0
+
+
+def append_lines(path: PathIsh, data: bytes) -> None:
+    """
+    Append lines (ending with a newline) to a file, like a JSON lines log, and
+    sync it to disk. If the last line in the file is incomplete (the process
+    was killed while writing it), its removed first, so the new lines
+    don't get appended onto it
+    """
+    with open(path, "a+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = _last_line_end(f, size)
+        if end != size:
+            logger.warning(
+                f"Removing partially written line at the end of {path} ({size - end} bytes)"
+            )
+            f.truncate(end)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _zstd() -> Any:
+    try:
+        import zstandard  # type: ignore[import]
+    except ImportError as e:
+        raise RuntimeError(
+            "zstandard is required to read/write compressed JSON files, install with pip install 'malexport[compress]'"
+        ) from e
+    return zstandard
+
+
+# while a directory is being rewritten, the newly trained dictionary is saved
+# here, and only replaces ZSTD_DICT_NAME once every file has been rewritten
+ZSTD_NEW_DICT_NAME = ZSTD_DICT_NAME + ".new"
+
+
+def _zstd_dict_stamp(dict_file: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = dict_file.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+@lru_cache(maxsize=64)
+def _load_zstd_dictionary(dict_file: Path, stamp: Optional[Tuple[int, int]]) -> Any:
+    # stamp (mtime/size) is part of the cache key, so if the
+    # dictionary is replaced, its loaded again
+    if stamp is None:
+        return None
+    return _zstd().ZstdCompressionDict(dict_file.read_bytes())
+
+
+def _zstd_dictionary(dict_file: Path) -> Any:
+    return _load_zstd_dictionary(dict_file, _zstd_dict_stamp(dict_file))
+
+
+@lru_cache(maxsize=64)
+def _zstd_compressor_for(dictionary: Any) -> Any:
+    return _zstd().ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+
+
+@lru_cache(maxsize=64)
+def _zstd_decompressor_for(dictionary: Any) -> Any:
+    return _zstd().ZstdDecompressor(dict_data=dictionary)
+
+
+def _zstd_compressor(dict_file: Path) -> Any:
+    return _zstd_compressor_for(_zstd_dictionary(dict_file))
+
+
+def _zstd_decompressor(directory: Path, header: bytes) -> Any:
+    """
+    A decompressor for a file in directory, using the dictionary with
+    the ID in the file's frame header (the first few bytes of the file)
+    """
+    dict_id = _zstd().get_frame_parameters(header).dict_id
+    if dict_id == 0:
+        return _zstd_decompressor_for(None)
+    for name in (ZSTD_DICT_NAME, ZSTD_NEW_DICT_NAME):
+        dictionary = _zstd_dictionary(directory / name)
+        if dictionary is not None and dictionary.dict_id() == dict_id:
+            return _zstd_decompressor_for(dictionary)
+    raise RuntimeError(
+        f"Could not find the dictionary (ID {dict_id}) used to compress files in {directory}"
+    )
+
+
+def _clear_zstd_caches() -> None:
+    _load_zstd_dictionary.cache_clear()
+    _zstd_compressor_for.cache_clear()
+    _zstd_decompressor_for.cache_clear()
+
+
+def open_json(path: PathIsh) -> BinaryIO:
+    """
+    Open a JSON file for reading, decompressing it while
+    it's read if it's stored compressed
+    """
+    p = stored_path(path)
+    f = p.open("rb")
+    if p.name.endswith(ZSTD_SUFFIX):
+        # the frame header is at most 18 bytes
+        header = f.read(18)
+        f.seek(0)
+        return cast(BinaryIO, _zstd_decompressor(p.parent, header).stream_reader(f))
+    return f
+
+
+def read_json_bytes(path: PathIsh) -> bytes:
+    p = stored_path(path)
+    data = p.read_bytes()
+    if p.name.endswith(ZSTD_SUFFIX):
+        bdata: bytes = _zstd_decompressor(p.parent, data).decompress(data)
+        return bdata
+    return data
+
+
+def read_json(path: PathIsh) -> Json:
+    """
+    Read a JSON file from the data directory, given the path
+    to the plain file, whether or not it's stored compressed
+    """
+    return deserialize(read_json_bytes(path))
+
+
+def write_json(
+    path: PathIsh, data: Union[str, bytes], compress: Optional[bool] = None
+) -> Path:
+    """
+    Write serialized JSON to a file in the data directory. If compress is True
+    (defaults to MALEXPORT_COMPRESS_JSON=zstd) this is written to the .zst path
+    instead. The other copy of the file is removed, so there's only ever one
+
+    Returns the path of the file which was written
+    """
+    p = Path(path)
+    if compress is None:
+        compress = COMPRESS_JSON == "zstd"
+    compressor = _zstd_compressor(p.parent / ZSTD_DICT_NAME) if compress else None
+    return _write_json(p, data, compressor)
+
+
+def _write_json(p: Path, data: Union[str, bytes], compressor: Any) -> Path:
+    # if compressor is None, writes plain JSON
+    bdata = data.encode("utf-8") if isinstance(data, str) else data
+    if compressor is not None:
+        target, other = compressed_path(p), p
+        bdata = compressor.compress(bdata)
+    else:
+        target, other = p, compressed_path(p)
+    write_file(target, bdata)
+    if other.exists():
+        other.unlink()
+    return target
+
+
+class StorageStats(NamedTuple):
+    files: int
+    before: int
+    after: int
+
+
+def _train_dictionary(directory: Path, samples: List[bytes]) -> bool:
+    zstd = _zstd()
+    try:
+        dictionary = zstd.train_dictionary(ZSTD_DICT_SIZE, samples)
+    except zstd.ZstdError as e:
+        logger.debug(f"Could not train dictionary for {directory}: {e}")
+        return False
+    write_file(directory / ZSTD_NEW_DICT_NAME, dictionary.as_bytes())
+    return True
+
+
+def rewrite_json_dir(directory: PathIsh, compress: bool) -> StorageStats:
+    """
+    Rewrite all the JSON files in a directory (not recursively), either
+    compressed or as plain JSON
+
+    If compressing a directory with lots of (typically small and similar) files,
+    a dictionary is trained on them first, which is saved in the directory
+    and is required to decompress the files
+
+    The new dictionary only replaces the old one after every file has been
+    rewritten. Each compressed file has the ID of its dictionary in its header,
+    so if this is interrupted, files compressed with either one can be read
+    """
+    d = Path(directory)
+    files = list(iter_json_files(d))
+    if len(files) == 0:
+        return StorageStats(0, 0, 0)
+    dict_file = d / ZSTD_DICT_NAME
+    new_dict_file = d / ZSTD_NEW_DICT_NAME
+    before = sum(stored_path(f).stat().st_size for f in files)
+    if dict_file.exists():
+        before += dict_file.stat().st_size
+    contents = [read_json_bytes(f) for f in files]
+    trained = (
+        compress
+        and len(files) >= ZSTD_DICT_MIN_FILES
+        and _train_dictionary(d, contents)
+    )
+    compressor: Any = None
+    if trained:
+        compressor = _zstd_compressor(new_dict_file)
+    elif compress:
+        compressor = _zstd_compressor_for(None)
+    after = new_dict_file.stat().st_size if trained else 0
+    for f, data in zip(files, contents):
+        after += _write_json(f, data, compressor).stat().st_size
+    if trained:
+        os.replace(new_dict_file, dict_file)
+    else:
+        dict_file.unlink(missing_ok=True)
+        new_dict_file.unlink(missing_ok=True)
+    return StorageStats(files=len(files), before=before, after=after)
+
+
+def rewrite_data_dir(data_dir: PathIsh, compress: bool) -> StorageStats:
+    """
+    Rewrite the JSON files in each directory in the data directory,
+    either compressed or as plain JSON
+    """
+    files, before, after = 0, 0, 0
+    for root, _, _ in os.walk(data_dir):
+        stats = rewrite_json_dir(root, compress=compress)
+        if stats.files > 0:
+            logger.info(
+                f"{root}: {stats.files} files, {stats.before} -> {stats.after} bytes"
+            )
+        files += stats.files
+        before += stats.before
+        after += stats.after
+    return StorageStats(files=files, before=before, after=after)
+
+
+def iter_json_array(path: PathIsh) -> Iterator[Json]:
+    """
+    Yields each item from a file which contains a top-level JSON array
+
+    Small files are decoded all at once (using orjson if its installed),
+    larger files are parsed incrementally using ijson so that the
+    entire list is never in memory at the same time. For compressed
+    files, the size compared is the size on disk
+    """
+    with open_json(path) as f:
+        if stored_path(path).stat().st_size > STREAM_JSON_THRESHOLD:
+            try:
+                import ijson  # type: ignore[import]
+            except ImportError:
+                logger.debug(
+                    f"ijson not installed, loading {path} into memory. Install with pip install 'malexport[stream]'"
+                )
+            else:
+                yield from ijson.items(f, "item", use_float=True)
+                return
+        data = f.read()
+    yield from deserialize(data)
+
+
+def _binary_stream(fp: TextIO) -> Optional[BinaryIO]:
+    """
+    If this text stream wraps a binary buffer (e.g. STDOUT),
+    return that so serialized bytes can be written directly
+    """
+    buf: Optional[BinaryIO] = getattr(fp, "buffer", None)
+    if buf is not None:
+        # make sure anything already written to the text layer comes first
+        fp.flush()
+    return buf
+
+
+def write_jsonl(items: Iterable[Any], fp: TextIO) -> int:
+    """
+    Serialize each item to a line of JSON, flushing after each one so
+    that whatever is reading the output can start processing immediately
+
+    Returns the number of items written
+    """
+    count = 0
+    buf = _binary_stream(fp)
+    for item in items:
+        if buf is not None:
+            buf.write(serialize_bytes(item))
+            buf.write(b"\n")
+            buf.flush()
+        else:
+            fp.write(serialize(item))
+            fp.write("\n")
+            fp.flush()
+        count += 1
+    return count
+
+
+def write_json_array(items: Iterable[Any], fp: TextIO) -> int:
+    """
+    Write items as a JSON array, serializing them one at a time instead
+    of building the entire list/string in memory
+
+    Returns the number of items written
+    """
+    count = 0
+    sep = JSON_SEPARATORS[0]
+    buf = _binary_stream(fp)
+    if buf is not None:
+        bsep = sep.encode("utf-8")
+        buf.write(b"[")
+        for item in items:
+            if count > 0:
+                buf.write(bsep)
+            buf.write(serialize_bytes(item))
+            count += 1
+        buf.write(b"]")
+        buf.flush()
+    else:
+        fp.write("[")
+        for item in items:
+            if count > 0:
+                fp.write(sep)
+            fp.write(serialize(item))
+            count += 1
+        fp.write("]")
+        fp.flush()
+    return count
+
+
+def parse_interval(value: str) -> int:
+    """
+    Parse an interval like 3600, 90m, 6h or 1d to seconds
+    """
+    units = {"s": 1, "m": 60, "h": 60 * 60, "d": 60 * 60 * 24}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
 
 
 def extract_query_value(url: Union[str, None], param: Union[str, None]) -> str:
@@ -0,0 +1,261 @@
+"""
+Keeps running in the background, updating each source for an account
+on its own interval, instead of running 'malexport update' from cron
+
+Since this is one process, the MAL API session and the logged in browser
+are kept between runs, so they're only set up once instead of each time
+
+Each source is scheduled for interval (plus/minus some jitter) after its last
+run finished. If more than one source is due, they run one after another (MAL
+rate limits requests anyways), and if a source was due more than once while
+something else was running, it only runs once
+
+The current state (what's running, when each source last ran/will run next,
+errors) is written to ~/.cache/malexport/daemon/<username>.json, which
+'malexport daemon status' reads
+"""
+
+import os
+import time
+import random
+import signal
+import threading
+from pathlib import Path
+from typing import NamedTuple, Dict, Optional, List, Any
+
+from .common import write_file, serialize_bytes, deserialize, Json
+from .paths import LocalDir, cache_dir
+from .manifest import update_manifest
+from .log import logger
+from .exporter import Account
+
+default_status_dir = Path(cache_dir) / "malexport" / "daemon"
+
+# fraction of the interval to randomly add/subtract, so runs don't line up
+JITTER = float(os.environ.get("MALEXPORT_DAEMON_JITTER", 0.1))
+# how often the status file is updated while waiting
+HEARTBEAT_INTERVAL = int(os.environ.get("MALEXPORT_DAEMON_HEARTBEAT", 60))
+# after a source fails, retry after this long (doubling each time it fails again)
+RETRY_INTERVAL = int(os.environ.get("MALEXPORT_DAEMON_RETRY", 300))
+
+# default interval (in seconds) for each source (exporter.account.SOURCES),
+# in the order they run if more than one is due at the same time
+DEFAULT_INTERVALS: Dict[str, int] = {
+    "lists": 60 * 60,
+    "api-lists": 60 * 60 * 6,
+    "export": 60 * 60 * 24,
+    "history": 60 * 60 * 6,
+    "forum": 60 * 60 * 6,
+    "friends": 60 * 60 * 24,
+    "messages": 60 * 60 * 12,
+}
+
+
+class SourceState(NamedTuple):
+    interval: int
+    next_run: float
+    runs: int = 0
+    failures: int = 0
+    # how many times its failed in a row
+    consecutive_failures: int = 0
+    last_started: Optional[float] = None
+    last_finished: Optional[float] = None
+    last_duration: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+def status_path(username: str, status_dir: Path = default_status_dir) -> Path:
+    return status_dir / f"{username}.json"
+
+
+def read_status(path: Path) -> Optional[Json]:
+    if not path.exists():
+        return None
+    return deserialize(path.read_bytes())
+
+
+def pid_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, but owned by someone else
+        return True
+    return True
+
+
+def _jitter(interval: float) -> float:
+    return interval * (1 + random.uniform(-JITTER, JITTER))
+
+
+class Daemon:
+    """
+    Runs the sources for one account on a schedule till its stopped
+    """
+
+    def __init__(
+        self,
+        localdir: LocalDir,
+        intervals: Dict[str, int],
+        *,
+        driver_type: str = "chrome",
+        use_merged_file: bool = False,
+        status_file: Optional[Path] = None,
+    ) -> None:
+        unknown = intervals.keys() - DEFAULT_INTERVALS.keys()
+        if unknown:
+            raise ValueError(
+                f"Unknown sources: {sorted(unknown)}, expected one of {list(DEFAULT_INTERVALS)}"
+            )
+        self.localdir = localdir
+        self.account = Account(localdir)
+        self.driver_type = driver_type
+        self.use_merged_file = use_merged_file
+        self.status_file = status_file or status_path(localdir.username)
+        self.started_at = time.time()
+        self.running: Optional[str] = None
+        self._stop = threading.Event()
+
+        # if this ran before, continue the schedule from when each source last finished
+        previous = read_status(self.status_file) or {}
+        self.sources: Dict[str, SourceState] = {}
+        now = time.time()
+        for name in DEFAULT_INTERVALS:
+            if name not in intervals:
+                continue
+            last = previous.get("sources", {}).get(name, {}).get("last_finished")
+            next_run = now if last is None else last + intervals[name]
+            self.sources[name] = SourceState(
+                interval=intervals[name], next_run=next_run, last_finished=last
+            )
+
+    def status(self) -> Json:
+        return {
+            "username": self.localdir.username,
+            "pid": os.getpid(),
+            "started_at": int(self.started_at),
+            "heartbeat": int(time.time()),
+            "running": self.running,
+            "stopping": self._stop.is_set(),
+            "sources": {name: st._asdict() for name, st in self.sources.items()},
+        }
+
+    def write_status(self) -> None:
+        self.status_file.parent.mkdir(parents=True, exist_ok=True)
+        write_file(self.status_file, serialize_bytes(self.status()))
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """
+        Sources which should run now, in the order they should run
+        """
+        now = time.time() if now is None else now
+        return [name for name, st in self.sources.items() if st.next_run <= now]
+
+    def run_source(self, name: str) -> bool:
+        """
+        Run one source, and schedule its next run. Returns whether it succeeded
+        """
+        st = self.sources[name]
+        started = time.time()
+        self.running = name
+        self.sources[name] = st._replace(last_started=started)
+        self.write_status()
+        logger.info(f"Daemon: updating {name} for {self.localdir.username}")
+        error: Optional[str] = None
+        try:
+            self.account.update_source(
+                name,
+                driver_type=self.driver_type,
+                use_merged_file=self.use_merged_file,
+            )
+        except Exception as e:
+            logger.exception(f"Daemon: failed to update {name}")
+            error = f"{type(e).__name__}: {e}"
+            if type(e).__module__.startswith("selenium"):
+                # the browser may have crashed, start a new one next time
+                self.account.reset_drivers()
+        finished = time.time()
+        st = self.sources[name]
+        if error is None:
+            # scheduled from when this finished, so any runs which
+            # were missed while something else was running are skipped
+            self.sources[name] = st._replace(
+                runs=st.runs + 1,
+                consecutive_failures=0,
+                last_finished=finished,
+                last_duration=finished - started,
+                last_error=None,
+                next_run=finished + _jitter(st.interval),
+            )
+        else:
+            retry = min(st.interval, RETRY_INTERVAL * 2**st.consecutive_failures)
+            self.sources[name] = st._replace(
+                failures=st.failures + 1,
+                consecutive_failures=st.consecutive_failures + 1,
+                last_duration=finished - started,
+                last_error=error,
+                next_run=finished + _jitter(retry),
+            )
+        self.running = None
+        self.write_status()
+        return error is None
+
+    def run_pending(self) -> List[str]:
+        """
+        Run any sources which are due, returns the ones that ran
+        """
+        ran = []
+        for name in self.due():
+            if self._stop.is_set():
+                break
+            self.run_source(name)
+            ran.append(name)
+        if ran:
+            # the manifest is usually updated when the process exits
+            update_manifest(self.localdir.data_dir)
+        return ran
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _handle_signal(self, signum: int, frame: Any) -> None:
+        if self._stop.is_set() or self.running is None:
+            raise KeyboardInterrupt
+        logger.info(
+            f"Daemon: stopping after {self.running} finishes, send again to stop now"
+        )
+        self.stop()
+
+    def run_forever(self) -> None:
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        logger.info(
+            f"Daemon: started for {self.localdir.username}, sources: "
+            + ", ".join(f"{n} every {st.interval}s" for n, st in self.sources.items())
+        )
+        try:
+            while not self._stop.is_set():
+                self.run_pending()
+                next_run = min(st.next_run for st in self.sources.values())
+                self.write_status()
+                self._stop.wait(max(0, min(next_run - time.time(), HEARTBEAT_INTERVAL)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = None
+            self._stop.set()
+            self.write_status()
+            logger.info("Daemon: stopped")
+
+
+def describe_status(status: Json) -> Json:
+    """
+    Add whether the daemon is still alive to a status file
+    """
+    alive = pid_running(status["pid"]) and not status.get("stopping", False)
+    return {
+        **status,
+        "alive": alive,
+        "heartbeat_age": int(time.time()) - status["heartbeat"],
+    }
@@ -0,0 +1,474 @@
+"""
+Loads the parsed data for one or more accounts into a SQLite database,
+so questions can be answered with SQL instead of parsing everything again
+
+Tables are grouped by the files they're built from (e.g. entries/genres/studios/history
+are built from the list files and history, messages from the messages directory).
+A fingerprint of those files (paths, sizes and modification times) is saved
+for each account, so rebuilding only reloads the tables whose files changed
+"""
+
+import os
+import hashlib
+import sqlite3
+from pathlib import Path
+from datetime import date, datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .paths import (
+    LocalDir,
+    PathIsh,
+    cache_dir,
+    compressed_path,
+    json_exists,
+    iter_json_files,
+)
+from .list_type import ListType
+from .common import read_json
+from .log import logger
+from .parse.combine import combine, AnimeData, MangaData
+from .parse.mal_list import AnimeEntry
+from .parse.xml import export_path
+from .parse.messages import _parse_thread
+from .parse.friends import parse_friends_file
+
+default_db_path = Path(cache_dir) / "malexport" / "malexport.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    username TEXT NOT NULL,
+    source TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (username, source)
+);
+
+CREATE TABLE IF NOT EXISTS entries (
+    username TEXT NOT NULL,
+    type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    media_type TEXT,
+    -- episodes/chapters
+    total INTEGER,
+    -- watched episodes/read chapters
+    progress INTEGER,
+    volumes INTEGER,
+    read_volumes INTEGER,
+    start_date TEXT,
+    finish_date TEXT,
+    times_rewatched INTEGER,
+    rewatching INTEGER,
+    tags TEXT,
+    season_year INTEGER,
+    season TEXT,
+    airing_status TEXT,
+    mean REAL,
+    rank INTEGER,
+    popularity INTEGER,
+    source TEXT,
+    average_episode_duration INTEGER,
+    rating TEXT,
+    nsfw TEXT,
+    PRIMARY KEY (username, type, id)
+);
+CREATE INDEX IF NOT EXISTS entries_id ON entries (type, id);
+CREATE INDEX IF NOT EXISTS entries_status ON entries (status);
+CREATE INDEX IF NOT EXISTS entries_season ON entries (season_year, season);
+
+CREATE TABLE IF NOT EXISTS genres (
+    username TEXT NOT NULL,
+    type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    genre_id INTEGER NOT NULL,
+    genre TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS genres_entry ON genres (username, type, id);
+CREATE INDEX IF NOT EXISTS genres_genre ON genres (genre);
+
+CREATE TABLE IF NOT EXISTS studios (
+    username TEXT NOT NULL,
+    type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    studio_id INTEGER NOT NULL,
+    studio TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS studios_entry ON studios (username, type, id);
+CREATE INDEX IF NOT EXISTS studios_studio ON studios (studio);
+
+CREATE TABLE IF NOT EXISTS history (
+    username TEXT NOT NULL,
+    type TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    -- episode/chapter
+    number INTEGER NOT NULL,
+    -- unix timestamp
+    at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_entry ON history (username, type, id);
+CREATE INDEX IF NOT EXISTS history_at ON history (at);
+
+CREATE TABLE IF NOT EXISTS messages (
+    username TEXT NOT NULL,
+    thread_id INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    at INTEGER,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_thread ON messages (username, thread_id);
+CREATE INDEX IF NOT EXISTS messages_at ON messages (at);
+
+CREATE TABLE IF NOT EXISTS forum_posts (
+    username TEXT NOT NULL,
+    topic_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    comment_id INTEGER NOT NULL,
+    poster TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS forum_posts_topic ON forum_posts (username, topic_id);
+CREATE INDEX IF NOT EXISTS forum_posts_poster ON forum_posts (poster);
+
+CREATE TABLE IF NOT EXISTS friends (
+    username TEXT NOT NULL,
+    friend TEXT NOT NULL,
+    url TEXT NOT NULL,
+    image_url TEXT,
+    friends_since INTEGER,
+    last_online INTEGER
+);
+CREATE INDEX IF NOT EXISTS friends_username ON friends (username);
+"""
+
+Row = Tuple[Any, ...]
+
+
+class Source(NamedTuple):
+    """
+    A group of tables, and the files/directories (relative to
+    the data directory) they're loaded from
+    """
+
+    name: str
+    tables: Sequence[str]
+    paths: Sequence[str]
+    load: Callable[[Path, str, sqlite3.Connection], None]
+
+
+def fingerprint(data_dir: Path, paths: Sequence[str]) -> str:
+    """
+    A hash of the name/size/mtime of each file in paths (files or directories),
+    which changes whenever any of those files are added, removed or modified
+    """
+    digest = hashlib.sha256()
+
+    def _add(path: str) -> None:
+        st = os.stat(path)
+        digest.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+
+    for rel in paths:
+        full = data_dir / rel
+        if full.is_dir():
+            for root, dirs, names in os.walk(full):
+                dirs.sort()
+                for name in sorted(names):
+                    _add(os.path.join(root, name))
+        else:
+            # could be stored compressed
+            for candidate in (full, compressed_path(full)):
+                if candidate.exists():
+                    _add(str(candidate))
+    return digest.hexdigest()
+
+
+def _iso(d: Optional[date]) -> Optional[str]:
+    return d.isoformat() if d is not None else None
+
+
+def _ts(dt: Optional[datetime]) -> Optional[int]:
+    return int(dt.timestamp()) if dt is not None else None
+
+
+def _insert(conn: sqlite3.Connection, table: str, rows: Iterable[Row]) -> None:
+    cols = len(conn.execute(f"SELECT * FROM {table} LIMIT 0").description)
+    conn.executemany(
+        f"INSERT INTO {table} VALUES ({', '.join('?' * cols)})",
+        rows,
+    )
+
+
+def _anime_row(username: str, a: AnimeData) -> Row:
+    x, j, api = a.XMLData, a.JSONList, a.APIList
+    season = j.season if j is not None else (api.season if api is not None else None)
+    return (
+        username,
+        "anime",
+        x.id,
+        x.title,
+        x.status,
+        x.score,
+        x.media_type,
+        x.episodes,
+        x.watched_episodes,
+        None,
+        None,
+        _iso(x.start_date),
+        _iso(x.finish_date),
+        x.times_watched,
+        int(x.rewatching),
+        x.tags,
+        season.year if season is not None else None,
+        season.season if season is not None else None,
+        j.airing_status if j is not None else (api.status if api else None),
+        api.mean if api else None,
+        api.rank if api else None,
+        api.popularity if api else None,
+        api.source if api else None,
+        api.average_episode_duration if api else None,
+        api.rating if api else None,
+        api.nsfw if api else None,
+    )
+
+
+def _manga_row(username: str, m: MangaData) -> Row:
+    x, j, api = m.XMLData, m.JSONList, m.APIList
+    season = api.season if api is not None else None
+    return (
+        username,
+        "manga",
+        x.id,
+        x.title,
+        x.status,
+        x.score,
+        j.media_type if j is not None else (api.media_type if api else None),
+        x.chapters,
+        x.read_chapters,
+        x.volumes,
+        x.read_volumes,
+        _iso(x.start_date),
+        _iso(x.finish_date),
+        x.times_read,
+        int(x.rereading),
+        x.tags,
+        season.year if season is not None else None,
+        season.season if season is not None else None,
+        j.publishing_status if j is not None else (api.status if api else None),
+        api.mean if api else None,
+        api.rank if api else None,
+        api.popularity if api else None,
+        None,
+        None,
+        None,
+        api.nsfw if api else None,
+    )
+
+
+def _load_lists(data_dir: Path, username: str, conn: sqlite3.Connection) -> None:
+    if not export_path(data_dir, ListType.ANIME).exists():
+        logger.warning(f"No XML export in {data_dir}, skipping entries/history")
+        return
+    anime, manga = combine(username, data_dir=data_dir)
+    _insert(conn, "entries", (_anime_row(username, a) for a in anime))
+    _insert(conn, "entries", (_manga_row(username, m) for m in manga))
+    for type_, items in (("anime", anime), ("manga", manga)):
+        entries: List[Union[AnimeData, MangaData]] = list(items)
+        genres: List[Row] = []
+        studios: List[Row] = []
+        history: List[Row] = []
+        for e in entries:
+            j, api = e.JSONList, e.APIList
+            # prefer the list data, fallback to the API
+            for g in (j.genres if j is not None else []) or (
+                api.genres if api is not None else []
+            ):
+                genres.append((username, type_, e.id, g.id, g.name))
+            ent_studios = api.studios if api is not None else []
+            if isinstance(j, AnimeEntry) and j.studios:
+                ent_studios = j.studios
+            for st in ent_studios:
+                studios.append((username, type_, e.id, st.id, st.name))
+            for h in e.history:
+                history.append((username, type_, e.id, h.number, _ts(h.at)))
+        _insert(conn, "genres", genres)
+        _insert(conn, "studios", studios)
+        _insert(conn, "history", history)
+
+
+def _load_messages(data_dir: Path, username: str, conn: sqlite3.Connection) -> None:
+    msg_dir = data_dir / "messages"
+    if not msg_dir.exists():
+        return
+    rows: List[Row] = []
+    for thread_file in iter_json_files(msg_dir):
+        thread = _parse_thread(thread_file)
+        for msg in thread.messages:
+            rows.append(
+                (
+                    username,
+                    thread.thread_id,
+                    thread.subject,
+                    msg.username,
+                    _ts(msg.at),
+                    msg.content,
+                )
+            )
+    _insert(conn, "messages", rows)
+
+
+def _load_forum(data_dir: Path, username: str, conn: sqlite3.Connection) -> None:
+    forum_dir = data_dir / "forum"
+    if not forum_dir.exists():
+        return
+    rows: List[Row] = []
+    for forum_path in iter_json_files(forum_dir):
+        # skip index.json
+        if not forum_path.stem.isnumeric():
+            continue
+        data = read_json(forum_path)
+        for post in data["posts"]:
+            rows.append(
+                (
+                    username,
+                    int(forum_path.stem),
+                    data["title"],
+                    post["id"],
+                    post["created_by"]["name"],
+                    _ts(datetime.fromisoformat(post["created_at"])),
+                    post["body"],
+                )
+            )
+    _insert(conn, "forum_posts", rows)
+
+
+def _load_friends(data_dir: Path, username: str, conn: sqlite3.Connection) -> None:
+    friends_path = data_dir / "friends.json"
+    if not json_exists(friends_path):
+        return
+    _insert(
+        conn,
+        "friends",
+        (
+            (
+                username,
+                f.username,
+                f.url,
+                f.image_url,
+                _ts(f.friends_since),
+                _ts(f.last_online),
+            )
+            for f in parse_friends_file(friends_path)
+        ),
+    )
+
+
+SOURCES = (
+    Source(
+        name="lists",
+        tables=("entries", "genres", "studios", "history"),
+        paths=(
+            "animelist.xml",
+            "animelist.xml.gz",
+            "mangalist.xml",
+            "mangalist.xml.gz",
+            "animelist.json",
+            "mangalist.json",
+            "animelist_api.json",
+            "mangalist_api.json",
+            "anime_history.json",
+            "manga_history.json",
+            "manual_history.yaml",
+            "history",
+        ),
+        load=_load_lists,
+    ),
+    Source(
+        name="messages", tables=("messages",), paths=("messages",), load=_load_messages
+    ),
+    Source(name="forum", tables=("forum_posts",), paths=("forum",), load=_load_forum),
+    Source(
+        name="friends", tables=("friends",), paths=("friends.json",), load=_load_friends
+    ),
+)
+
+
+def connect(db_path: PathIsh = default_db_path) -> sqlite3.Connection:
+    path = Path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def build_db(
+    username: str,
+    db_path: PathIsh = default_db_path,
+    data_dir: Optional[Path] = None,
+    force: bool = False,
+) -> List[str]:
+    """
+    Load the data for an account into the database. Only reloads the tables
+    whose files changed since the last build, unless force is True
+
+    Returns the names of the sources which were reloaded
+    """
+    if data_dir is None:
+        data_dir = LocalDir.from_username(username).data_dir
+    conn = connect(db_path)
+    rebuilt: List[str] = []
+    try:
+        for source in SOURCES:
+            fp = fingerprint(data_dir, source.paths)
+            row = conn.execute(
+                "SELECT fingerprint FROM fingerprints WHERE username = ? AND source = ?",
+                (username, source.name),
+            ).fetchone()
+            if not force and row is not None and row[0] == fp:
+                logger.debug(f"{source.name} for {username} hasn't changed, skipping")
+                continue
+            logger.info(f"Loading {source.name} for {username}")
+            # replace everything for this source in one transaction
+            with conn:
+                for table in source.tables:
+                    conn.execute(f"DELETE FROM {table} WHERE username = ?", (username,))
+                source.load(data_dir, username, conn)
+                conn.execute(
+                    "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)",
+                    (username, source.name, fp),
+                )
+            rebuilt.append(source.name)
+    finally:
+        conn.close()
+    return rebuilt
+
+
+def query(
+    sql: str, params: Sequence[Any] = (), db_path: PathIsh = default_db_path
+) -> Iterator[Dict[str, Any]]:
+    """
+    Run a query against the database (opened read-only), yielding each row as a dict
+    """
+    path = Path(db_path)
+    if not path.exists():
+        raise FileNotFoundError(f"{path} doesn't exist, run 'malexport db build' first")
+    conn = sqlite3.connect(f"{path.absolute().as_uri()}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        for row in conn.execute(sql, params):
+            yield dict(row)
+    finally:
+        conn.close()
@@ -0,0 +1,140 @@
+"""
+An append-only log of what changed each time the data is updated
+(entries added/removed/changed on your list, new history, new messages/forum posts),
+so other tools can process what changed without having to parse everything again
+
+Events are appended to events.jsonl in the data directory, one JSON object per line:
+
+{"at": 1650000000, "type": "history.added", "data": {...}}
+
+Since events are appended as they happen, the file is sorted by 'at', so
+reading the events since some time seeks to them instead of reading the
+entire file
+"""
+
+import os
+import re
+import time
+from pathlib import Path
+from collections import Counter
+from typing import NamedTuple, List, Iterator, Optional, Iterable, Any, IO
+
+from .common import Json, serialize_bytes, deserialize, append_lines
+from .paths import PathIsh
+from .list_history import ListChanges
+
+EVENTS_NAME = "events.jsonl"
+
+AT_PREFIX = re.compile(rb'^\{"at":\s*(\d+)')
+
+
+class Event(NamedTuple):
+    at: int
+    type: str
+    data: Json
+
+
+def list_events(list_name: str, changes: ListChanges) -> List[Event]:
+    """
+    Events for the changes to a list (from list_history), list_name
+    is the name of the list file, e.g. animelist or mangalist_api
+    """
+    at = int(time.time())
+    events: List[Event] = []
+    for mal_id, state in sorted(changes.added.items()):
+        events.append(
+            Event(at, "list.added", {"list": list_name, "id": mal_id, "state": state})
+        )
+    for mal_id in sorted(changes.removed):
+        events.append(Event(at, "list.removed", {"list": list_name, "id": mal_id}))
+    for mal_id, fields in sorted(changes.changed.items()):
+        events.append(
+            Event(
+                at, "list.changed", {"list": list_name, "id": mal_id, "fields": fields}
+            )
+        )
+    return events
+
+
+def new_items(old: Iterable[Any], new: Iterable[Any]) -> List[Any]:
+    """
+    Items in new which aren't in old (counting duplicates, so if
+    something appears twice in new but once in old, its included once)
+    """
+
+    # items are JSON, so lists have to be converted to be hashable
+    def _key(o: Any) -> Any:
+        return serialize_bytes(o)
+
+    remaining = Counter(_key(o) for o in old)
+    added = []
+    for item in new:
+        k = _key(item)
+        if remaining[k] > 0:
+            remaining[k] -= 1
+        else:
+            added.append(item)
+    return added
+
+
+def _line_at(line: bytes) -> Optional[int]:
+    m = AT_PREFIX.match(line)
+    return int(m.group(1)) if m is not None else None
+
+
+class EventLog:
+    def __init__(self, data_dir: PathIsh) -> None:
+        self.path = Path(data_dir) / EVENTS_NAME
+
+    def emit(self, type: str, data: Json) -> None:
+        self.emit_many([Event(int(time.time()), type, data)])
+
+    def emit_many(self, events: Iterable[Event]) -> None:
+        lines = b"".join(serialize_bytes(e._asdict()) + b"\n" for e in events)
+        if not lines:
+            return
+        # removes a partially written line (if it was killed while
+        # writing), so the new events start on their own line
+        append_lines(self.path, lines)
+
+    @staticmethod
+    def _offset_since(f: IO[bytes], size: int, since: int) -> int:
+        """
+        Binary search for (roughly) the first line with at >= since,
+        the caller skips any earlier lines after this
+        """
+        lo, hi = 0, size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            f.seek(mid)
+            if mid > 0:
+                # skip to the start of the next line
+                f.readline()
+            start = f.tell()
+            line = f.readline()
+            at = _line_at(line) if line else None
+            if at is not None and at < since:
+                lo = start + len(line)
+            else:
+                hi = mid
+        return lo
+
+    def since(self, since: Optional[int] = None) -> Iterator[Event]:
+        """
+        Events which happened on or after since (a unix timestamp),
+        or all events if since is None
+        """
+        if not self.path.exists():
+            return
+        with self.path.open("rb") as f:
+            if since is not None:
+                f.seek(self._offset_since(f, os.fstat(f.fileno()).st_size, since))
+            for line in f:
+                at = _line_at(line)
+                # a partially written line, if the process was killed
+                if at is None or not line.endswith(b"\n"):
+                    continue
+                if since is not None and at < since:
+                    continue
+                data = deserialize(line)
+                yield Event(at=data["at"], type=data["type"], data=data["data"])
@@ -1,6 +1,7 @@
-from typing import Optional, Union
+from typing import Optional, Union, Tuple
 
 from ..paths import LocalDir
+from ..manifest import track
 from ..list_type import ListType
 from .mal_list import MalList
 from .api_list import APIList
@@ -10,7 +11,23 @@ from .forum import ForumManager
 from .export_downloader import ExportDownloader
 from .friends import FriendDownloader
 from .messages import MessageDownloader
-from .driver import Browser
+from .driver import Browser, webdriver
+from .work_queue import TimeBudget
+from ..log import logger
+
+# names of each updater, as used by the daemon/batch updates
+SOURCES: Tuple[str, ...] = (
+    "lists",
+    "api-lists",
+    "export",
+    "history",
+    "forum",
+    "friends",
+    "messages",
+)
+
+# sources which use the (selenium) browser
+BROWSER_SOURCES: Tuple[str, ...] = ("export", "history", "messages")
 
 
 class Account:
@@ -20,6 +37,8 @@ class Account:
 
     def __init__(self, localdir: LocalDir):
         self.localdir = localdir
+        # update the manifest for the data directory once this is done
+        track(self.localdir.data_dir)
         self.animelist = MalList(list_type=ListType.ANIME, localdir=self.localdir)
         self.mangalist = MalList(list_type=ListType.MANGA, localdir=self.localdir)
         self.animelist_api: Optional[APIList] = None
@@ -51,7 +70,12 @@ class Account:
         This authenticates the mal_session using the API
         If never done before, runs the OAuth flow. Else loads
         the access token from the config file
+
+        The session is kept once its been created, it refreshes
+        the token itself if it expires
         """
+        if self.mal_session is not None:
+            return self.mal_session
         client_info = self.localdir.load_or_prompt_mal_client_info()
         self.mal_session = MalSession(
             client_id=client_info["client_id"], localdir=self.localdir
@@ -59,6 +83,46 @@ class Account:
         self.mal_session.authenticate()
         return self.mal_session
 
+    def reset_drivers(self) -> None:
+        """
+        Quit and forget the browser, so the next update which needs one
+        starts a new browser and logs in again (e.g. if it crashed)
+        """
+        drivers = [
+            self._shared_driver,
+            (
+                self.anime_episode_history._driver
+                if self.anime_episode_history is not None
+                else None
+            ),
+            (
+                self.manga_chapter_history._driver
+                if self.manga_chapter_history is not None
+                else None
+            ),
+            (
+                self.export_downloader._driver
+                if self.export_downloader is not None
+                else None
+            ),
+            self.message_manager.driver if self.message_manager is not None else None,
+        ]
+        for driver in {id(d): d for d in drivers if d is not None}.values():
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.debug(f"Failed to quit browser: {e}")
+        webdriver.cache_clear()
+        self._shared_driver = None
+        for manager in (
+            self.anime_episode_history,
+            self.manga_chapter_history,
+            self.export_downloader,
+        ):
+            if manager is not None:
+                manager._driver = None
+        self.message_manager = None
+
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(localdir={self.localdir})"
 
@@ -69,6 +133,31 @@ class Account:
         """Alternate constructor to create an account from MAL username"""
         return Account(localdir=LocalDir.from_username(username))
 
+    def update_source(
+        self, source: str, driver_type: str = "chrome", use_merged_file: bool = False
+    ) -> None:
+        """
+        Run one of the updaters by name (one of SOURCES)
+        """
+        if source == "lists":
+            self.update_lists()
+        elif source == "api-lists":
+            self.update_api_lists()
+        elif source == "export":
+            self.update_exports()
+        elif source == "history":
+            self.update_history(
+                driver_type=driver_type, use_merged_file=use_merged_file
+            )
+        elif source == "forum":
+            self.update_forum_posts()
+        elif source == "friends":
+            self.update_friends()
+        elif source == "messages":
+            self.update_messages()
+        else:
+            raise ValueError(f"Unknown source {source}, expected one of {SOURCES}")
+
     def update_lists(self, only: Optional[ListType] = None) -> None:
         """
         Uses the load.json endpoint to request anime/manga lists.
@@ -123,12 +212,16 @@ class Account:
         count: Optional[int] = None,
         driver_type: str = "chrome",
         use_merged_file: bool = False,
+        time_budget: Optional[float] = None,
     ) -> None:
         """
         Uses selenium to download episode/chapter history one entry at a time.
 
         This takes quite a while, and requires authentication (MAL Username/Password)
         If count is specified, only requests the first 'count' IDs found in your history
+
+        If time_budget (seconds) is specified, requests entries in order of priority
+        till it runs out instead, see HistoryManager.update_history_budgeted
         """
         if self.anime_episode_history is None:
             self.anime_episode_history = HistoryManager(
@@ -148,26 +241,50 @@ class Account:
         if self.shared_driver is not None:
             self.anime_episode_history._driver = self.shared_driver
             self.manga_chapter_history._driver = self.shared_driver
-        if only == ListType.ANIME or only is None:
-            self.anime_episode_history.update_history(count=count)
-        if only == ListType.MANGA or only is None:
-            self.manga_chapter_history.update_history(count=count)
+        if time_budget is not None:
+            total = TimeBudget(time_budget)
+            if only == ListType.ANIME or only is None:
+                # if updating both, anime gets half, manga gets whatever is left
+                self.anime_episode_history.update_history_budgeted(
+                    TimeBudget(time_budget / 2 if only is None else time_budget),
+                    count=count,
+                )
+            if only == ListType.MANGA or only is None:
+                self.manga_chapter_history.update_history_budgeted(
+                    TimeBudget(total.remaining()), count=count
+                )
+        else:
+            if only == ListType.ANIME or only is None:
+                self.anime_episode_history.update_history(count=count)
+            if only == ListType.MANGA or only is None:
+                self.manga_chapter_history.update_history(count=count)
         # if driver was set here, save it
         self.shared_driver = self.anime_episode_history._driver
         self.shared_driver = self.manga_chapter_history._driver
 
     def update_messages(
-        self, start_page: int = 1, thread_count: Optional[int] = None
+        self,
+        start_page: int = 1,
+        thread_count: Optional[int] = None,
+        time_budget: Optional[float] = None,
     ) -> None:
         """
         Download/Update DMs for your account
+
+        If time_budget (seconds) is specified, requests threads in order of priority
+        till it runs out instead, see MessageDownloader.update_messages_budgeted
         """
         if self.message_manager is None:
             self.message_manager = MessageDownloader(
                 self.localdir,
                 till_same_limit=thread_count,
             )
-        self.message_manager.update_messages(start_page=start_page)
+        if time_budget is not None:
+            self.message_manager.update_messages_budgeted(
+                TimeBudget(time_budget), start_page=start_page
+            )
+        else:
+            self.message_manager.update_messages(start_page=start_page)
 
     def update_forum_posts(self) -> None:
         """
@@ -6,8 +6,10 @@ from typing import List
 from pathlib import Path
 
 from ..list_type import ListType
-from ..common import Json, serialize
+from ..common import Json, serialize, write_json
 from ..paths import LocalDir
+from ..list_history import ListHistory, api_entry_state
+from ..events import EventLog, list_events
 from .mal_session import MalSession
 
 BASE_URL = "https://api.myanimelist.net/v2/users/{username}/{list_type}list?limit=100&offset=0&nsfw=true&fields=id,title,main_picture,alternative_titles,start_date,end_date,synopsis,mean,rank,popularity,num_list_users,num_scoring_users,nsfw,created_at,updated_at,media_type,status,genres,my_list_status,num_episodes,start_season,broadcast,source,average_episode_duration,rating,pictures,background,related_anime,related_manga,recommendations,studios,statistics"
@@ -48,4 +50,10 @@ class APIList:
             for entry in resp:
                 data.append(entry["node"])
         encoded_data = serialize(data)
-        self.list_path.write_text(encoded_data)
+        write_json(self.list_path, encoded_data)
+        changes = ListHistory.from_list_file(self.list_path).record(
+            dict(api_entry_state(entry) for entry in data)
+        )
+        EventLog(self.localdir.data_dir).emit_many(
+            list_events(self.list_path.stem, changes)
+        )
@@ -89,9 +89,19 @@ LOGIN_BUTTON_CSS = ".inputButton.btn-form-submit[value='Login']"
 def driver_login(webdriver: Browser, localdir: LocalDir) -> None:
     """
     Login using the users MAL username and password
+
+    The browser is shared by every account in this process, so if
+    its logged in as some other account, this logs in again
     """
-    if hasattr(webdriver, "_malexport_logged_in"):
+    logged_in_as = getattr(webdriver, "_malexport_logged_in", None)
+    if logged_in_as == localdir.username:
         return
+    if logged_in_as is not None:
+        logger.info(f"Logging out of {logged_in_as}...")
+        # cookies can only be deleted for the current domain
+        webdriver.get(LOGIN_PAGE)
+        webdriver.delete_all_cookies()
+        delattr(webdriver, "_malexport_logged_in")
     creds = localdir.load_or_prompt_credentials()
     logger.info(f"Logging into {creds['username']}...")
     time.sleep(1)
@@ -111,7 +121,7 @@ def driver_login(webdriver: Browser, localdir: LocalDir) -> None:
             default=True,
             show_default=False,
         )
-    setattr(webdriver, "_malexport_logged_in", True)
+    setattr(webdriver, "_malexport_logged_in", localdir.username)
 
 
 # wait a random amount of time to be nice to MAL servers
@@ -4,8 +4,9 @@ Exports your list as XML from MAL using Selenium
 
 import os
 import time
-import shutil
 import gzip
+import hashlib
+from pathlib import Path
 from typing import List, Optional
 
 from selenium.webdriver.support.ui import WebDriverWait  # type: ignore[import]
@@ -16,6 +17,7 @@ from selenium.common.exceptions import TimeoutException, WebDriverException  # t
 from .driver import webdriver, driver_login, wait, TEMP_DOWNLOAD_DIR, Browser
 from ..list_type import ListType
 from ..paths import LocalDir
+from ..common import write_file
 from ..log import logger
 
 TRY_EXPORT_TIMES = int(os.environ.get("MALEXPORT_EXPORT_TRIES", 3))
@@ -35,8 +37,8 @@ class ExportDownloader:
         self, localdir: LocalDir, unlink_temp_gz_files: bool = UNLINK_TEMP_GZ_FILES
     ):
         self.localdir = localdir
-        self.animelist_path = self.localdir.data_dir / "animelist.xml"
-        self.mangalist_path = self.localdir.data_dir / "mangalist.xml"
+        self.animelist_path = self.localdir.data_dir / "animelist.xml.gz"
+        self.mangalist_path = self.localdir.data_dir / "mangalist.xml.gz"
         self._driver: Optional[Browser] = None
         self._unlink_temp_gz_files = unlink_temp_gz_files
 
@@ -52,11 +54,11 @@ class ExportDownloader:
         driver_login(self.driver, self.localdir)
 
     def export_lists(self) -> None:
-        """Exports the anime/manga lists, then extracts the gz files into the data dir"""
+        """Exports the anime/manga lists, then copies the gz files into the data dir"""
         self.authenticate()
         self.export_with_retry(ListType.ANIME)
         self.export_with_retry(ListType.MANGA)
-        self.extract_gz_files()
+        self.store_gz_files()
         self.cleanup_gz_files()
 
     def export_with_retry(self, list_type: ListType, *, times: int = 0) -> None:
@@ -146,10 +148,12 @@ class ExportDownloader:
         logger.debug(archive_files)
         return archive_files
 
-    def extract_gz_files(self) -> None:
+    def store_gz_files(self) -> None:
         """
         Wait till two files (the anime/manga gz files) exist in the temporary download
-        directory, then extract them to the data directory
+        directory, then copy them to the data directory
+
+        The exports are kept compressed, the parsers decompress them while reading
         """
         while (
             len(self._list_files(list_type=ListType.ANIME)) < 1
@@ -175,11 +179,14 @@ class ExportDownloader:
             ],
             [self.animelist_path, self.mangalist_path],
         ):
-            archive_path = os.path.join(TEMP_DOWNLOAD_DIR, archive_name)
-            logger.info(f"Extracting {archive_path} to {target}")
-            with gzip.open(archive_path, "rb") as gz_in:
-                with target.open("wb") as f:
-                    shutil.copyfileobj(gz_in, f)
+            archive_path = Path(TEMP_DOWNLOAD_DIR) / archive_name
+            # also makes sure the download is a valid gzip file
+            digest = export_digest(archive_path)
+            if target.exists() and export_digest(target) == digest:
+                logger.info(f"{archive_path} matches {target}, skipping")
+            else:
+                logger.info(f"Copying {archive_path} to {target}")
+                write_file(target, archive_path.read_bytes())
 
     def cleanup_gz_files(self) -> None:
         if self._unlink_temp_gz_files is False:
@@ -190,3 +197,15 @@ class ExportDownloader:
             if os.path.isfile(gz_file):  # acts as an os.path.exists check
                 logger.debug(f"Unlinking {gz_file}")
                 os.unlink(gz_file)
+
+
+def export_digest(gz_file: Path) -> str:
+    """
+    Hash the decompressed contents of a gzipped export, so that
+    exports which differ only in their gzip header match
+    """
+    digest = hashlib.sha256()
+    with gzip.open(gz_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 64), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
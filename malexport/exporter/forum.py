@@ -6,9 +6,9 @@ import json
 from typing import Iterator
 
 from .mal_session import MalSession
-from ..paths import LocalDir, _expand_path
-from ..common import Json, serialize
-
+from ..paths import LocalDir, _expand_path, json_exists
+from ..common import Json, serialize, read_json, write_json
+from ..events import EventLog, new_items
 
 # one is created by, one is commented on, doesn't really matter which is which
 FORUM_BASES = [
@@ -46,8 +46,8 @@ class ForumManager:
         """
         Assuming the forum index exists, load the JSON file
         """
-        assert self.forum_index_path.exists(), "Forum index doesn't exist!"
-        return json.loads(self.forum_index_path.read_text())
+        assert json_exists(self.forum_index_path), "Forum index doesn't exist!"
+        return read_json(self.forum_index_path)
 
     def update_forum_index(self) -> None:
         """
@@ -56,7 +56,7 @@ class ForumManager:
         """
         data = list(self.download_forum_index())
         data_json = serialize(data)
-        self.forum_index_path.write_text(data_json)
+        write_json(self.forum_index_path, data_json)
 
     def update_changed_forum_posts(self) -> None:
         """
@@ -97,8 +97,8 @@ class ForumPost:
         Determine whether or not the forum post has new data, by looking at the last_post_created_at
         (downloaded in the forum index)
         """
-        if self.forum_path.exists():
-            data = json.loads(self.forum_path.read_text())
+        if json_exists(self.forum_path):
+            data = read_json(self.forum_path)
             if "last_post_created_at" in data:
                 # if these aren't the same, the data has changed, should update
                 return str(data["last_post_created_at"]) != self.last_post_created_at
@@ -133,5 +133,21 @@ class ForumPost:
         """
         if not self.forum_post_has_changed():
             return
-        data_json = json.dumps(self.download_forum_post())
-        self.forum_path.write_text(data_json)
+        old_data = read_json(self.forum_path) if json_exists(self.forum_path) else None
+        data = self.download_forum_post()
+        data_json = json.dumps(data)
+        write_json(self.forum_path, data_json)
+        posts = new_items(
+            old_data.get("posts", []) if old_data else [], data.get("posts", [])
+        )
+        # the topic changed (e.g. a post was edited), but nothing new was posted
+        if old_data is not None and not posts:
+            return
+        EventLog(self.localdir.data_dir).emit(
+            "forum.topic_added" if old_data is None else "forum.topic_updated",
+            {
+                "topic_id": self.forum_id,
+                "title": data.get("title"),
+                "posts": posts,
+            },
+        )
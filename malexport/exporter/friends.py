@@ -3,7 +3,13 @@ from typing import List
 import requests
 
 from ..paths import LocalDir, _expand_file
-from ..common import safe_request_json, Json, serialize
+from ..common import (
+    safe_request_json,
+    default_http_cache,
+    Json,
+    serialize,
+    write_json,
+)
 from ..log import logger
 
 
@@ -26,7 +32,9 @@ class FriendDownloader:
         data: List[Json] = []
         while True:
             try:
-                new_data = safe_request_json(self.friend_page_url(page))
+                new_data = safe_request_json(
+                    self.friend_page_url(page), cache=default_http_cache()
+                )
                 assert (
                     "data" in new_data
                 ), f"No friends key in Jikan response: {new_data}"
@@ -54,4 +62,4 @@ class FriendDownloader:
                 f"No friends found for {self.localdir.username} (could've failed to request, or user has no friends), skipping write to file..."
             )
             return
-        self.friend_index_path.write_text(serialize(friends))
+        write_json(self.friend_index_path, serialize(friends))
@@ -7,12 +7,11 @@ this info isn't accessible from the API
 
 import os
 import re
-import json
 import time
 import atexit
 from itertools import islice
 from pathlib import Path
-from typing import Tuple, List, Optional, Iterable, Dict, Any, Union, Set
+from typing import Tuple, List, Optional, Iterable, Dict, Any, Union, Set, Callable
 from datetime import datetime
 
 from lxml import html as ht  # type: ignore[import]
@@ -23,12 +22,20 @@ from selenium.webdriver.support import expected_conditions as EC  # type: ignore
 from ..list_type import ListType
 from .mal_list import MalList
 from .driver import webdriver, driver_login, wait, Browser
-from .export_downloader import ExportDownloader
 from ..log import logger
-from ..paths import LocalDir, _expand_path
-from ..common import Json, extract_query_value, serialize
-from ..parse.xml import parse_xml
-
+from ..paths import LocalDir, _expand_path, json_exists
+from ..common import Json, extract_query_value, serialize, read_json, write_json
+from ..parse.xml import parse_xml, export_path
+from ..events import EventLog, new_items
+from ..list_history import ListHistory
+from .work_queue import (
+    WorkQueue,
+    CrawlCheckpoint,
+    TimeBudget,
+    TIER_RECENT,
+    TIER_MISSING,
+    TIER_STALE,
+)
 
 HISTORY_URL = "https://myanimelist.net/ajaxtb.php?keepThis=true&detailed{list_type_letter}id={entry_id}&TB_iframe=true&height=420&width=390"
 
@@ -46,6 +53,9 @@ def history_url(list_type: ListType, entry_id: int) -> str:
 # are the same as the previous then stop requesting
 TILL_SAME_LIMIT = int(os.environ.get("MALEXPORT_EPISODE_LIMIT", 5))
 
+# with a time budget, only refresh entries which haven't been requested for this many seconds
+REFRESH_AFTER = int(os.environ.get("MALEXPORT_HISTORY_REFRESH_AFTER", 60 * 60 * 24 * 7))
+
 EPISODE_COL_REGEX = re.compile(
     r"Ep (\d+), watched on (\d+)\/(\d+)\/(\d+) at (\d+):(\d+)"
 )
@@ -112,8 +122,8 @@ class HistoryManager:
                 self.localdir.data_dir / f"{self.list_type.value}_history.json",
                 is_dir=False,
             )
-            if self.history_path.exists():
-                self.merged_data = json.loads(self.history_path.read_text())
+            if json_exists(self.history_path):
+                self.merged_data = read_json(self.history_path)
             else:
                 self.merged_data = {}
             _register_atexit(self.history_path, self)
@@ -133,6 +143,8 @@ class HistoryManager:
         self.idprefix = "chaprow" if self.list_type == ListType.MANGA else "eprow"
         self.driver_type = driver_type
         self._driver: Optional[Browser] = None
+        self.events = EventLog(self.localdir.data_dir)
+        self.checkpoint: Optional[CrawlCheckpoint] = None
 
     @property
     def driver(self) -> Browser:
@@ -156,7 +168,7 @@ class HistoryManager:
             assert self.merged_data is not None
             return str(entry_id) in self.merged_data
         else:
-            return self.entry_path(entry_id).exists()
+            return json_exists(self.entry_path(entry_id))
 
     def save_data(self, entry_id: int, new_data: Json) -> bool:
         """
@@ -167,25 +179,45 @@ class HistoryManager:
             assert self.merged_data is not None
             key = str(entry_id)
             has_new_data = True
+            old_data = None
             if key in self.merged_data:
                 old_data = self.merged_data[str(entry_id)]
                 has_new_data = old_data != new_data
             self.merged_data[str(entry_id)] = new_data
+            self._emit_new_history(entry_id, old_data, new_data)
             return has_new_data
         else:
             has_new_data = True
             p = self.entry_path(entry_id)
             logger.debug(f"Saving {entry_id} to {p}...")
-            if p.exists():
-                old_data = json.loads(p.read_text())
+            old_data = None
+            if json_exists(p):
+                old_data = read_json(p)
                 # if these aren't the same, the data has changed,
                 # we should keep searching for new episode information
                 has_new_data = old_data != new_data
             new_data_json = serialize(new_data)
             # this saves even if there is no episode history, so we can compare when updating
-            p.write_text(new_data_json)
+            write_json(p, new_data_json)
+            self._emit_new_history(entry_id, old_data, new_data)
             return has_new_data
 
+    def _emit_new_history(
+        self, entry_id: int, old_data: Optional[Json], new_data: Json
+    ) -> None:
+        old_episodes = old_data.get("episodes", []) if old_data else []
+        added = new_items(old_episodes, new_data.get("episodes", []))
+        if added:
+            self.events.emit(
+                "history.added",
+                {
+                    "type": self.list_type.value,
+                    "id": entry_id,
+                    "title": new_data.get("title"),
+                    "episodes": added,
+                },
+            )
+
     def _save_merged_file(self) -> None:
         data = serialize(self.merged_data)
         assert self.merged_data is not None
@@ -193,7 +225,7 @@ class HistoryManager:
         logger.debug(
             f"Writing merged JSON file: {self.history_path}, total {'episode' if self.list_type == ListType.ANIME else 'chapter'} count: {total_eps}"
         )
-        self.history_path.write_text(data)
+        write_json(self.history_path, data)
 
     def _extract_details(self, html_details: str) -> Json:
         """
@@ -304,7 +336,152 @@ class HistoryManager:
             and len(self.already_requested) % 10 == 0
         ):
             self._save_merged_file()
-        return self.save_data(entry_id, new_data)
+        has_new_data = self.save_data(entry_id, new_data)
+        if self.checkpoint is not None:
+            # with the merged file, the data is saved in the checkpoint
+            # till the merged file is written
+            self.checkpoint.complete(
+                entry_id, new_data if self.use_merged_file else None
+            )
+        return has_new_data
+
+    @property
+    def checkpoint_path(self) -> Path:
+        # not a .json file, so its not treated as data
+        return self.localdir.data_dir / f".checkpoint_history_{self.list_type.value}"
+
+    @property
+    def budgeted_checkpoint_path(self) -> Path:
+        # budgeted updates don't plan which IDs to request, so they
+        # can't share a checkpoint with a regular update
+        return (
+            self.localdir.data_dir
+            / f".checkpoint_history_{self.list_type.value}_budgeted"
+        )
+
+    def _open_checkpoint(
+        self, path: Path, plan: Callable[[], List[int]]
+    ) -> CrawlCheckpoint:
+        """
+        Continue from the checkpoint if the last update was interrupted, else
+        start a new one with the IDs from plan. Anything completed in the
+        checkpoint isn't requested again
+        """
+        checkpoint = CrawlCheckpoint(path)
+        if checkpoint.load():
+            logger.info(
+                f"Continuing interrupted {self.list_type.value} history update, {len(checkpoint.completed)} entries already done, {len(checkpoint.remaining())} planned entries left"
+            )
+            for entry_id, data in checkpoint.completed.items():
+                self.already_requested.add(entry_id)
+                # the merged file may not have been saved before it was interrupted
+                if self.use_merged_file and data is not None:
+                    assert self.merged_data is not None
+                    self.merged_data[str(entry_id)] = data
+        else:
+            checkpoint.start(plan())
+        self.checkpoint = checkpoint
+        return checkpoint
+
+    @property
+    def queue_path(self) -> Path:
+        # not a .json file, so its not treated as data
+        return self.localdir.data_dir / f".queue_history_{self.list_type.value}"
+
+    def _list_ids(self) -> List[int]:
+        """
+        IDs on the list (most recently edited first) and in the export
+        """
+        ids: List[int] = []
+        m = MalList(self.list_type, localdir=self.localdir)
+        if json_exists(m.list_path):
+            ids.extend(e[f"{self.list_type.value}_id"] for e in m.load_list())
+        export_file = export_path(self.localdir.data_dir, self.list_type)
+        if export_file.exists():
+            ids.extend(el.id for el in parse_xml(export_file).entries)
+        if not ids:
+            raise RuntimeError(
+                f"Neither {m.list_path} (lists) or {export_file} (export) exist, need one to update history"
+            )
+        return list(dict.fromkeys(ids))
+
+    def _last_saved(self, entry_id: int) -> float:
+        if self.use_merged_file:
+            return 0
+        p = self.entry_path(entry_id)
+        return p.stat().st_mtime if p.exists() else 0
+
+    def _recently_changed(self, queue: WorkQueue, ids: List[int]) -> List[int]:
+        """
+        Entries added/changed on your list since the last run, using the
+        list history. The first run uses the most recently edited entries
+        """
+        list_history = ListHistory.from_list_file(
+            MalList(self.list_type, localdir=self.localdir).list_path
+        )
+        timestamps = list_history.timestamps()
+        since = queue.state.get("list_history_since")
+        if not timestamps:
+            return ids[: self.till_same_limit]
+        queue.state["list_history_since"] = timestamps[-1]
+        if since is None:
+            return ids[: self.till_same_limit]
+        changes = list_history.changes(since)
+        return sorted(changes.added.keys() | changes.changed.keys())
+
+    def update_history_budgeted(
+        self, budget: TimeBudget, count: Optional[int] = None
+    ) -> None:
+        """
+        Request history for entries in order of priority till the budget runs out:
+            - entries recently changed on your list, or in your recent history
+            - entries which have no history saved
+            - everything else, which hasn't been requested in
+              REFRESH_AFTER seconds, least recently requested first
+        Whatever is left is saved, so the next run starts with it
+        If count is specified, only requests the first 'count' entries
+        from your recent history
+        """
+        self.authenticate()
+        self.already_requested.clear()
+        queue = WorkQueue.load(self.queue_path)
+
+        ids = self._list_ids()
+        now = time.time()
+        for mal_id in ids:
+            if not self.has_data(mal_id):
+                queue.push(mal_id, TIER_MISSING)
+                continue
+            last = queue.staleness_key(mal_id, self._last_saved(mal_id))
+            if now - last >= REFRESH_AFTER:
+                queue.push(mal_id, TIER_STALE, last)
+        for mal_id in self._recently_changed(queue, ids):
+            queue.push(mal_id, TIER_RECENT)
+        recent_history: Iterable[int] = self.download_recent_user_history()
+        if count is not None:
+            recent_history = islice(recent_history, count)
+        for i, mal_id in enumerate(recent_history):
+            queue.push(mal_id, TIER_RECENT, i)
+        queue.save()
+
+        # the queue is only saved at the end, the checkpoint
+        # keeps track of what was done if this is interrupted
+        checkpoint = self._open_checkpoint(self.budgeted_checkpoint_path, lambda: [])
+        try:
+            while not budget.expired():
+                item = queue.pop()
+                if item is None:
+                    break
+                self.update_entry_data(item.id)
+                queue.done(item.id)
+            if self.use_merged_file:
+                self._save_merged_file()
+            queue.save()
+        finally:
+            self.checkpoint = None
+            checkpoint.close()
+        checkpoint.finish()
+        queue.log_remaining(f"{self.list_type.value} history entries")
 
     def update_history(self, count: Optional[int] = None) -> None:
         """
@@ -318,32 +495,38 @@ class HistoryManager:
         If count is specified, only requests the first 'count' entries
         """
         self.authenticate()
+        # if this instance is used for more than one update (e.g. by the daemon)
+        self.already_requested.clear()
 
-        m = MalList(self.list_type, localdir=self.localdir)
-        exp = ExportDownloader(localdir=self.localdir)
-        export_file = (
-            exp.animelist_path
-            if self.list_type == ListType.ANIME
-            else exp.mangalist_path
+        checkpoint = self._open_checkpoint(
+            self.checkpoint_path,
+            lambda: [i for i in self._list_ids() if not self.has_data(i)],
         )
+        try:
+            self._update_history(checkpoint, count)
+        finally:
+            self.checkpoint = None
+            checkpoint.close()
+        checkpoint.finish()
+
+    def _update_history(
+        self, checkpoint: CrawlCheckpoint, count: Optional[int] = None
+    ) -> None:
         mal_id: int
         logger.info("Requesting any items which don't exist in history...")
-        updated = False
-        if m.list_path.exists():
-            updated = True
-            mlist = m.load_list()
-            for entry_data in mlist:
-                mal_id = entry_data[f"{self.list_type.value}_id"]
-                # If data doesn't exist for an item, request it
-                # this doesn't impact the other strategies and will likely run when
-                # you first add an item or when this is first run and is caching your entire list
-                if not self.has_data(mal_id):
-                    self.update_entry_data(mal_id)
+        # If data doesn't exist for an item, request it
+        # this doesn't impact the other strategies and will likely run when
+        # you first add an item or when this is first run and is caching your entire list
+        for mal_id in checkpoint.remaining():
+            if not self.has_data(mal_id):
+                self.update_entry_data(mal_id)
 
+        m = MalList(self.list_type, localdir=self.localdir)
+        if json_exists(m.list_path):
             logger.info("Requesting items till we hit some amount of unchanged data...")
             # request some amount till we hit unchanged data
             till = int(self.till_same_limit)
-            for entry_data in mlist:
+            for entry_data in m.load_list():
                 if till <= 0:
                     break
                 logger.info(f"Requesting {till} more entries...")
@@ -359,17 +542,6 @@ class HistoryManager:
                     )
                     till -= 1
 
-        if export_file.exists():
-            updated = True
-            # use the XML file if that exists
-            for el in parse_xml(str(export_file)).entries:
-                if not self.has_data(el.id):
-                    self.update_entry_data(el.id)
-        if not updated:
-            raise RuntimeError(
-                f"Neither {m.list_path} (lists) or {export_file} (export) exist, need one to update history"
-            )
-
         recent_history: Iterable[int] = iter(self.download_recent_user_history())
         if count is not None:
             logger.info(f"Requesting {count} first items from user history")
@@ -379,7 +551,8 @@ class HistoryManager:
         # use selenium to go to users' history and update things watched within the last few weeks
         for mal_id in recent_history:
             self.update_entry_data(mal_id)
-        self._save_merged_file()
+        if self.use_merged_file:
+            self._save_merged_file()
 
 
 REGISTERED: Set[Path] = set()
@@ -7,15 +7,25 @@ mechanism that works on modern MAL lists
 """
 
 import os
-import json
 from typing import List
 from pathlib import Path
 
 import requests
 
 from ..list_type import ListType
-from ..common import Json, safe_request_json, logger, serialize
-from ..paths import LocalDir
+from ..common import (
+    Json,
+    safe_request_json,
+    new_session,
+    default_http_cache,
+    logger,
+    serialize,
+    read_json,
+    write_json,
+)
+from ..paths import LocalDir, json_exists
+from ..list_history import ListHistory, list_entry_state
+from ..events import EventLog, list_events
 
 # this is order=5, which requests items that were edited by you recently
 BASE_URL = "https://myanimelist.net/{list_type}list/{username}/load.json?status=7&order=5&offset={offset}"
@@ -77,10 +87,10 @@ class MalList:
         """
         Load the list from the JSON file
         """
-        if self.list_path.exists():
+        if json_exists(self.list_path):
             try:
-                return list(json.loads(self.list_path.read_text()))
-            except json.JSONDecodeError:
+                return list(read_json(self.list_path))
+            except ValueError:
                 pass
         raise FileNotFoundError(f"No file found at {self.list_type.value}")
 
@@ -92,12 +102,15 @@ class MalList:
         list_data: List[Json] = []
         # overwrite the list with new data
         offset = 0
-        session = requests.Session()
+        session = new_session()
         session.headers.update({"User-Agent": LIST_USER_AGENT})
         while True:
             url = self.offset_url(offset)
             new_data = safe_request_json(
-                url, session=session, on_error=handle_unauthorized
+                url,
+                session=session,
+                on_error=handle_unauthorized,
+                cache=default_http_cache(),
             )
             list_data.extend(new_data)
             if len(new_data) < OFFSET_CHUNK:
@@ -107,4 +120,10 @@ class MalList:
                 break
             offset += OFFSET_CHUNK
         encoded_data = serialize(list_data)
-        self.list_path.write_text(encoded_data)
+        write_json(self.list_path, encoded_data)
+        changes = ListHistory.from_list_file(self.list_path).record(
+            dict(list_entry_state(self.list_type, entry) for entry in list_data)
+        )
+        EventLog(self.localdir.data_dir).emit_many(
+            list_events(self.list_path.stem, changes)
+        )
@@ -13,7 +13,7 @@ from typing import Dict, Any, cast, Iterator
 import requests
 import click
 
-from ..common import safe_request
+from ..common import safe_request, new_session, default_http_cache
 from ..log import logger
 from ..paths import LocalDir
 
@@ -43,7 +43,7 @@ class MalSession:
         """
         self.client_id = client_id
         self.localdir = localdir
-        self.session = requests.Session()
+        self.session = new_session()
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(username={self.localdir.username}, client_id={self.client_id})"
@@ -179,6 +179,9 @@ class MalSession:
             session=self.session,
             on_error=self.refresh_token_if_expired,
             wait_time=1,
+            cache=default_http_cache(),
+            # the access token changes when its refreshed, so cache by username
+            cache_identity=self.localdir.username,
             **kwargs,
         )
         return r
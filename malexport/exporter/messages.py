@@ -6,7 +6,6 @@ this info isn't accessible from the API
 """
 
 import os
-import json
 import time
 from pathlib import Path
 from typing import List, Optional, Dict, Iterator, Any, Tuple, Union
@@ -18,14 +17,24 @@ from selenium.webdriver.common.by import By  # type: ignore[import]
 
 from .driver import webdriver, driver_login, wait
 from ..log import logger
-from ..paths import LocalDir, _expand_path
-from ..common import Json, extract_query_value, serialize
-
+from ..paths import LocalDir, _expand_path, json_exists
+from ..common import Json, extract_query_value, serialize, read_json, write_json
+from ..events import EventLog, new_items
+from .work_queue import (
+    WorkQueue,
+    CrawlCheckpoint,
+    TimeBudget,
+    TIER_RECENT,
+    TIER_STALE,
+)
 
 # if we hit these many recently updated entries which
 # are the same as the previous then stop requesting
 TILL_SAME_LIMIT = int(os.environ.get("MALEXPORT_THREAD_LIMIT", 10))
 
+# with a time budget, only refresh threads which haven't been requested for this many seconds
+REFRESH_AFTER = int(os.environ.get("MALEXPORT_THREAD_REFRESH_AFTER", 60 * 60 * 24 * 7))
+
 
 def dateparse_to_epoch(datestr: str) -> Optional[int]:
     val = dateparser.parse(datestr.strip())
@@ -174,19 +183,38 @@ class MessageDownloader:
         new_data = self._extract_details(thread_content.get_attribute("innerHTML"))
         # assume this is new data
         has_new_data = True
-        if p.exists():
-            old_data = json.loads(p.read_text())
+        old_data = None
+        if json_exists(p):
+            old_data = read_json(p)
             # if these aren't the same, the data has changed,
             # we should keep searching for more threads
             has_new_data = old_data != new_data
         new_data_json = serialize(new_data)
-        p.write_text(new_data_json)
+        write_json(p, new_data_json)
+        if old_data is None:
+            EventLog(self.localdir.data_dir).emit(
+                "message.thread_added",
+                {"thread_id": thread_id, **new_data},
+            )
+        else:
+            added = new_items(old_data["messages"], new_data["messages"])
+            if added:
+                EventLog(self.localdir.data_dir).emit(
+                    "message.thread_updated",
+                    {
+                        "thread_id": thread_id,
+                        "subject": new_data["subject"],
+                        "messages": added,
+                    },
+                )
         return has_new_data
 
     def update_messages(
         self, start_page: int = 1, thread_count: Optional[int] = None
     ) -> None:
         self.authenticate()
+        # if this instance is used for more than one update (e.g. by the daemon)
+        self.msg_to_thread.clear()
 
         # if user supplied with CLI flag use that, else use envvar/default
         till_base = (
@@ -194,25 +222,172 @@ class MessageDownloader:
         )
         till = int(till_base)
 
-        for sent, message_id in self.iter_message_ids(start_page=start_page):
-            if till <= 0:
-                break
-            # resolve message ID to thread, which is what we download
-            thread_id: int = self._resolve_message_to_thread_id(message_id, sent=sent)
-            logger.info(f"msg {message_id} -> thread {thread_id}")
-            # keep track of if this is a new thread, so we can decrement the 'till same' counter
-            new_thread_id: bool = thread_id not in self.msg_to_thread.values()
-            if self.update_thread_data(thread_id):
-                logger.debug(
-                    f"msg id {message_id}, thread {thread_id} had new data, resetting..."
+        checkpoint = self._open_checkpoint(self.checkpoint_path)
+        if checkpoint.completed:
+            # continue with the counter from where it was interrupted
+            last_till = list(checkpoint.completed.values())[-1].get("till")
+            if isinstance(last_till, int):
+                till = last_till
+        try:
+            for sent, message_id in self.iter_message_ids(start_page=start_page):
+                if till <= 0:
+                    break
+                if message_id in checkpoint.completed:
+                    logger.debug(f"msg {message_id} was done before, skipping...")
+                    continue
+                # resolve message ID to thread, which is what we download
+                thread_id: int = self._resolve_message_to_thread_id(
+                    message_id, sent=sent
                 )
-                till = int(till_base)
-            else:
-                if new_thread_id:
+                logger.info(f"msg {message_id} -> thread {thread_id}")
+                # keep track of if this is a new thread, so we can decrement the 'till same' counter
+                new_thread_id: bool = thread_id not in self.msg_to_thread.values()
+                if self.update_thread_data(thread_id):
                     logger.debug(
-                        f"msg id {message_id} thread {thread_id} matched old data, decrementing..."
+                        f"msg id {message_id}, thread {thread_id} had new data, resetting..."
+                    )
+                    till = int(till_base)
+                else:
+                    if new_thread_id:
+                        logger.debug(
+                            f"msg id {message_id} thread {thread_id} matched old data, decrementing..."
+                        )
+                        till -= 1
+                logger.info(f"requesting {till} more threads...")
+                # save thread id so subsequent iterations dont repeat
+                self.msg_to_thread[message_id] = thread_id
+                checkpoint.complete(message_id, {"thread": thread_id, "till": till})
+        finally:
+            checkpoint.close()
+        checkpoint.finish()
+
+    @property
+    def checkpoint_path(self) -> Path:
+        # not a .json file, so its not treated as data
+        return self.localdir.data_dir / ".checkpoint_messages"
+
+    @property
+    def budgeted_checkpoint_path(self) -> Path:
+        # budgeted updates don't keep track of the 'till same'
+        # counter, so they can't share a checkpoint with a regular update
+        return self.localdir.data_dir / ".checkpoint_messages_budgeted"
+
+    def _open_checkpoint(self, path: Path) -> CrawlCheckpoint:
+        """
+        Continue from the checkpoint if the last update was interrupted, so
+        messages/threads which were already done aren't requested again
+        """
+        checkpoint = CrawlCheckpoint(path)
+        if checkpoint.load():
+            logger.info(
+                f"Continuing interrupted messages update, {len(checkpoint.completed)} messages already done"
+            )
+            for message_id, data in checkpoint.completed.items():
+                self.msg_to_thread[message_id] = data["thread"]
+        else:
+            checkpoint.start([])
+        return checkpoint
+
+    @property
+    def queue_path(self) -> Path:
+        # not a .json file, so its not treated as data
+        return self.localdir.data_dir / ".queue_messages"
+
+    def _discover_pages(
+        self,
+        queue: WorkQueue,
+        known: Dict[str, Any],
+        budget: TimeBudget,
+        page: int,
+        stop_when_known: bool,
+    ) -> Optional[int]:
+        """
+        Queue any message IDs which haven't been seen before, starting at page.
+        Returns the next page to request if the budget ran out, else None
+        """
+        while not budget.expired():
+            received = self.message_ids_for_page(page)
+            sent = self.message_ids_for_page(page, sent=True)
+            if not received and not sent:
+                return None
+            new = 0
+            for is_sent, ids in ((False, received), (True, sent)):
+                for msg_id in ids:
+                    if str(msg_id) in known:
+                        continue
+                    known[str(msg_id)] = {"sent": is_sent, "thread": None}
+                    # newer messages first
+                    queue.push(msg_id, TIER_RECENT, -msg_id)
+                    new += 1
+            if new == 0 and stop_when_known:
+                return None
+            page += 1
+        return page
+
+    def update_messages_budgeted(self, budget: TimeBudget, start_page: int = 1) -> None:
+        """
+        Request threads in order of priority till the budget runs out:
+            - threads for messages which haven't been seen before, newest first
+            - everything else, which hasn't been requested in
+              REFRESH_AFTER seconds, least recently requested first
+        Whatever is left is saved, so the next run starts with it
+        """
+        self.authenticate()
+        self.msg_to_thread.clear()
+        queue = WorkQueue.load(self.queue_path)
+        # message ID -> whether its a sent message, the thread ID its in
+        known: Dict[str, Any] = queue.state.setdefault("messages", {})
+
+        # request pages till there are no new messages. if that ran out of
+        # time before reaching the last page last time, continue from there
+        next_page = self._discover_pages(
+            queue, known, budget, start_page, stop_when_known=True
+        )
+        if next_page is None and queue.state.get("discover_page") is not None:
+            next_page = self._discover_pages(
+                queue,
+                known,
+                budget,
+                queue.state["discover_page"],
+                stop_when_known=False,
+            )
+        queue.state["discover_page"] = next_page
+
+        # refresh threads, using the newest message in each
+        newest: Dict[int, int] = {}
+        for key, info in known.items():
+            if info["thread"] is not None:
+                newest[info["thread"]] = max(int(key), newest.get(info["thread"], 0))
+        now = time.time()
+        for newest_id in newest.values():
+            last = queue.staleness_key(newest_id)
+            if now - last >= REFRESH_AFTER:
+                queue.push(newest_id, TIER_STALE, last)
+        queue.save()
+
+        # the queue is only saved at the end, the checkpoint
+        # keeps track of what was done if this is interrupted
+        checkpoint = self._open_checkpoint(self.budgeted_checkpoint_path)
+        try:
+            while not budget.expired():
+                item = queue.pop()
+                if item is None:
+                    break
+                info = known[str(item.id)]
+                if item.id in checkpoint.completed:
+                    thread_id = checkpoint.completed[item.id]["thread"]
+                else:
+                    thread_id = self._resolve_message_to_thread_id(
+                        item.id, sent=info["sent"]
                     )
-                    till -= 1
-            logger.info(f"requesting {till} more threads...")
-            # save thread id so subsequent iterations dont repeat
-            self.msg_to_thread[message_id] = thread_id
+                    logger.info(f"msg {item.id} -> thread {thread_id}")
+                    self.update_thread_data(thread_id)
+                    self.msg_to_thread[item.id] = thread_id
+                    checkpoint.complete(item.id, {"thread": thread_id})
+                info["thread"] = thread_id
+                queue.done(item.id)
+            queue.save()
+        finally:
+            checkpoint.close()
+        checkpoint.finish()
+        queue.log_remaining("message threads")
@@ -0,0 +1,216 @@
+"""
+A priority queue of IDs to request, for updates which run with
+a time budget (update history/messages --time-budget)
+
+Whatever is left when the budget runs out is saved in the data
+directory, so the next run continues where this one stopped
+
+Also a checkpoint for long crawls (e.g. the first time history is
+updated), so if its interrupted, the next run continues from there
+"""
+
+import os
+import time
+import heapq
+from pathlib import Path
+from typing import NamedTuple, Optional, Dict, List, Any, IO
+
+from ..common import Json, serialize_bytes, deserialize, write_file
+from ..log import logger
+
+# how many completed IDs to write to a checkpoint before syncing it to disk
+CHECKPOINT_SYNC_EVERY = int(os.environ.get("MALEXPORT_CHECKPOINT_SYNC_EVERY", 1))
+
+# what to request first. Items in the same tier are ordered by their key
+TIER_RECENT = 0  # recently changed on your list/in your history
+TIER_MISSING = 1  # no data saved for this yet
+TIER_STALE = 2  # refreshes, key is when it was last requested
+
+
+class WorkItem(NamedTuple):
+    tier: int
+    key: float
+    id: int
+
+
+class TimeBudget:
+    """
+    Keeps track of how long is left. If seconds is None, never runs out
+    """
+
+    def __init__(self, seconds: Optional[float]) -> None:
+        self.seconds = seconds
+        self.started = time.monotonic()
+
+    def remaining(self) -> Optional[float]:
+        if self.seconds is None:
+            return None
+        return self.seconds - (time.monotonic() - self.started)
+
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+
+class WorkQueue:
+    """
+    IDs to request ordered by (tier, key), and when each ID was last
+    requested. 'state' can be used to save anything else needed to resume
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._heap: List[WorkItem] = []
+        self.queued: Dict[int, WorkItem] = {}
+        self.last_checked: Dict[int, int] = {}
+        self.state: Dict[str, Any] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> "WorkQueue":
+        queue = cls(path)
+        if path.exists():
+            data = deserialize(path.read_bytes())
+            for tier, key, item_id in data["items"]:
+                queue.push(item_id, tier, key)
+            queue.last_checked = {int(k): v for k, v in data["last_checked"].items()}
+            queue.state = data["state"]
+        return queue
+
+    def save(self) -> None:
+        write_file(
+            self.path,
+            serialize_bytes(
+                {
+                    "items": [list(item) for item in sorted(self.queued.values())],
+                    "last_checked": {str(k): v for k, v in self.last_checked.items()},
+                    "state": self.state,
+                }
+            ),
+        )
+
+    def __len__(self) -> int:
+        return len(self.queued)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self.queued
+
+    def push(self, item_id: int, tier: int, key: float = 0) -> None:
+        """
+        Add an ID to the queue. If its already queued, keeps whichever runs first
+        """
+        item = WorkItem(tier, key, item_id)
+        current = self.queued.get(item_id)
+        if current is not None and current <= item:
+            return
+        self.queued[item_id] = item
+        # the old entry (if any) is skipped when its popped
+        heapq.heappush(self._heap, item)
+
+    def pop(self) -> Optional[WorkItem]:
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            if self.queued.get(item.id) == item:
+                del self.queued[item.id]
+                return item
+        return None
+
+    def done(self, item_id: int) -> None:
+        self.last_checked[item_id] = int(time.time())
+
+    def staleness_key(self, item_id: int, default: float = 0) -> float:
+        """
+        When this was last requested, so the ones that haven't been for the longest run first
+        """
+        return self.last_checked.get(item_id, default)
+
+    def log_remaining(self, name: str) -> None:
+        if len(self) > 0:
+            counts: Dict[int, int] = {}
+            for item in self.queued.values():
+                counts[item.tier] = counts.get(item.tier, 0) + 1
+            logger.info(
+                f"Out of time, {len(self)} {name} left (recent: {counts.get(TIER_RECENT, 0)}, missing: {counts.get(TIER_MISSING, 0)}, stale: {counts.get(TIER_STALE, 0)}), continuing from here next time"
+            )
+        else:
+            logger.info(f"Finished all queued {name}")
+
+
+class CrawlCheckpoint:
+    """
+    An append-only file for a crawl: a line with the planned IDs, then a
+    line for each completed ID (with any data which isn't saved right away).
+    If the crawl is interrupted, the next run loads this to skip what was
+    already done. Its removed once the crawl finishes
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.planned: List[int] = []
+        # ID -> data saved with it
+        self.completed: Dict[int, Json] = {}
+        self._file: Optional[IO[bytes]] = None
+        self._unsynced = 0
+
+    def load(self) -> bool:
+        """
+        Load the checkpoint from an interrupted crawl, returns False if there isn't one
+        """
+        if not self.path.exists():
+            return False
+        with self.path.open("rb") as f:
+            lines = [line for line in f if line.endswith(b"\n")]
+        if not lines:
+            return False
+        self.planned = deserialize(lines[0])["planned"]
+        for line in lines[1:]:
+            record = deserialize(line)
+            self.completed[record["id"]] = record["data"]
+        self._file = self.path.open("r+b")
+        # remove a partially written line (if it was killed while writing), so
+        # whats appended next starts on its own line
+        self._file.truncate(sum(len(line) for line in lines))
+        self._file.seek(0, os.SEEK_END)
+        return True
+
+    def start(self, planned: List[int]) -> None:
+        """
+        Start a new checkpoint, with the IDs which are planned to be requested
+        """
+        self.planned = list(planned)
+        self.completed = {}
+        self._file = self.path.open("wb")
+        self._file.write(serialize_bytes({"planned": self.planned}) + b"\n")
+        self.sync()
+
+    def remaining(self) -> List[int]:
+        return [i for i in self.planned if i not in self.completed]
+
+    def complete(self, item_id: int, data: Json = None) -> None:
+        assert self._file is not None, "checkpoint wasn't started"
+        self.completed[item_id] = data
+        self._file.write(serialize_bytes({"id": item_id, "data": data}) + b"\n")
+        self._unsynced += 1
+        if self._unsynced >= CHECKPOINT_SYNC_EVERY:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self) -> None:
+        """
+        Sync and close the file, keeping it so the next run can continue
+        """
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def finish(self) -> None:
+        """
+        The crawl finished, remove the checkpoint
+        """
+        self.close()
+        self.path.unlink(missing_ok=True)
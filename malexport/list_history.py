@@ -0,0 +1,225 @@
+"""
+An append-only history of your list, so you can see what your list looked
+like at some point in time, or what changed between two times, without
+having to keep/unpack old backups
+
+Each time a list is updated, the status/score/progress/dates for each entry
+are compared to the previous run, and only the fields which changed are
+appended to list_history/<list>.jsonl in the data directory. Every
+KEYFRAME_INTERVAL records, the entire state is saved instead, so
+reconstructing the list only has to apply the changes after the last one
+"""
+
+import os
+import re
+import time
+from pathlib import Path
+from typing import NamedTuple, Dict, List, Any, Tuple, Optional
+
+from .list_type import ListType
+from .common import Json, serialize_bytes, deserialize, append_lines, logger
+from .paths import PathIsh
+
+LIST_HISTORY_DIR = "list_history"
+KEYFRAME_INTERVAL = int(os.environ.get("MALEXPORT_LIST_HISTORY_KEYFRAMES", 50))
+
+# fields (from the load.json endpoint) to keep track of
+LIST_FIELDS = (
+    "status",
+    "score",
+    "num_watched_episodes",
+    "num_read_chapters",
+    "num_read_volumes",
+    "is_rewatching",
+    "is_rereading",
+    "start_date_string",
+    "finish_date_string",
+)
+
+# the tracked fields for one entry
+EntryState = Dict[str, Any]
+# MAL ID -> tracked fields
+ListState = Dict[int, EntryState]
+
+# so the timestamp/type of each record can be read without parsing the entire line
+RECORD_PREFIX = re.compile(rb'^\{"at":\s*(\d+),\s*"keyframe":\s*(true|false)')
+
+
+def list_entry_state(list_type: ListType, entry: Json) -> Tuple[int, EntryState]:
+    """
+    The MAL ID and tracked fields for an entry from the load.json endpoint
+    """
+    return int(entry[f"{list_type.value}_id"]), {
+        field: entry[field] for field in LIST_FIELDS if field in entry
+    }
+
+
+def api_entry_state(entry: Json) -> Tuple[int, EntryState]:
+    """
+    The MAL ID and tracked fields for an entry from the API,
+    which is everything in my_list_status
+    """
+    return int(entry["id"]), dict(entry.get("my_list_status") or {})
+
+
+class ListChanges(NamedTuple):
+    added: ListState
+    removed: ListState
+    # MAL ID -> field -> (old value, new value)
+    changed: Dict[int, Dict[str, Tuple[Any, Any]]]
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+    def __str__(self) -> str:
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed"
+
+    def to_json(self) -> Json:
+        return {
+            "added": state_to_json(self.added),
+            "removed": state_to_json(self.removed),
+            "changed": {str(k): v for k, v in self.changed.items()},
+        }
+
+
+def state_to_json(state: ListState) -> Dict[str, EntryState]:
+    # JSON object keys have to be strings
+    return {str(k): v for k, v in state.items()}
+
+
+_MISSING = object()
+
+
+def diff_states(old: ListState, new: ListState) -> ListChanges:
+    changed: Dict[int, Dict[str, Tuple[Any, Any]]] = {}
+    for mal_id in old.keys() & new.keys():
+        before, after = old[mal_id], new[mal_id]
+        fields = {
+            field: (before.get(field), after.get(field))
+            for field in before.keys() | after.keys()
+            if before.get(field, _MISSING) != after.get(field, _MISSING)
+        }
+        if fields:
+            changed[mal_id] = fields
+    return ListChanges(
+        added={i: new[i] for i in new.keys() - old.keys()},
+        removed={i: old[i] for i in old.keys() - new.keys()},
+        changed=changed,
+    )
+
+
+def _apply(state: ListState, record: Json) -> None:
+    if record["keyframe"]:
+        state.clear()
+        state.update({int(k): v for k, v in record["entries"].items()})
+        return
+    for k, fields in record.get("set", {}).items():
+        state.setdefault(int(k), {}).update(fields)
+    for k, fields in record.get("unset", {}).items():
+        for field in fields:
+            state[int(k)].pop(field, None)
+    for k in record.get("removed", []):
+        state.pop(int(k), None)
+
+
+class ListHistory:
+    """
+    The history for one list file (e.g. animelist.json or mangalist_api.json)
+    """
+
+    def __init__(self, path: PathIsh) -> None:
+        self.path = Path(path)
+
+    @classmethod
+    def from_list_file(cls, list_path: Path) -> "ListHistory":
+        return cls(list_path.parent / LIST_HISTORY_DIR / f"{list_path.stem}.jsonl")
+
+    def _lines(self) -> List[Tuple[int, bool, bytes]]:
+        """
+        (timestamp, is keyframe, line) for each record
+        """
+        if not self.path.exists():
+            return []
+        lines = []
+        with self.path.open("rb") as f:
+            for line in f:
+                m = RECORD_PREFIX.match(line)
+                # a partially written line, if the process was killed
+                if m is None or not line.endswith(b"\n"):
+                    continue
+                lines.append((int(m.group(1)), m.group(2) == b"true", line))
+        return lines
+
+    def timestamps(self) -> List[int]:
+        """When each record was saved"""
+        return [at for at, _, _ in self._lines()]
+
+    @staticmethod
+    def _state_from(
+        lines: List[Tuple[int, bool, bytes]], at: Optional[int]
+    ) -> ListState:
+        lines = [ln for ln in lines if at is None or ln[0] <= at]
+        start = 0
+        for i, (_, keyframe, _) in enumerate(lines):
+            if keyframe:
+                start = i
+        state: ListState = {}
+        # only the records after the last keyframe have to be parsed
+        for _, _, line in lines[start:]:
+            _apply(state, deserialize(line))
+        return state
+
+    def state_at(self, at: Optional[int] = None) -> ListState:
+        """
+        What the list looked like at some unix timestamp (or the latest state)
+        """
+        return self._state_from(self._lines(), at)
+
+    def changes(self, since: Optional[int], until: Optional[int] = None) -> ListChanges:
+        """
+        What changed between two unix timestamps. If since is None,
+        everything that was on the list at 'until' counts as added
+        """
+        old = self.state_at(since) if since is not None else {}
+        return diff_states(old, self.state_at(until))
+
+    def record(self, state: ListState, at: Optional[int] = None) -> ListChanges:
+        """
+        Append the changes since the last record. Doesn't write
+        anything if nothing changed
+        """
+        lines = self._lines()
+        previous = self._state_from(lines, None)
+        changes = diff_states(previous, state)
+        if lines and changes.empty:
+            return changes
+        since_keyframe = 0
+        for _, keyframe, _ in reversed(lines):
+            if keyframe:
+                break
+            since_keyframe += 1
+        record: Dict[str, Any] = {"at": int(at if at is not None else time.time())}
+        if not lines or since_keyframe + 1 >= KEYFRAME_INTERVAL:
+            record["keyframe"] = True
+            record["entries"] = state_to_json(state)
+        else:
+            record["keyframe"] = False
+            updated = {**changes.added}
+            unset: Dict[str, List[str]] = {}
+            for mal_id, fields in changes.changed.items():
+                updated[mal_id] = {
+                    f: new for f, (_, new) in fields.items() if f in state[mal_id]
+                }
+                removed_fields = [f for f in fields if f not in state[mal_id]]
+                if removed_fields:
+                    unset[str(mal_id)] = removed_fields
+            record["set"] = state_to_json(updated)
+            if unset:
+                record["unset"] = unset
+            if changes.removed:
+                record["removed"] = sorted(changes.removed)
+        self.path.parent.mkdir(exist_ok=True)
+        append_lines(self.path, serialize_bytes(record) + b"\n")
+        logger.info(f"Saved list history to {self.path}: {changes}")
+        return changes
@@ -0,0 +1,177 @@
+"""
+A manifest of the files in a data directory (relative path, size, mtime
+and content hash), so other tools can tell which files changed since
+the last time they ran without rehashing the entire directory
+
+This isn't rewritten after every file is written, that would mean saving
+the whole manifest once per file. Instead its updated once at the end
+of a run: files are stat-ed, and the hash is only computed for ones
+whose size/mtime changed which weren't written by write_file (which
+records the hash of what it wrote)
+"""
+
+import os
+import atexit
+import hashlib
+from pathlib import Path
+from typing import NamedTuple, Dict, List, Set, Optional
+
+from .paths import PathIsh
+from .common import (
+    serialize,
+    deserialize,
+    write_file,
+    written_digest,
+    forget_written_digests,
+)
+from .log import logger
+
+# saved in the data directory. Not a .json file, so its not
+# compressed/treated as data by the rest of malexport
+MANIFEST_NAME = ".manifest"
+
+
+class ManifestEntry(NamedTuple):
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+class ManifestDiff(NamedTuple):
+    added: List[str]
+    removed: List[str]
+    changed: List[str]
+
+    @property
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+
+def file_digest(path: PathIsh) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 64), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ignored(name: str) -> bool:
+    # the manifest itself, and temporary files from common.write_file
+    return name == MANIFEST_NAME or (name.startswith(".") and name.endswith(".tmp"))
+
+
+class Manifest(NamedTuple):
+    # relative path (with '/' separators) -> entry
+    files: Dict[str, ManifestEntry]
+
+    @classmethod
+    def load(cls, path: PathIsh) -> "Manifest":
+        """
+        Load a manifest file. If path is a directory, loads the manifest
+        in that directory. Returns an empty manifest if it doesn't exist
+        """
+        p = Path(path)
+        if p.is_dir():
+            p = p / MANIFEST_NAME
+        if not p.exists():
+            return cls(files={})
+        data = deserialize(p.read_bytes())
+        return cls(
+            files={
+                name: ManifestEntry(size=size, mtime_ns=mtime_ns, sha256=sha256)
+                for name, (size, mtime_ns, sha256) in data["files"].items()
+            }
+        )
+
+    def save(self, path: PathIsh) -> bool:
+        p = Path(path)
+        if p.is_dir():
+            p = p / MANIFEST_NAME
+        data = {"files": {name: list(ent) for name, ent in sorted(self.files.items())}}
+        return write_file(p, serialize(data).encode("utf-8"))
+
+    @classmethod
+    def scan(
+        cls, data_dir: PathIsh, previous: Optional["Manifest"] = None
+    ) -> "Manifest":
+        """
+        Walk the data directory, creating a manifest. Files with the same size
+        and mtime as in the previous manifest keep their hash, and files
+        written by this process use the hash computed when they were written,
+        so only files which changed some other way are read/hashed
+        """
+        base = Path(data_dir)
+        old = previous.files if previous is not None else {}
+        files: Dict[str, ManifestEntry] = {}
+        for root, dirs, names in os.walk(base):
+            dirs.sort()
+            for name in sorted(names):
+                if _ignored(name):
+                    continue
+                full = os.path.join(root, name)
+                st = os.stat(full)
+                rel = Path(full).relative_to(base).as_posix()
+                prev = old.get(rel)
+                if (
+                    prev is not None
+                    and prev.size == st.st_size
+                    and prev.mtime_ns == st.st_mtime_ns
+                ):
+                    files[rel] = prev
+                    continue
+                digest = written_digest(full, st.st_size, st.st_mtime_ns)
+                if digest is None:
+                    digest = file_digest(full)
+                files[rel] = ManifestEntry(
+                    size=st.st_size, mtime_ns=st.st_mtime_ns, sha256=digest
+                )
+        return cls(files=files)
+
+    def diff(self, other: "Manifest") -> ManifestDiff:
+        """
+        What changed to get from this manifest to the other
+        (compares contents, so a file which was rewritten with the
+        same data isn't included)
+        """
+        return ManifestDiff(
+            added=sorted(other.files.keys() - self.files.keys()),
+            removed=sorted(self.files.keys() - other.files.keys()),
+            changed=sorted(
+                name
+                for name in self.files.keys() & other.files.keys()
+                if self.files[name].sha256 != other.files[name].sha256
+            ),
+        )
+
+
+def update_manifest(data_dir: PathIsh) -> ManifestDiff:
+    """
+    Update the manifest in a data directory, returning what changed
+    """
+    previous = Manifest.load(data_dir)
+    current = Manifest.scan(data_dir, previous=previous)
+    current.save(data_dir)
+    # the hashes are in the manifest now, so the next scan reuses them from there
+    forget_written_digests(data_dir)
+    return previous.diff(current)
+
+
+_TRACKED: Set[Path] = set()
+
+
+def _update_tracked() -> None:
+    for data_dir in sorted(_TRACKED):
+        diff = update_manifest(data_dir)
+        logger.info(
+            f"Updated manifest for {data_dir}: {len(diff.added)} added, {len(diff.removed)} removed, {len(diff.changed)} changed"
+        )
+
+
+def track(data_dir: PathIsh) -> None:
+    """
+    Update the manifest for this data directory when the process exits,
+    after anything else that's saved when exiting has been written
+    """
+    if not _TRACKED:
+        atexit.register(_update_tracked)
+    _TRACKED.add(Path(data_dir))
@@ -12,7 +12,7 @@ from more_itertools import first, last
 
 from .list_type import ListType
 from .paths import LocalDir
-from .parse.xml import parse_xml, Entry
+from .parse.xml import parse_xml, export_path, Entry
 
 
 class Data(NamedTuple):
@@ -62,11 +62,7 @@ def add_to_history(
 ) -> Optional[Data]:
     data_dir = LocalDir.from_username(username).data_dir
 
-    xml_file = (
-        data_dir / "animelist.xml"
-        if entry_type == ListType.ANIME
-        else data_dir / "mangalist.xml"
-    )
+    xml_file = export_path(data_dir, entry_type)
     if not id:
         picked = pick_id(xml_file=xml_file)
         if not picked:
@@ -0,0 +1,289 @@
+"""
+Exports the combined list and history data for one or more accounts
+to Parquet files, so it can be loaded by pandas/polars/duckdb etc.
+with types, instead of flattening the JSON each time
+
+Each table is written to <out_dir>/<table>/username=<username>/data.parquet,
+so reading the <table> directory as a (hive partitioned) dataset
+includes a username column
+
+One account is parsed at a time, and rows are written in batches
+of MALEXPORT_PARQUET_BATCH_SIZE, so memory usage doesn't grow
+with the number of accounts
+
+Requires pyarrow, install with pip install 'malexport[parquet]'
+"""
+
+import os
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union, Iterator
+
+import pyarrow as pa  # type: ignore[import]
+import pyarrow.parquet as pq  # type: ignore[import]
+
+from .paths import LocalDir, PathIsh
+from .log import logger
+from .parse.combine import combine, AnimeData, MangaData
+from .parse.mal_list import AnimeEntry
+from .parse.common import split_tags
+
+BATCH_SIZE = int(os.environ.get("MALEXPORT_PARQUET_BATCH_SIZE", 50_000))
+
+FILE_NAME = "data.parquet"
+
+_ID_COLUMNS = [
+    ("type", pa.string()),
+    ("id", pa.int64()),
+]
+
+SCHEMAS: Dict[str, Any] = {
+    "entries": pa.schema(
+        _ID_COLUMNS
+        + [
+            ("title", pa.string()),
+            ("status", pa.string()),
+            ("score", pa.int16()),
+            ("media_type", pa.string()),
+            # episodes/chapters
+            ("total", pa.int32()),
+            # watched episodes/read chapters
+            ("progress", pa.int32()),
+            ("volumes", pa.int32()),
+            ("read_volumes", pa.int32()),
+            ("start_date", pa.date32()),
+            ("finish_date", pa.date32()),
+            ("times_rewatched", pa.int32()),
+            ("rewatching", pa.bool_()),
+            ("tags", pa.list_(pa.string())),
+            ("season_year", pa.int16()),
+            ("season", pa.string()),
+            ("airing_status", pa.string()),
+        ]
+    ),
+    "history": pa.schema(
+        _ID_COLUMNS
+        + [
+            # episode/chapter
+            ("number", pa.int32()),
+            ("at", pa.timestamp("s", tz="UTC")),
+        ]
+    ),
+    "genres": pa.schema(
+        _ID_COLUMNS + [("genre_id", pa.int32()), ("genre", pa.string())]
+    ),
+    "studios": pa.schema(
+        _ID_COLUMNS + [("studio_id", pa.int32()), ("studio", pa.string())]
+    ),
+    "api": pa.schema(
+        _ID_COLUMNS
+        + [
+            ("title", pa.string()),
+            ("start_date", pa.date32()),
+            ("end_date", pa.date32()),
+            ("mean", pa.float32()),
+            ("rank", pa.int32()),
+            ("popularity", pa.int32()),
+            ("num_list_users", pa.int32()),
+            ("num_scoring_users", pa.int32()),
+            ("nsfw", pa.string()),
+            ("created_at", pa.timestamp("s", tz="UTC")),
+            ("updated_at", pa.timestamp("s", tz="UTC")),
+            ("media_type", pa.string()),
+            ("status", pa.string()),
+            ("episode_count", pa.int32()),
+            ("source", pa.string()),
+            ("average_episode_duration", pa.int32()),
+            ("rating", pa.string()),
+            ("synopsis", pa.string()),
+        ]
+    ),
+}
+
+
+class TableWriter:
+    """
+    Buffers rows for one table/partition, writing a row group
+    each time there are batch_size rows
+    """
+
+    def __init__(self, path: Path, schema: Any, batch_size: int = BATCH_SIZE) -> None:
+        self.path = path
+        self.tmp_path = path.with_name(f".{path.name}.tmp")
+        self.schema = schema
+        self.batch_size = batch_size
+        self.columns: Dict[str, List[Any]] = {name: [] for name in schema.names}
+        self.rows = 0
+        self.pending = 0
+        self._writer: Any = None
+
+    def append(self, row: Sequence[Any]) -> None:
+        for col, val in zip(self.columns.values(), row):
+            col.append(val)
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(str(self.tmp_path), self.schema)
+        if self.pending == 0:
+            return
+        self._writer.write_table(pa.Table.from_pydict(self.columns, schema=self.schema))
+        self.rows += self.pending
+        self.pending = 0
+        for col in self.columns.values():
+            col.clear()
+
+    def close(self) -> None:
+        # write a file even if there are no rows, so each partition has the schema
+        self.flush()
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def _ts(dt: Optional[datetime]) -> Optional[int]:
+    return int(dt.timestamp()) if dt is not None else None
+
+
+def _tags(tags: str) -> List[str]:
+    return split_tags(tags) if tags.strip() else []
+
+
+def _entry_row(e: Union[AnimeData, MangaData]) -> Tuple[Any, ...]:
+    j, api = e.JSONList, e.APIList
+    season = api.season if api is not None else None
+    if isinstance(e, AnimeData):
+        x = e.XMLData
+        if e.JSONList is not None and e.JSONList.season is not None:
+            season = e.JSONList.season
+        return (
+            "anime",
+            x.id,
+            x.title,
+            x.status,
+            x.score,
+            x.media_type,
+            x.episodes,
+            x.watched_episodes,
+            None,
+            None,
+            x.start_date,
+            x.finish_date,
+            x.times_watched,
+            x.rewatching,
+            _tags(x.tags),
+            season.year if season is not None else None,
+            season.season if season is not None else None,
+            e.JSONList.airing_status if e.JSONList is not None else None,
+        )
+    m = e.XMLData
+    return (
+        "manga",
+        m.id,
+        m.title,
+        m.status,
+        m.score,
+        j.media_type if j is not None else (api.media_type if api else None),
+        m.chapters,
+        m.read_chapters,
+        m.volumes,
+        m.read_volumes,
+        m.start_date,
+        m.finish_date,
+        m.times_read,
+        m.rereading,
+        _tags(m.tags),
+        season.year if season is not None else None,
+        season.season if season is not None else None,
+        e.JSONList.publishing_status if e.JSONList is not None else None,
+    )
+
+
+def _rows(
+    type_: str, e: Union[AnimeData, MangaData]
+) -> Iterator[Tuple[str, Tuple[Any, ...]]]:
+    """
+    (table name, row) for each row to write for this entry
+    """
+    yield "entries", _entry_row(e)
+    for h in e.history:
+        yield "history", (type_, e.id, h.number, _ts(h.at))
+    j, api = e.JSONList, e.APIList
+    # prefer the list data, fallback to the API
+    genres = (j.genres if j is not None else []) or (
+        api.genres if api is not None else []
+    )
+    for g in genres:
+        yield "genres", (type_, e.id, g.id, g.name)
+    studios = api.studios if api is not None else []
+    if isinstance(j, AnimeEntry) and j.studios:
+        studios = j.studios
+    for s in studios:
+        yield "studios", (type_, e.id, s.id, s.name)
+    if api is not None:
+        yield "api", (
+            type_,
+            e.id,
+            api.title,
+            api.start_date,
+            api.end_date,
+            api.mean,
+            api.rank,
+            api.popularity,
+            api.num_list_users,
+            api.num_scoring_users,
+            api.nsfw,
+            _ts(api.created_at),
+            _ts(api.updated_at),
+            api.media_type,
+            api.status,
+            api.episode_count,
+            api.source,
+            api.average_episode_duration,
+            api.rating,
+            api.synopsis,
+        )
+
+
+def export_account(
+    username: str,
+    out_dir: PathIsh,
+    data_dir: Optional[Path] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Write the tables for one account, returns the number of rows in each table
+    """
+    if data_dir is None:
+        data_dir = LocalDir.from_username(username).data_dir
+    base = Path(out_dir)
+    writers = {
+        table: TableWriter(
+            base / table / f"username={username}" / FILE_NAME, schema, batch_size
+        )
+        for table, schema in SCHEMAS.items()
+    }
+    anime, manga = combine(username, data_dir=data_dir)
+    for type_, entries in (("anime", anime), ("manga", manga)):
+        for e in entries:
+            for table, row in _rows(type_, e):
+                writers[table].append(row)
+    for w in writers.values():
+        w.close()
+    counts = {table: w.rows for table, w in writers.items()}
+    logger.info(f"Exported {username} to {base}: {counts}")
+    return counts
+
+
+def export_parquet(
+    usernames: Sequence[str], out_dir: PathIsh, batch_size: int = BATCH_SIZE
+) -> Dict[str, Dict[str, int]]:
+    """
+    Export multiple accounts, one at a time. Returns username -> table -> row count
+    """
+    return {
+        username: export_account(username, out_dir, batch_size=batch_size)
+        for username in usernames
+    }
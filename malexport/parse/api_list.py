@@ -1,10 +1,9 @@
-import json
 from typing import NamedTuple, List, Optional, TypeVar, Iterator, Dict, Any
 from datetime import date, datetime
 
-from .common import parse_date_safe
+from .common import parse_date_safe, intern_str
 from ..list_type import ListType
-from ..common import Json
+from ..common import Json, iter_json_array
 from ..paths import PathIsh, _expand_file
 from .mal_list import IdInfo, Season
 
@@ -55,23 +54,22 @@ class Entry(NamedTuple):
             popularity=int(el["popularity"]),
             num_list_users=int(el["num_list_users"]),
             num_scoring_users=int(el["num_scoring_users"]),
-            nsfw=el["nsfw"],
+            nsfw=intern_str(el["nsfw"]),
             created_at=datetime.fromisoformat(el["created_at"]),
             updated_at=datetime.fromisoformat(el["updated_at"]),
-            media_type=el["media_type"],
-            status=el["status"],
+            media_type=intern_str(el["media_type"]),
+            status=intern_str(el["status"]),
             genres=IdInfo._parse_id_list(el, "genres"),
             list_status=el["my_list_status"],
             episode_count=el.get("num_episodes"),
             season=Season._parse(el.get("start_season")),
-            source=el.get("source"),
+            source=intern_str(el.get("source")),
             average_episode_duration=el.get("average_episode_duration"),
-            rating=el.get("rating"),
+            rating=intern_str(el.get("rating")),
             studios=IdInfo._parse_id_list(el, "studios"),
         )
 
 
 def iter_api_list(json_file: PathIsh, list_type: ListType) -> Iterator[Entry]:
-    data = json.loads(_expand_file(json_file).read_text())
-    for el in data:
+    for el in iter_json_array(_expand_file(json_file)):
         yield Entry._parse(el, list_type)
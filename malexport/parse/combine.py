@@ -10,7 +10,7 @@ from datetime import date
 
 from ..list_type import ListType
 from ..log import logger
-from ..paths import LocalDir
+from ..paths import LocalDir, json_exists
 from .common import split_tags
 from .history import History, HistoryEntry, iter_history_from_dir
 from .mal_list import (
@@ -19,8 +19,7 @@ from .mal_list import (
     parse_file as parse_user_history,
 )
 from .api_list import iter_api_list, Entry
-from .xml import AnimeXML, MangaXML, parse_xml
-
+from .xml import AnimeXML, MangaXML, parse_xml, export_path
 
 T = TypeVar("T")
 
@@ -165,14 +164,14 @@ def combine(username: str, data_dir: Optional[Path] = None) -> CombineResults:
     # exist, because of private lists
     animelist_json_data: Dict[int, AnimeEntry] = {}
     mangalist_json_data: Dict[int, MangaEntry] = {}
-    if (data_dir / "animelist.json").exists():
+    if json_exists(data_dir / "animelist.json"):
         animelist_json_data = {
             el.id: el  # type: ignore[union-attr,misc]
             for el in parse_user_history(
                 str(data_dir / "animelist.json"), list_type=ListType.ANIME
             )
         }
-    if (data_dir / "mangalist.json").exists():
+    if json_exists(data_dir / "mangalist.json"):
         mangalist_json_data = {
             el.id: el  # type: ignore[union-attr,misc]
             for el in parse_user_history(
@@ -183,24 +182,24 @@ def combine(username: str, data_dir: Optional[Path] = None) -> CombineResults:
     # xml exports should always exist
     animelist_xml_data: Dict[int, AnimeXML] = {
         el.id: el  # type: ignore[union-attr,misc]
-        for el in parse_xml(str(data_dir / "animelist.xml")).entries
+        for el in parse_xml(export_path(data_dir, ListType.ANIME)).entries
     }
     mangalist_xml_data: Dict[int, MangaXML] = {
         el.id: el  # type: ignore[union-attr,misc]
-        for el in parse_xml(str(data_dir / "mangalist.xml")).entries
+        for el in parse_xml(export_path(data_dir, ListType.MANGA)).entries
     }
 
     # list using the API
     animelist_api_json_data: Dict[int, Entry] = {}
     mangalist_api_json_data: Dict[int, Entry] = {}
-    if (data_dir / "animelist_api.json").exists():
+    if json_exists(data_dir / "animelist_api.json"):
         animelist_api_json_data = {
             el.id: el
             for el in iter_api_list(
                 str(data_dir / "animelist_api.json"), list_type=ListType.ANIME
             )
         }
-    if (data_dir / "mangalist_api.json").exists():
+    if json_exists(data_dir / "mangalist_api.json"):
         mangalist_api_json_data = {
             el.id: el
             for el in iter_api_list(
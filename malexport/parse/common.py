@@ -1,8 +1,13 @@
 import os
 import re
-from typing import Optional, Union, List
+import sys
+from typing import Optional, Union, List, TypeVar
 from datetime import date
 
+# if enabled, repeated values (statuses, media types, genres, studios) share
+# the same objects across entries instead of allocating new ones per entry
+INTERN_VALUES = bool(int(os.environ.get("MALEXPORT_INTERN_VALUES", 1)))
+
 
 # vendorized from distutils, since it's not available in Python 3.12
 def strtoint(val: str) -> int:
@@ -21,6 +26,19 @@ def strtoint(val: str) -> int:
         raise ValueError("invalid truth value %r" % (val,))
 
 
+S = TypeVar("S", str, Optional[str])
+
+
+def intern_str(val: S) -> S:
+    """
+    Intern strings which are one of a few enumerated values, so
+    that each entry that has them refers to the same object
+    """
+    if not isinstance(val, str) or not INTERN_VALUES:
+        return val
+    return sys.intern(val)
+
+
 def split_tags(tags: str) -> List[str]:
     return list(re.split(r"\s*,\s*", tags.strip()))
 
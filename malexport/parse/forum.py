@@ -1,10 +1,9 @@
 import os
-import json
-import glob
 from datetime import datetime
 from typing import NamedTuple, Iterator
 
-from ..paths import LocalDir
+from ..paths import LocalDir, iter_json_files
+from ..common import read_json
 
 
 class Post(NamedTuple):
@@ -20,16 +19,15 @@ def iter_forum_posts(username: str) -> Iterator[Post]:
     localdir = LocalDir.from_username(username)
     mal_username = localdir.load_or_prompt_credentials()["username"]
     forum_dir = localdir.data_dir / "forum"
-    for forum_path in glob.glob(os.path.join(forum_dir, "*.json")):
-        yield from _extract_posts_by_user(forum_path, mal_username)
+    for forum_path in iter_json_files(forum_dir):
+        yield from _extract_posts_by_user(str(forum_path), mal_username)
 
 
 def _extract_posts_by_user(forum_path: str, username: str) -> Iterator[Post]:
     forum_id, _ = os.path.splitext(os.path.basename(forum_path))
     if not forum_id.isnumeric():  # not a valid post, probably index.json
         return
-    with open(forum_path, "r") as f:
-        data = json.load(f)
+    data = read_json(forum_path)
     for post in data["posts"]:
         if username.casefold() == post["created_by"]["name"].casefold():
             yield Post(
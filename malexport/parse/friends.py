@@ -1,8 +1,9 @@
+from pathlib import Path
 from typing import NamedTuple, Iterator
 from datetime import datetime
-import json
 
-from ..paths import LocalDir
+from ..paths import LocalDir, json_exists
+from ..common import read_json
 from ..log import logger
 
 
@@ -17,10 +18,14 @@ class Friend(NamedTuple):
 def iter_friends(username: str) -> Iterator[Friend]:
     localdir = LocalDir.from_username(username)
     friends_path = localdir.data_dir / "friends.json"
-    if not friends_path.exists():
+    if not json_exists(friends_path):
         logger.debug(f"{friends_path} doesn't exist, returning empty iterator")
         return
-    for blob in json.loads(friends_path.read_text()):
+    yield from parse_friends_file(friends_path)
+
+
+def parse_friends_file(friends_path: Path) -> Iterator[Friend]:
+    for blob in read_json(friends_path):
         user = blob["user"]
         yield Friend(
             url=user["url"],
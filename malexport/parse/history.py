@@ -1,10 +1,29 @@
-import json
+import os
+import bisect
+import hashlib
+import itertools
+from array import array
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import NamedTuple, List, Iterator, Tuple, Union, Any
+from typing import (
+    NamedTuple,
+    List,
+    Iterator,
+    Tuple,
+    Union,
+    Any,
+    Optional,
+    Dict,
+    Iterable,
+)
 
-from ..paths import LocalDir
+from ..paths import LocalDir, json_exists, iter_json_files, stored_path, cache_dir
 from ..list_type import ListType
+from ..common import read_json, write_file, serialize_bytes, deserialize
+
+# '0' to not save the index HistoryIndex.from_dir builds, so its built each time
+HISTORY_INDEX_ENABLED: bool = bool(int(os.environ.get("MALEXPORT_HISTORY_INDEX", 1)))
+default_index_dir = Path(cache_dir) / "malexport" / "history_index"
 
 
 class HistoryEntry(NamedTuple):
@@ -23,65 +42,103 @@ class History(NamedTuple):
         return f"https://myanimelist.net/{self.list_type}/{self.mal_id}"
 
 
+class RawHistory(NamedTuple):
+    """
+    History for one entry as it is saved on disk, the episodes
+    are left as [number, epoch] pairs instead of creating datetimes
+    """
+
+    mal_id: int
+    list_type: str
+    title: str
+    episodes: List[List[int]]
+
+
 def iter_user_history(username: str) -> Iterator[History]:
     localdir = LocalDir.from_username(username)
     yield from iter_history_from_dir(localdir.data_dir)
 
 
 def iter_history_from_dir(data_dir: Path) -> Iterator[History]:
+    for raw in iter_raw_history_from_dir(data_dir):
+        yield _parse_raw_history(raw)
+
+
+def iter_raw_history_from_dir(data_dir: Path) -> Iterator[RawHistory]:
     # i.e. for anime / manga
     for _type in map(str.lower, ListType.__members__):
         merged_history_file = data_dir / f"{_type}_history.json"
         # parse from both merged history and individual history files,
         # in case either one is missing
-        yield from _parse_merged_history(merged_history_file, _type)
-        yield from parse_history_dir(data_dir / "history" / _type, _type)
+        yield from _iter_raw_merged_history(merged_history_file, _type)
+        yield from _iter_raw_history_dir(data_dir / "history" / _type, _type)
+
+
+def _parse_raw_history(raw: RawHistory) -> History:
+    return History(
+        list_type=raw.list_type,
+        mal_id=raw.mal_id,
+        title=raw.title,
+        entries=_parse_episodes(raw.episodes),
+    )
 
 
 def _parse_merged_history(
     merged_history_file: Path, list_type: Union[str, ListType]
 ) -> Iterator[History]:
+    for raw in _iter_raw_merged_history(merged_history_file, list_type):
+        yield _parse_raw_history(raw)
+
+
+def _iter_raw_merged_history(
+    merged_history_file: Path, list_type: Union[str, ListType]
+) -> Iterator[RawHistory]:
     lt: str = list_type.value.lower() if isinstance(list_type, ListType) else list_type
-    if not merged_history_file.exists():
+    if not json_exists(merged_history_file):
         return
-    merged_data = json.loads(merged_history_file.read_text())
+    merged_data = read_json(merged_history_file)
     for key, data in merged_data.items():
-        title, entries = _parse_history_data(data)
-        if len(entries) == 0:
+        # only return items which have at least one history entry
+        if len(data["episodes"]) == 0:
             continue
-        yield History(
+        yield RawHistory(
             list_type=lt,
             mal_id=int(key),
-            title=title,
-            entries=entries,
+            title=data["title"],
+            episodes=data["episodes"],
         )
 
 
 def parse_history_dir(
     history_dir: Path, list_type: Union[str, ListType]
 ) -> Iterator[History]:
+    for raw in _iter_raw_history_dir(history_dir, list_type):
+        yield _parse_raw_history(raw)
+
+
+def _iter_raw_history_dir(
+    history_dir: Path, list_type: Union[str, ListType]
+) -> Iterator[RawHistory]:
     if not history_dir.exists():
         return
     lt: str = list_type.value.lower() if isinstance(list_type, ListType) else list_type
-    for history_path in history_dir.glob("*.json"):
+    for history_path in iter_json_files(history_dir):
         assert (
             history_path.stem.isnumeric()
         ), f"Expected history JSON file, found {history_path}"
-        data = json.loads(history_path.read_text())
-        title, entries = _parse_history_data(data)
+        data = read_json(history_path)
         # only return items which have at least one history entry
-        if len(entries) == 0:
+        if len(data["episodes"]) == 0:
             continue
-        yield History(
+        yield RawHistory(
             list_type=lt,
             mal_id=int(history_path.stem),
-            title=title,
-            entries=entries,
+            title=data["title"],
+            episodes=data["episodes"],
         )
 
 
 def parse_manual_history(history_file: Path) -> Iterator[History]:
-    import itertools
     import autotui.shortcuts
     from ..manual_episode import Data
 
@@ -109,8 +166,12 @@ def parse_manual_history(history_file: Path) -> Iterator[History]:
 
 
 def _parse_history_data(history_data: Any) -> Tuple[str, List[HistoryEntry]]:
+    return history_data["title"], _parse_episodes(history_data["episodes"])
+
+
+def _parse_episodes(episode_data: List[List[int]]) -> List[HistoryEntry]:
     entries: List[HistoryEntry] = []
-    for entry_data in history_data["episodes"]:
+    for entry_data in episode_data:
         [num, epoch] = entry_data
         entries.append(
             HistoryEntry(
@@ -118,4 +179,253 @@ def _parse_history_data(history_data: Any) -> Tuple[str, List[HistoryEntry]]:
                 number=num,
             )
         )
-    return history_data["title"], entries
+    return entries
+
+
+def filter_histories(
+    histories: Iterable[History],
+    *,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    list_type: Optional[str] = None,
+    mal_id: Optional[int] = None,
+) -> Iterator[History]:
+    """
+    Filter History objects to entries where since <= at < until, keeping the
+    original datetimes and order. Histories with no entries left are skipped
+    """
+    lo = None if since is None else since.timestamp()
+    hi = None if until is None else until.timestamp()
+    for hist in histories:
+        if list_type is not None and hist.list_type != list_type:
+            continue
+        if mal_id is not None and hist.mal_id != mal_id:
+            continue
+        entries = [
+            e
+            for e in hist.entries
+            if (lo is None or e.at.timestamp() >= lo)
+            and (hi is None or e.at.timestamp() < hi)
+        ]
+        if entries:
+            yield hist._replace(entries=entries)
+
+
+def _history_to_raw(hist: History) -> RawHistory:
+    return RawHistory(
+        mal_id=hist.mal_id,
+        list_type=hist.list_type,
+        title=hist.title,
+        episodes=[[e.number, int(e.at.timestamp())] for e in hist.entries],
+    )
+
+
+def _history_signature(data_dir: Path) -> str:
+    """
+    A hash of the name/size/mtime of each history file, to check
+    whether a saved index is still up to date without reading them
+    """
+    digest = hashlib.sha1()
+    for _type in map(str.lower, ListType.__members__):
+        merged = stored_path(data_dir / f"{_type}_history.json")
+        if merged.exists():
+            st = merged.stat()
+            digest.update(f"{merged.name}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+        history_dir = data_dir / "history" / _type
+        if history_dir.exists():
+            with os.scandir(history_dir) as it:
+                files = sorted(
+                    (ent.name, ent.stat()) for ent in it if ".json" in ent.name
+                )
+            for name, st in files:
+                digest.update(
+                    f"{_type}/{name}:{st.st_size}:{st.st_mtime_ns}\n".encode()
+                )
+    return digest.hexdigest()
+
+
+def index_path(data_dir: Path, index_dir: Path = default_index_dir) -> Path:
+    """
+    Where the index for a data directory is saved. There's one file per
+    data directory, which is replaced when the history changes
+    """
+    key = hashlib.sha1(str(data_dir.absolute()).encode()).hexdigest()
+    return index_dir / f"{data_dir.name}-{key[:8]}.idx"
+
+
+class HistoryIndex:
+    """
+    A sorted index over every history row (one episode/chapter each), so
+    that a date range can be selected with a binary search instead of
+    creating datetimes/History objects for everything
+
+    Rows are stored in parallel arrays, sorted by epoch. from_dir saves the
+    index to ~/.cache/malexport/history_index, and reuses it till the
+    history files change
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        rows: Iterable[Tuple[int, str, int, int]],
+        titles: Dict[Tuple[str, int], str],
+    ) -> None:
+        # each row is (epoch, list_type, mal_id, number)
+        ordered = sorted(rows, key=lambda r: r[0])
+        self.at = array("q", (r[0] for r in ordered))
+        self.list_type: List[str] = [r[1] for r in ordered]
+        self.mal_id = array("q", (r[2] for r in ordered))
+        self.number = array("q", (r[3] for r in ordered))
+        self.titles = titles
+
+    def __len__(self) -> int:
+        return len(self.at)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(rows={len(self)})"
+
+    @classmethod
+    def from_raw(cls, raw_history: Iterable[RawHistory]) -> "HistoryIndex":
+        titles: Dict[Tuple[str, int], str] = {}
+        rows: List[Tuple[int, str, int, int]] = []
+        for raw in raw_history:
+            titles[(raw.list_type, raw.mal_id)] = raw.title
+            for num, epoch in raw.episodes:
+                rows.append((epoch, raw.list_type, raw.mal_id, num))
+        return cls(rows, titles)
+
+    @classmethod
+    def from_histories(cls, histories: Iterable[History]) -> "HistoryIndex":
+        return cls.from_raw(map(_history_to_raw, histories))
+
+    @classmethod
+    def from_dir(
+        cls,
+        data_dir: Path,
+        include_manual: bool = False,
+        index_file: Optional[Path] = None,
+    ) -> "HistoryIndex":
+        """
+        If include_manual is False, loads the saved index if the history files
+        haven't changed since it was saved, else builds and saves a new one.
+        If MALEXPORT_HISTORY_INDEX=0, the index is built without saving it
+        """
+        raw: Iterable[RawHistory] = iter_raw_history_from_dir(data_dir)
+        manual_history_file = data_dir / "manual_history.yaml"
+        if include_manual and manual_history_file.exists():
+            raw = itertools.chain(
+                raw, map(_history_to_raw, parse_manual_history(manual_history_file))
+            )
+            return cls.from_raw(raw)
+        if not HISTORY_INDEX_ENABLED:
+            return cls.from_raw(raw)
+        index_file = index_file or index_path(data_dir)
+        signature = _history_signature(data_dir)
+        index = cls.load(index_file, signature)
+        if index is None:
+            index = cls.from_raw(raw)
+            index.save(index_file, signature)
+        return index
+
+    def save(self, path: Path, signature: str) -> None:
+        types = sorted(set(self.list_type))
+        header = {
+            "version": self.VERSION,
+            "signature": signature,
+            "rows": len(self),
+            "types": types,
+            "titles": [[lt, mid, title] for (lt, mid), title in self.titles.items()],
+        }
+        type_codes = array("B", (types.index(lt) for lt in self.list_type))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_file(
+            path,
+            b"".join(
+                (
+                    serialize_bytes(header),
+                    b"\n",
+                    self.at.tobytes(),
+                    self.mal_id.tobytes(),
+                    self.number.tobytes(),
+                    type_codes.tobytes(),
+                )
+            ),
+        )
+
+    @classmethod
+    def load(cls, path: Path, signature: str) -> Optional["HistoryIndex"]:
+        """
+        Load a saved index, returns None if it doesn't exist or is out of date
+        """
+        if not path.exists():
+            return None
+        data = path.read_bytes()
+        header_end = data.index(b"\n")
+        header = deserialize(data[:header_end])
+        if header["version"] != cls.VERSION or header["signature"] != signature:
+            return None
+        rows = header["rows"]
+        index = cls([], {(lt, mid): title for lt, mid, title in header["titles"]})
+        view = memoryview(data)[header_end + 1 :]
+        size = index.at.itemsize * rows
+        index.at.frombytes(view[:size])
+        index.mal_id.frombytes(view[size : size * 2])
+        index.number.frombytes(view[size * 2 : size * 3])
+        type_codes = array("B", view[size * 3 :])
+        types = header["types"]
+        index.list_type = [types[c] for c in type_codes]
+        return index
+
+    def select(
+        self,
+        *,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        list_type: Optional[str] = None,
+        mal_id: Optional[int] = None,
+    ) -> Iterator[int]:
+        """
+        Yields the row indexes where since <= at < until, most recent first,
+        optionally filtered to a list type/ID
+        """
+        lo = 0 if since is None else bisect.bisect_left(self.at, int(since.timestamp()))
+        hi = (
+            len(self)
+            if until is None
+            else bisect.bisect_left(self.at, int(until.timestamp()))
+        )
+        for i in range(hi - 1, lo - 1, -1):
+            if list_type is not None and self.list_type[i] != list_type:
+                continue
+            if mal_id is not None and self.mal_id[i] != mal_id:
+                continue
+            yield i
+
+    def histories(
+        self,
+        *,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        list_type: Optional[str] = None,
+        mal_id: Optional[int] = None,
+    ) -> Iterator[History]:
+        """
+        Group the selected rows back into History objects,
+        starting with the entry which has the most recent activity
+        """
+        grouped: Dict[Tuple[str, int], List[HistoryEntry]] = {}
+        for i in self.select(
+            since=since, until=until, list_type=list_type, mal_id=mal_id
+        ):
+            key = (self.list_type[i], self.mal_id[i])
+            grouped.setdefault(key, []).append(
+                HistoryEntry(
+                    at=datetime.fromtimestamp(self.at[i], tz=timezone.utc),
+                    number=self.number[i],
+                )
+            )
+        for (lt, mid), entries in grouped.items():
+            yield History(
+                mal_id=mid, list_type=lt, title=self.titles[(lt, mid)], entries=entries
+            )
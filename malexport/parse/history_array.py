@@ -0,0 +1,199 @@
+"""
+A columnar representation of history data, backed by numpy arrays
+
+Parsing history normally creates a datetime/HistoryEntry for every
+episode/chapter, which is slow and memory hungry for accounts with
+lots of history. This keeps each column (id, type, number, epoch)
+in a parallel array instead, so it can be filtered/aggregated
+without creating any python objects per row
+
+Requires numpy, install with pip install 'malexport[columnar]'
+"""
+
+from array import array
+from pathlib import Path
+from datetime import datetime
+from typing import NamedTuple, Dict, Tuple, Union, Optional, Iterable
+
+import numpy as np
+import numpy.typing as npt
+
+from ..paths import LocalDir
+from ..list_type import ListType
+from .history import RawHistory, iter_raw_history_from_dir
+
+# codes used for the list_type column
+LIST_TYPE_CODES: Dict[str, int] = {"anime": 0, "manga": 1}
+
+SECONDS_PER_DAY = 86400
+
+Timestamp = Union[int, float, datetime]
+
+IntArray = npt.NDArray[np.int64]
+
+
+def _to_epoch(ts: Timestamp) -> int:
+    if isinstance(ts, datetime):
+        return int(ts.timestamp())
+    return int(ts)
+
+
+def _list_type_code(list_type: Union[str, ListType]) -> int:
+    lt: str = list_type.value if isinstance(list_type, ListType) else list_type
+    return LIST_TYPE_CODES[lt.lower()]
+
+
+class DailyCounts(NamedTuple):
+    day: npt.NDArray[np.datetime64]
+    total: IntArray
+
+
+class EntryStats(NamedTuple):
+    list_type: IntArray
+    mal_id: IntArray
+    total: IntArray
+    first_at: IntArray
+    last_at: IntArray
+
+
+class HistoryArrays(NamedTuple):
+    """
+    Parallel arrays with one row per history entry, sorted by 'at'
+    list_type uses the codes in LIST_TYPE_CODES, 'at' is epoch seconds
+    """
+
+    mal_id: IntArray
+    list_type: IntArray
+    number: IntArray
+    at: IntArray
+    # (list_type, mal_id) -> title
+    titles: Dict[Tuple[str, int], str]
+
+    @property
+    def size(self) -> int:
+        return int(self.at.shape[0])
+
+    @classmethod
+    def from_raw(
+        cls,
+        raw_history: Iterable[RawHistory],
+        *,
+        manual_history_file: Optional[Path] = None,
+    ) -> "HistoryArrays":
+        mal_ids = array("q")
+        list_types = array("q")
+        numbers = array("q")
+        epochs = array("q")
+        titles: Dict[Tuple[str, int], str] = {}
+        for raw in raw_history:
+            code = _list_type_code(raw.list_type)
+            count = len(raw.episodes)
+            titles[(raw.list_type, raw.mal_id)] = raw.title
+            mal_ids.extend([raw.mal_id] * count)
+            list_types.extend([code] * count)
+            for num, epoch in raw.episodes:
+                numbers.append(num)
+                epochs.append(epoch)
+
+        if manual_history_file is not None:
+            from .history import parse_manual_history
+
+            for hist in parse_manual_history(manual_history_file):
+                code = _list_type_code(hist.list_type)
+                titles.setdefault((hist.list_type, hist.mal_id), hist.title)
+                for ent in hist.entries:
+                    mal_ids.append(hist.mal_id)
+                    list_types.append(code)
+                    numbers.append(ent.number)
+                    epochs.append(int(ent.at.timestamp()))
+
+        at = np.frombuffer(epochs, dtype=np.int64)
+        order = np.argsort(at, kind="stable")
+        return cls(
+            mal_id=np.frombuffer(mal_ids, dtype=np.int64)[order],
+            list_type=np.frombuffer(list_types, dtype=np.int64)[order],
+            number=np.frombuffer(numbers, dtype=np.int64)[order],
+            at=at[order],
+            titles=titles,
+        )
+
+    @classmethod
+    def from_dir(cls, data_dir: Path, include_manual: bool = False) -> "HistoryArrays":
+        manual_history_file = data_dir / "manual_history.yaml"
+        return cls.from_raw(
+            iter_raw_history_from_dir(data_dir),
+            manual_history_file=(
+                manual_history_file
+                if include_manual and manual_history_file.exists()
+                else None
+            ),
+        )
+
+    def _take(self, selector: Union[slice, npt.NDArray[np.bool_]]) -> "HistoryArrays":
+        return HistoryArrays(
+            mal_id=self.mal_id[selector],
+            list_type=self.list_type[selector],
+            number=self.number[selector],
+            at=self.at[selector],
+            titles=self.titles,
+        )
+
+    def between(
+        self, since: Optional[Timestamp] = None, until: Optional[Timestamp] = None
+    ) -> "HistoryArrays":
+        """
+        Select rows where since <= at < until. Since rows are sorted
+        by 'at', this is a binary search and returns views of the arrays
+        """
+        lo = 0 if since is None else int(np.searchsorted(self.at, _to_epoch(since)))
+        hi = (
+            self.size
+            if until is None
+            else int(np.searchsorted(self.at, _to_epoch(until)))
+        )
+        return self._take(slice(lo, hi))
+
+    def for_type(self, list_type: Union[str, ListType]) -> "HistoryArrays":
+        return self._take(self.list_type == _list_type_code(list_type))
+
+    def for_id(self, mal_id: int, list_type: Union[str, ListType]) -> "HistoryArrays":
+        return self._take(
+            (self.mal_id == mal_id) & (self.list_type == _list_type_code(list_type))
+        )
+
+    def daily_counts(self, utc_offset: int = 0) -> DailyCounts:
+        """
+        Count how many episodes/chapters were watched/read each day
+        utc_offset is in seconds, to shift days into a local timezone
+        """
+        days, counts = np.unique(
+            (self.at + utc_offset) // SECONDS_PER_DAY, return_counts=True
+        )
+        return DailyCounts(
+            day=days.astype("datetime64[D]"), total=counts.astype(np.int64)
+        )
+
+    def per_entry(self) -> EntryStats:
+        """
+        Aggregate rows by entry, returning the number of history rows
+        and the first/last time each entry was watched/read
+        """
+        key = self.mal_id * len(LIST_TYPE_CODES) + self.list_type
+        uniq, first_idx, inverse, counts = np.unique(
+            key, return_index=True, return_inverse=True, return_counts=True
+        )
+        last_at = np.zeros(uniq.shape[0], dtype=np.int64)
+        # the largest epoch in each group is the most recent watch/read
+        np.maximum.at(last_at, inverse.reshape(-1), self.at)
+        return EntryStats(
+            list_type=uniq % len(LIST_TYPE_CODES),
+            mal_id=uniq // len(LIST_TYPE_CODES),
+            total=counts.astype(np.int64),
+            first_at=self.at[first_idx],
+            last_at=last_at,
+        )
+
+
+def user_history_arrays(username: str, include_manual: bool = False) -> HistoryArrays:
+    localdir = LocalDir.from_username(username)
+    return HistoryArrays.from_dir(localdir.data_dir, include_manual=include_manual)
@@ -1,10 +1,10 @@
-import json
-from typing import NamedTuple, Union, List, Optional, TypeVar, Iterator
+from typing import NamedTuple, Union, List, Optional, TypeVar, Iterator, Dict, Tuple
 from datetime import date
 
-from .common import strtobool, parse_short_date
+from . import common
+from .common import strtobool, parse_short_date, intern_str
 from ..list_type import ListType
-from ..common import Json
+from ..common import Json, iter_json_array, cache_encoding
 from ..paths import PathIsh, _expand_file
 
 T = TypeVar("T")
@@ -25,10 +25,24 @@ class IdInfo(NamedTuple):
     @staticmethod
     def _parse(data: Optional[Json]) -> Optional["IdInfo"]:
         if isinstance(data, dict) and "id" in data and "name" in data:
-            return IdInfo(id=data["id"], name=data["name"])
+            return IdInfo._shared(data["id"], data["name"])
         else:
             return None
 
+    @staticmethod
+    def _shared(id: int, name: str) -> "IdInfo":
+        """
+        Genres/studios/etc. repeat across lots of entries, so return
+        the same IdInfo instance for each (id, name) pair
+        """
+        if not common.INTERN_VALUES:
+            return IdInfo(id=id, name=name)
+        key = (id, name)
+        info = _SHARED_ID_INFO.get(key)
+        if info is None:
+            info = _SHARED_ID_INFO[key] = IdInfo(id=id, name=intern_str(name))
+        return info
+
     @classmethod
     def _parse_id_list(cls, el: Json, key: str) -> List["IdInfo"]:
         return filter_none([cls._parse(e) for e in list(el.get(key) or [])])
@@ -45,10 +59,27 @@ class Season(NamedTuple):
             and "year" in season_data
             and "season" in season_data
         ):
-            return Season(year=season_data["year"], season=season_data["season"])
+            return Season._shared(season_data["year"], season_data["season"])
         else:
             return None
 
+    @staticmethod
+    def _shared(year: int, season: str) -> "Season":
+        if not common.INTERN_VALUES:
+            return Season(year=year, season=season)
+        key = (year, season)
+        info = _SHARED_SEASONS.get(key)
+        if info is None:
+            info = _SHARED_SEASONS[key] = Season(year=year, season=intern_str(season))
+        return info
+
+
+_SHARED_ID_INFO: Dict[Tuple[int, str], IdInfo] = {}
+_SHARED_SEASONS: Dict[Tuple[int, str], Season] = {}
+
+cache_encoding(IdInfo)
+cache_encoding(Season)
+
 
 ANIME_STATUS_MAP = {
     1: "Currently Watching",
@@ -137,15 +168,15 @@ class AnimeEntry(NamedTuple):
             url=el["anime_url"],
             image_path=el["anime_image_path"],
             is_added_to_list=el["is_added_to_list"],
-            media_type=el["anime_media_type_string"],
-            rating=el["anime_mpaa_rating_string"],
+            media_type=intern_str(el["anime_media_type_string"]),
+            rating=intern_str(el["anime_mpaa_rating_string"]),
             start_date=parse_short_date(el["start_date_string"] or ""),
             finish_date=parse_short_date(el["finish_date_string"] or ""),
             air_start_date=parse_short_date(el["anime_start_date_string"]),
             air_end_date=parse_short_date(el["anime_end_date_string"]),
             days=el["days_string"],
-            storage=el["storage_string"],
-            priority=el["priority_string"],
+            storage=intern_str(el["storage_string"]),
+            priority=intern_str(el["priority_string"]),
         )
 
 
@@ -198,14 +229,14 @@ class MangaEntry(NamedTuple):
             url=el["manga_url"],
             image_path=el["manga_image_path"],
             is_added_to_list=el["is_added_to_list"],
-            media_type=el["manga_media_type_string"],
+            media_type=intern_str(el["manga_media_type_string"]),
             start_date=parse_short_date(el["start_date_string"] or ""),
             finish_date=parse_short_date(el["finish_date_string"] or ""),
             publish_start_date=parse_short_date(el["manga_start_date_string"]),
             publish_end_date=parse_short_date(el["manga_end_date_string"]),
             days=el["days_string"],
-            retail=el["retail_string"],
-            priority=el["priority_string"],
+            retail=intern_str(el["retail_string"]),
+            priority=intern_str(el["priority_string"]),
         )
 
 
@@ -213,13 +244,11 @@ Entry = Union[AnimeEntry, MangaEntry]
 
 
 def iter_user_list(json_file: str, list_type: ListType) -> Iterator[Entry]:
-    with open(json_file) as f:
-        data = json.load(f)
     if list_type == ListType.ANIME:
-        for el in data:
+        for el in iter_json_array(json_file):
             yield AnimeEntry._parse(el)
     else:
-        for el in data:
+        for el in iter_json_array(json_file):
             yield MangaEntry._parse(el)
 
 
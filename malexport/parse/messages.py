@@ -1,9 +1,9 @@
-import json
 from pathlib import Path
 from datetime import datetime, timezone
 from typing import NamedTuple, List, Iterator, Optional, Dict, Any
 
-from ..paths import LocalDir
+from ..paths import LocalDir, iter_json_files
+from ..common import read_json
 
 
 class Message(NamedTuple):
@@ -25,7 +25,7 @@ class Thread(NamedTuple):
 def iter_user_threads(username: str) -> Iterator[Thread]:
     localdir = LocalDir.from_username(username)
     msg_dir = localdir.data_dir / "messages"
-    for file in msg_dir.glob("*.json"):
+    for file in iter_json_files(msg_dir):
         yield _parse_thread(file)
 
 
@@ -34,7 +34,7 @@ def _parse_thread(thread_file: Path) -> Thread:
     assert (
         thread_id.isnumeric()
     ), f"Expected thread JSON file where name includes ID, found {thread_file}"
-    data = json.loads(thread_file.read_text())
+    data = read_json(thread_file)
     messages = _parse_messages(data["messages"])
     return Thread(
         thread_id=int(thread_id), messages=list(messages), subject=data["subject"]
@@ -1,18 +1,189 @@
-import sys
+import os
 import json
+import mmap
+import struct
+import pickle
+import shutil
 import logging
-from typing import List, Set, NamedTuple, Callable, Tuple, Optional
+import zipfile
+import tempfile
+import posixpath
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import (
+    AbstractSet,
+    Any,
+    List,
+    Set,
+    Dict,
+    NamedTuple,
+    Callable,
+    Tuple,
+    Optional,
+    Iterable,
+    Iterator,
+)
 from pathlib import Path
 
 from git.repo.base import Repo  # type: ignore[import]
 from git.cmd import Git  # type: ignore[import]
 
 from .combine import combine, CombineResults, AnimeData, MangaData
-from ..paths import mal_id_cache_dir
+from ..paths import mal_id_cache_dir, cache_dir, ZSTD_SUFFIX
+from ..common import serialize, deserialize, write_file
+from ..manifest import file_digest
+from ..snapshots import SnapshotStore, is_snapshot_path
 from ..log import logger as mlog
 
 repo_dir = Path(mal_id_cache_dir)
 
+# bump this if AnimeData/MangaData change, so old cached results aren't used
+RECOVERY_CACHE_VERSION = 1
+default_recovery_cache_dir = Path(cache_dir) / "malexport" / "recover"
+
+# compiled from the JSON files in mal-id-cache, see ApprovedIndex
+default_approved_index_path = Path(cache_dir) / "malexport" / "approved.idx"
+
+# how many processes to use to parse backups
+RECOVER_WORKERS = int(os.environ.get("MALEXPORT_RECOVER_WORKERS", os.cpu_count() or 1))
+
+
+class IdBitmap(AbstractSet[int]):
+    """
+    A read-only set of IDs, stored as a bitmap (bit N is set if N is in the set)
+
+    MAL IDs are dense, so this is a couple KB per 10,000 IDs, and
+    checking if an ID is in the set is just indexing into the bitmap
+    """
+
+    def __init__(self, bitmap: "bytes | memoryview", count: int) -> None:
+        self.bitmap = bitmap
+        self.count = count
+
+    @classmethod
+    def from_ids(cls, ids: Iterable[int]) -> "IdBitmap":
+        idset = set(ids)
+        bitmap = bytearray((max(idset, default=0) >> 3) + 1)
+        for i in idset:
+            bitmap[i >> 3] |= 1 << (i & 7)
+        return cls(bytes(bitmap), len(idset))
+
+    def __contains__(self, item: object) -> bool:
+        if not isinstance(item, int) or item < 0:
+            return False
+        byte = item >> 3
+        if byte >= len(self.bitmap):
+            return False
+        return bool(self.bitmap[byte] & (1 << (item & 7)))
+
+    def __iter__(self) -> Iterator[int]:
+        for byte, val in enumerate(self.bitmap):
+            if val:
+                for bit in range(8):
+                    if val & (1 << bit):
+                        yield (byte << 3) | bit
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __reduce__(self) -> Tuple[type, Tuple[bytes, int]]:
+        # memory-mapped bitmaps can't be pickled, copy the bytes instead
+        return (IdBitmap, (bytes(self.bitmap), self.count))
+
+
+class ApprovedIndex:
+    """
+    The approved IDs from mal-id-cache, compiled to a file with the commit
+    they were built from, so the JSON files don't have to be parsed each time
+
+    The file is a header (magic, length of the commit hash, the commit hash,
+    count/size of each bitmap), followed by the anime bitmap and then the manga
+    bitmap. It's memory-mapped when loaded, so the bitmaps aren't read/copied
+    into memory. The mapping stays open till close() is called (or the
+    with block exits), after that the loaded bitmaps can't be used
+    """
+
+    MAGIC = b"MALIDX2\n"
+    # the commit field fits SHA-1 (40) or SHA-256 (64) hex hashes
+    HEADER = struct.Struct("<8sB64sIIII")
+
+    def __init__(self, path: Path = default_approved_index_path) -> None:
+        self.path = path
+        self._mmap: Optional[mmap.mmap] = None
+        self._views: List[memoryview] = []
+
+    def __enter__(self) -> "ApprovedIndex":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for view in self._views:
+            view.release()
+        self._views = []
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def build(self, commit: str) -> None:
+        commit_bytes = commit.encode("ascii")
+        if len(commit_bytes) > 64:
+            raise ValueError(f"Commit hash {commit} is longer than 64 characters")
+        anime_file = repo_dir / "cache" / "anime_cache.json"
+        manga_file = repo_dir / "cache" / "manga_cache.json"
+        anime_data = json.loads(anime_file.read_text())
+        manga_data = json.loads(manga_file.read_text())
+        anime = IdBitmap.from_ids(anime_data["sfw"] + anime_data["nsfw"])
+        manga = IdBitmap.from_ids(manga_data["sfw"] + manga_data["nsfw"])
+        header = self.HEADER.pack(
+            self.MAGIC,
+            len(commit_bytes),
+            commit_bytes,
+            anime.count,
+            len(anime.bitmap),
+            manga.count,
+            len(manga.bitmap),
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_file(self.path, header + bytes(anime.bitmap) + bytes(manga.bitmap))
+        mlog.debug(f"Built approved ID index for {commit} at {self.path}")
+
+    def load(self, commit: str) -> Optional["Approved"]:
+        """
+        Returns None if the index doesn't exist or was built from another commit
+        """
+        self.close()
+        if not self.path.exists():
+            return None
+        with self.path.open("rb") as f:
+            if os.fstat(f.fileno()).st_size < self.HEADER.size:
+                return None
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(mm)
+        (
+            magic,
+            commit_len,
+            index_commit,
+            anime_count,
+            anime_size,
+            manga_count,
+            manga_size,
+        ) = self.HEADER.unpack_from(buf)
+        if magic != self.MAGIC or index_commit[:commit_len] != commit.encode("ascii"):
+            buf.release()
+            mm.close()
+            return None
+        start = self.HEADER.size
+        anime_view = buf[start : start + anime_size]
+        manga_view = buf[start + anime_size : start + anime_size + manga_size]
+        self._mmap = mm
+        self._views = [anime_view, manga_view, buf]
+        return Approved(
+            anime=IdBitmap(anime_view, anime_count),
+            manga=IdBitmap(manga_view, manga_count),
+        )
+
 
 class Approved(NamedTuple):
     """
@@ -20,8 +191,8 @@ class Approved(NamedTuple):
     of approved MAL IDs
     """
 
-    anime: Set[int]
-    manga: Set[int]
+    anime: AbstractSet[int]
+    manga: AbstractSet[int]
 
     @staticmethod
     def git_clone() -> Repo:
@@ -48,7 +219,7 @@ class Approved(NamedTuple):
 
     @classmethod
     def git_hash(cls) -> str:
-        return str(cls.git().log().splitlines()[0].split()[-1])
+        return str(cls.git().rev_parse("HEAD")).strip()
 
     @classmethod
     def git_pull(cls) -> Tuple[str, str]:
@@ -64,6 +235,8 @@ class Approved(NamedTuple):
             return commit_id, commit_id
         commit_id_after = cls.git_hash()
         mlog.debug(f"mal-id-cache Commit ID after: {commit_id_after}")
+        if commit_id != commit_id_after:
+            ApprovedIndex().build(commit_id_after)
         return commit_id, commit_id_after
 
     @classmethod
@@ -73,21 +246,167 @@ class Approved(NamedTuple):
 
     @classmethod
     def parse_from_git_dir(cls) -> "Approved":
+        """
+        Load the approved IDs from the compiled index, rebuilding
+        it if it was built from a different commit
+        """
         cls.create_if_doesnt_exist()
-        anime_file = repo_dir / "cache" / "anime_cache.json"
-        manga_file = repo_dir / "cache" / "manga_cache.json"
-        anime = json.loads(anime_file.read_text())
-        manga = json.loads(manga_file.read_text())
-        return Approved(
-            anime=set(anime["sfw"] + anime["nsfw"]),
-            manga=set(manga["sfw"] + manga["nsfw"]),
-        )
+        index = ApprovedIndex()
+        commit = cls.git_hash()
+        approved = index.load(commit)
+        if approved is None:
+            index.build(commit)
+            approved = index.load(commit)
+            assert approved is not None
+        return approved
+
+
+ParseFunc = Callable[[Path, str], CombineResults]
 
 
 def _default_parse_func(backup_dir: Path, username: str) -> CombineResults:
     return combine(username, data_dir=backup_dir)
 
 
+def _parse_func_id(parse_func: Optional[ParseFunc]) -> Optional[str]:
+    """
+    Identifies the results of parse_func in the cache: empty for the default
+    parse functions, else its module/name. None if it has no unique name
+    """
+    if parse_func is None or parse_func in (_default_parse_func, parse_backup):
+        return ""
+    name = f"{parse_func.__module__}.{parse_func.__qualname__}"
+    if "<" in name:
+        return None
+    return name
+
+
+class CachedBackup(NamedTuple):
+    # every ID in the backup
+    anime_ids: List[int]
+    manga_ids: List[int]
+    # data for the entries which weren't approved when this was cached
+    anime: List[AnimeData]
+    manga: List[MangaData]
+
+    @classmethod
+    def from_results(
+        cls, results: CombineResults, approved: "Approved"
+    ) -> "CachedBackup":
+        anime, manga = results
+        return cls(
+            anime_ids=[a.id for a in anime],
+            manga_ids=[m.id for m in manga],
+            anime=[a for a in anime if a.id not in approved.anime],
+            manga=[m for m in manga if m.id not in approved.manga],
+        )
+
+    def deleted(self, approved: "Approved") -> Optional[CombineResults]:
+        """
+        The entries which aren't in the approved list, or None if
+        something that was approved when this was created isn't anymore
+        (so the data for it wasn't kept)
+        """
+        kept_anime = {a.id for a in self.anime}
+        kept_manga = {m.id for m in self.manga}
+        if any(i not in approved.anime and i not in kept_anime for i in self.anime_ids):
+            return None
+        if any(i not in approved.manga and i not in kept_manga for i in self.manga_ids):
+            return None
+        return (
+            [a for a in self.anime if a.id not in approved.anime],
+            [m for m in self.manga if m.id not in approved.manga],
+        )
+
+
+class RecoveryCache:
+    """
+    Backups don't change once they're created, so this caches the results of
+    parsing each backup file, keyed by the size and hash of the file
+
+    To keep this small, this only saves data for the entries which weren't approved
+    when the backup was parsed (and the IDs of everything else). If an entry
+    is removed from the approved list later, the backup is parsed again
+
+    Results from a custom parse_func are cached separately, keyed by its name.
+    If it doesn't have a unique name (a lambda or nested function), its
+    results aren't cached
+    """
+
+    def __init__(self, cache_dir: Path = default_recovery_cache_dir) -> None:
+        self.cache_dir = cache_dir / f"v{RECOVERY_CACHE_VERSION}"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # so backups don't have to be rehashed each time
+        self.hashes_path = self.cache_dir / "hashes.json"
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        if self.hashes_path.exists():
+            self._hashes = {
+                k: (size, mtime_ns, digest)
+                for k, (size, mtime_ns, digest) in deserialize(
+                    self.hashes_path.read_bytes()
+                ).items()
+            }
+
+    def key(self, backup: Path) -> str:
+        st = backup.stat()
+        name = str(backup.absolute())
+        memo = self._hashes.get(name)
+        if memo is not None and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            digest = memo[2]
+        else:
+            digest = file_digest(backup)
+            self._hashes[name] = (st.st_size, st.st_mtime_ns, digest)
+            write_file(self.hashes_path, serialize(self._hashes).encode("utf-8"))
+        return f"{st.st_size}-{digest}"
+
+    def path(
+        self, backup: Path, username: str, parse_func: Optional[ParseFunc] = None
+    ) -> Optional[Path]:
+        """
+        Where the results of parse_func for this backup are cached,
+        or None if they can't be
+        """
+        if backup.is_dir():
+            return None
+        func_id = _parse_func_id(parse_func)
+        if func_id is None:
+            return None
+        # the parsed data includes the username, so this is per-account
+        suffix = f"-{func_id}" if func_id else ""
+        return self.cache_dir / username / f"{self.key(backup)}{suffix}.pickle"
+
+    def load(
+        self,
+        backup: Path,
+        username: str,
+        approved: "Approved",
+        parse_func: Optional[ParseFunc] = None,
+    ) -> Optional[CombineResults]:
+        """
+        Returns the unapproved entries in this backup, or None if
+        it isn't cached or has to be parsed again
+        """
+        path = self.path(backup, username, parse_func)
+        if path is None or not path.exists():
+            return None
+        with path.open("rb") as f:
+            cached: CachedBackup = pickle.load(f)
+        return cached.deleted(approved)
+
+    def save(
+        self,
+        backup: Path,
+        username: str,
+        cached: CachedBackup,
+        parse_func: Optional[ParseFunc] = None,
+    ) -> None:
+        path = self.path(backup, username, parse_func)
+        if path is None:
+            return
+        path.parent.mkdir(exist_ok=True)
+        write_file(path, pickle.dumps(cached))
+
+
 def recover_deleted_single(
     *,
     approved: Approved,
@@ -95,6 +414,7 @@ def recover_deleted_single(
     username: str,
     filter_with_activity: bool = False,
     parse_func: Optional[Callable[[Path, str], CombineResults]] = None,
+    cache: Optional[RecoveryCache] = None,
 ) -> CombineResults:
     """
     returns any data from a backup that is not in the approved list
@@ -105,87 +425,162 @@ def recover_deleted_single(
 
     assert from_backup_dir.exists(), f"Backup dir {from_backup_dir} does not exist"
 
-    new_anime, new_manga = parse_func(from_backup_dir, username)
+    deleted = (
+        cache.load(from_backup_dir, username, approved, parse_func)
+        if cache is not None
+        else None
+    )
+    if deleted is None:
+        parsed = CachedBackup.from_results(
+            parse_func(from_backup_dir, username), approved
+        )
+        if cache is not None:
+            cache.save(from_backup_dir, username, parsed, parse_func)
+        deleted = parsed.deleted(approved)
+        assert deleted is not None
 
-    deleted_anime = [new for new in new_anime if new.id not in approved.anime]
-    deleted_manga = [new for new in new_manga if new.id not in approved.manga]
+    return _filter_activity(deleted, filter_with_activity)
 
-    if filter_with_activity:
-        deleted_anime = [a for a in deleted_anime if len(a.history) > 0]
-        deleted_manga = [m for m in deleted_manga if len(m.history) > 0]
 
-    return deleted_anime, deleted_manga
+def _filter_activity(
+    results: CombineResults, filter_with_activity: bool
+) -> CombineResults:
+    if not filter_with_activity:
+        return results
+    anime, manga = results
+    return (
+        [a for a in anime if len(a.history) > 0],
+        [m for m in manga if len(m.history) > 0],
+    )
 
 
-EXPECTED_FILES = (
-    "forum",
-    "messages",
-    "friends.json",
-    "animelist.json",
-    "mangalist.json",
+# set in each worker process, so the approved IDs are only sent once per process
+_worker_approved: Optional[Approved] = None
+
+
+def _init_worker(approved: Approved) -> None:
+    global _worker_approved
+    _worker_approved = approved
+
+
+def _parse_in_worker(
+    backup: Path,
+    username: str,
+    parse_func: Callable[[Path, str], CombineResults],
+) -> CachedBackup:
+    # only the unapproved entries are sent back to the main process
+    assert _worker_approved is not None, "worker wasn't initialized"
+    return CachedBackup.from_results(parse_func(backup, username), _worker_approved)
+
+
+# files (relative to the data directory) which combine reads
+COMBINE_FILES = {
     "animelist.xml",
     "mangalist.xml",
+    "animelist.xml.gz",
+    "mangalist.xml.gz",
+    "animelist.json",
+    "mangalist.json",
     "animelist_api.json",
     "mangalist_api.json",
-)
+    "anime_history.json",
+    "manga_history.json",
+    "manual_history.yaml",
+}
+COMBINE_DIRS = ("history/anime/", "history/manga/")
 
+EXPORT_NAMES = ("animelist.xml", "animelist.xml.gz")
 
-def recover_deleted(
-    *,
-    approved: Approved,
-    backups: List[Path],
-    username: str,
-    filter_with_activity: bool = False,
-    parse_func: Optional[Callable[[Path, str], CombineResults]] = None,
-    logger: Optional[logging.Logger] = None,
-) -> CombineResults:
-    """
-    parses each backup in reverse order using parse_func, and returns the
-    most recent data for each deleted entry
 
-    if filter_with_activity is True, this only returns items which
-    have some history activity (watched/read episodes/chapters)
+def _find_data_root(names: Iterable[str]) -> Optional[str]:
+    """
+    Given the paths in a backup, find the prefix of the data directory,
+    i.e. the directory which contains the anime XML export
     """
+    for name in names:
+        base = posixpath.basename(name)
+        if base in EXPORT_NAMES:
+            return name[: -len(base)]
+    return None
 
-    uselogger = logger or mlog
 
-    if parse_func is None:
-        try:
-            import my.core.structure
-        except ImportError:
-            uselogger.error(
-                f"my.core.structure module not found, cannot parse backups, install by running `{sys.executable} -m pip install hpi`",
-            )
-            sys.exit(1)
-        else:
+def _combine_needs(rel: str) -> bool:
+    if ".." in rel.split("/"):
+        return False
+    if rel.endswith(ZSTD_SUFFIX):
+        rel = rel[: -len(ZSTD_SUFFIX)]
+    return rel in COMBINE_FILES or rel.startswith(COMBINE_DIRS)
 
-            def _parse_func(backup_dir: Path, username: str) -> CombineResults:
-                with my.core.structure.match_structure(
-                    backup_dir,
-                    EXPECTED_FILES,
-                    partial=True,
-                ) as res:
-                    assert len(res) == 1, f"Expected 1 match, got {len(res)}: {res}"
-                    return combine(username, data_dir=res[0])
 
-            assert _parse_func is not None
-            parse_func = _parse_func
+@contextmanager
+def extract_combine_files(zip_path: Path) -> Iterator[Path]:
+    """
+    Extract only the files which combine reads from a zip backup to a
+    temporary directory, so the rest of the archive (messages, forum
+    posts, friends) is never decompressed
+    """
+    with zipfile.ZipFile(zip_path) as zf, tempfile.TemporaryDirectory() as tmp:
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+        root = _find_data_root(info.filename for info in infos)
+        if root is None:
+            raise ValueError(f"Could not find an XML export in {zip_path}")
+        for info in infos:
+            if not info.filename.startswith(root):
+                continue
+            rel = info.filename[len(root) :]
+            if not _combine_needs(rel):
+                continue
+            target = Path(tmp) / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with zf.open(info) as src, target.open("wb") as dst:
+                shutil.copyfileobj(src, dst)
+        yield Path(tmp)
+
+
+@contextmanager
+def extract_snapshot_combine_files(snapshot: Path) -> Iterator[Path]:
+    """
+    Like extract_combine_files, for a snapshot created by 'backup --incremental'
+    """
+    store = SnapshotStore.from_snapshot_path(snapshot)
+    with tempfile.TemporaryDirectory() as tmp:
+        # snapshots are of the data directory, so the paths don't have a prefix
+        store.restore(snapshot.stem, tmp, include=_combine_needs)
+        yield Path(tmp)
 
-    assert parse_func is not None
 
+def parse_backup(backup: Path, username: str) -> CombineResults:
+    """
+    Parse a backup, either a zip file, a snapshot file
+    or a (possibly nested) data directory
+    """
+    if backup.is_dir():
+        names = (
+            Path(root, name).relative_to(backup).as_posix()
+            for root, _, files in os.walk(backup)
+            for name in files
+        )
+        root = _find_data_root(names)
+        if root is None:
+            raise ValueError(f"Could not find an XML export in {backup}")
+        return combine(username, data_dir=backup / root)
+    if is_snapshot_path(backup):
+        with extract_snapshot_combine_files(backup) as data_dir:
+            return combine(username, data_dir=data_dir)
+    with extract_combine_files(backup) as data_dir:
+        return combine(username, data_dir=data_dir)
+
+
+def _merge_newest_first(results: Iterable[CombineResults]) -> CombineResults:
+    """
+    results should be ordered newest backup first; returns the
+    data from the most recent backup for each entry
+    """
     emitted_entries: Set[Tuple[int, str]] = set()
     emit_anime: List[AnimeData] = []
     emit_manga: List[MangaData] = []
 
-    for backup in reversed(backups):
-        uselogger.debug(f"Recovering deleted entries from {backup}")
-        anime, manga = recover_deleted_single(
-            approved=approved,
-            from_backup_dir=backup,
-            username=username,
-            parse_func=parse_func,
-            filter_with_activity=filter_with_activity,
-        )
+    for anime, manga in results:
         for a in anime:
             if (a.id, "anime") not in emitted_entries:
                 emit_anime.append(a)
@@ -196,3 +591,119 @@ def recover_deleted(
                 emitted_entries.add((m.id, "manga"))
 
     return emit_anime, emit_manga
+
+
+def recover_deleted_accounts(
+    *,
+    approved: Approved,
+    backups: Dict[str, List[Path]],
+    filter_with_activity: bool = False,
+    parse_func: Optional[Callable[[Path, str], CombineResults]] = None,
+    logger: Optional[logging.Logger] = None,
+    cache: Optional[RecoveryCache] = None,
+    workers: int = RECOVER_WORKERS,
+) -> Dict[str, CombineResults]:
+    """
+    recovers deleted entries for multiple accounts (username -> backups, oldest first)
+
+    backups which aren't cached are parsed in a pool of worker processes
+    (one backup per task), so parse_func has to be a module-level function
+    which can be pickled. The approved IDs are sent to each worker once,
+    and only the unapproved entries are sent back
+    """
+
+    uselogger = logger or mlog
+
+    if parse_func is None:
+        parse_func = parse_backup
+
+    # (username, backup) -> deleted entries in that backup
+    deleted: Dict[Tuple[str, Path], CombineResults] = {}
+    to_parse: List[Tuple[str, Path]] = []
+    for username, user_backups in backups.items():
+        for backup in reversed(user_backups):
+            assert backup.exists(), f"Backup {backup} does not exist"
+            cached = (
+                cache.load(backup, username, approved, parse_func)
+                if cache is not None
+                else None
+            )
+            if cached is not None:
+                uselogger.debug(f"Using cached results for {backup}")
+                deleted[(username, backup)] = cached
+            else:
+                to_parse.append((username, backup))
+
+    def _store(username: str, backup: Path, parsed: CachedBackup) -> None:
+        if cache is not None:
+            cache.save(backup, username, parsed, parse_func)
+        result = parsed.deleted(approved)
+        assert result is not None
+        deleted[(username, backup)] = result
+
+    if workers <= 1 or len(to_parse) <= 1:
+        for username, backup in to_parse:
+            uselogger.debug(f"Recovering deleted entries from {backup}")
+            parsed = CachedBackup.from_results(parse_func(backup, username), approved)
+            _store(username, backup, parsed)
+    else:
+        uselogger.debug(
+            f"Recovering deleted entries from {len(to_parse)} backups with {workers} processes"
+        )
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(to_parse)),
+            initializer=_init_worker,
+            initargs=(approved,),
+        ) as pool:
+            futures: Dict[Tuple[str, Path], Future[CachedBackup]] = {
+                (username, backup): pool.submit(
+                    _parse_in_worker, backup, username, parse_func
+                )
+                for username, backup in to_parse
+            }
+            for (username, backup), fut in futures.items():
+                _store(username, backup, fut.result())
+                uselogger.debug(f"Recovered deleted entries from {backup}")
+
+    return {
+        username: _merge_newest_first(
+            _filter_activity(deleted[(username, backup)], filter_with_activity)
+            for backup in reversed(user_backups)
+        )
+        for username, user_backups in backups.items()
+    }
+
+
+def recover_deleted(
+    *,
+    approved: Approved,
+    backups: List[Path],
+    username: str,
+    filter_with_activity: bool = False,
+    parse_func: Optional[Callable[[Path, str], CombineResults]] = None,
+    logger: Optional[logging.Logger] = None,
+    cache: Optional[RecoveryCache] = None,
+    workers: int = RECOVER_WORKERS,
+) -> CombineResults:
+    """
+    parses each backup in reverse order using parse_func, and returns the
+    most recent data for each deleted entry
+
+    if filter_with_activity is True, this only returns items which
+    have some history activity (watched/read episodes/chapters)
+
+    if a cache is passed, backups which have already been
+    parsed use the cached results instead
+
+    backups are parsed in parallel using workers processes, see
+    recover_deleted_accounts
+    """
+    return recover_deleted_accounts(
+        approved=approved,
+        backups={username: backups},
+        filter_with_activity=filter_with_activity,
+        parse_func=parse_func,
+        logger=logger,
+        cache=cache,
+        workers=workers,
+    )[username]
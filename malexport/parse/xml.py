@@ -1,4 +1,6 @@
-from typing import NamedTuple, Optional, Union, Any, Dict, List
+import gzip
+from pathlib import Path
+from typing import NamedTuple, Optional, Union, Any, Dict, List, Iterator, IO, cast
 from datetime import date
 
 
@@ -6,7 +8,7 @@ import lxml.etree as ET  # type: ignore[import]
 
 from ..paths import _expand_file, PathIsh
 from ..list_type import ListType
-from .common import parse_date_safe, strtobool
+from .common import parse_date_safe, strtobool, intern_str
 
 # hmm.. can't figure out the types for this
 XMLElement = Any
@@ -49,26 +51,26 @@ class AnimeXML(NamedTuple):
         return cls(
             anime_id=int(anime_el.find("series_animedb_id").text),
             title=anime_el.find("series_title").text,
-            media_type=anime_el.find("series_type").text,
+            media_type=intern_str(anime_el.find("series_type").text),
             episodes=int(anime_el.find("series_episodes").text),
             my_id=int(anime_el.find("my_id").text),
             watched_episodes=int(anime_el.find("my_watched_episodes").text),
             start_date=parse_date_safe(anime_el.find("my_start_date").text),
             finish_date=parse_date_safe(anime_el.find("my_finish_date").text),
-            rated=anime_el.find("my_rated").text,
+            rated=intern_str(anime_el.find("my_rated").text),
             score=int(anime_el.find("my_score").text),
-            storage=anime_el.find("my_storage").text,
+            storage=intern_str(anime_el.find("my_storage").text),
             storage_value=float(anime_el.find("my_storage_value").text),
-            status=anime_el.find("my_status").text,
+            status=intern_str(anime_el.find("my_status").text),
             comments=anime_el.find("my_comments").text,
             times_watched=int(anime_el.find("my_times_watched").text),
-            rewatch_value=anime_el.find("my_rewatch_value").text,
-            priority=anime_el.find("my_priority").text,
+            rewatch_value=intern_str(anime_el.find("my_rewatch_value").text),
+            priority=intern_str(anime_el.find("my_priority").text),
             tags=anime_el.find("my_tags").text,
             rewatching=strtobool(anime_el.find("my_rewatching").text),
             rewatching_ep=int(anime_el.find("my_rewatching_ep").text),
             discuss=strtobool(anime_el.find("my_discuss").text),
-            sns=anime_el.find("my_sns").text,
+            sns=intern_str(anime_el.find("my_sns").text),
             update_on_import=strtobool(anime_el.find("update_on_import").text),
         )
 
@@ -116,17 +118,17 @@ class MangaXML(NamedTuple):
             finish_date=parse_date_safe(manga_el.find("my_finish_date").text),
             scanlation_group=manga_el.find("my_scanalation_group").text,
             score=int(manga_el.find("my_score").text),
-            storage=manga_el.find("my_storage").text,
+            storage=intern_str(manga_el.find("my_storage").text),
             retail_volumes=int(manga_el.find("my_retail_volumes").text),
-            status=manga_el.find("my_status").text,
+            status=intern_str(manga_el.find("my_status").text),
             comments=manga_el.find("my_comments").text,
             times_read=int(manga_el.find("my_times_read").text),
             tags=manga_el.find("my_tags").text,
-            priority=manga_el.find("my_priority").text,
-            reread_value=manga_el.find("my_reread_value").text,
+            priority=intern_str(manga_el.find("my_priority").text),
+            reread_value=intern_str(manga_el.find("my_reread_value").text),
             rereading=strtobool(manga_el.find("my_rereading").text),
             discuss=strtobool(manga_el.find("my_discuss").text),
-            sns=manga_el.find("my_sns").text,
+            sns=intern_str(manga_el.find("my_sns").text),
             update_on_import=strtobool(manga_el.find("update_on_import").text),
         )
 
@@ -151,7 +153,8 @@ class XMLExport(NamedTuple):
 
     @classmethod
     def parse(cls, xml_file: str) -> "XMLExport":
-        tree = ET.parse(xml_file)
+        with open_xml(xml_file) as f:
+            tree = ET.parse(f)
         root = tree.getroot()
         info = cls._parse_info(root.find("myinfo"))
         export_type = int(info["user_export_type"])
@@ -167,5 +170,46 @@ class XMLExport(NamedTuple):
         return cls(info=info, entries=entries, list_type=list_type.value.lower())
 
 
+def open_xml(xml_file: PathIsh) -> IO[bytes]:
+    """
+    Open an XML export for reading. If it's gzipped (like the files
+    MAL exports), this decompresses it while it's being read
+    """
+    path = _expand_file(xml_file)
+    if path.suffix == ".gz":
+        return cast(IO[bytes], gzip.open(path, "rb"))
+    return path.open("rb")
+
+
+def export_path(data_dir: Path, list_type: ListType) -> Path:
+    """
+    The XML export for a list type in a data directory. Exports are stored
+    gzipped, but if only an uncompressed export exists (e.g. one extracted
+    by an older version of malexport), that is used instead
+    """
+    gz_file = data_dir / f"{list_type.value}list.xml.gz"
+    xml_file = data_dir / f"{list_type.value}list.xml"
+    if not gz_file.exists() and xml_file.exists():
+        return xml_file
+    return gz_file
+
+
 def parse_xml(xml_file: PathIsh) -> XMLExport:
     return XMLExport.parse(str(_expand_file(xml_file)))
+
+
+def iter_xml_entries(xml_file: PathIsh) -> Iterator[Entry]:
+    """
+    Lazily parse entries from an XML export, clearing each
+    element once it's been parsed so memory stays bounded
+    """
+    with open_xml(xml_file) as f:
+        for _, el in ET.iterparse(f, events=("end",), tag=("anime", "manga")):
+            if el.tag == "anime":
+                yield AnimeXML._parse(el)
+            else:
+                yield MangaXML._parse(el)
+            el.clear()
+            # remove references to the already parsed siblings
+            while el.getprevious() is not None:
+                del el.getparent()[0]
@@ -5,7 +5,7 @@ Relating to storing credentials and handling location of the data/config directo
 import os
 import json
 from pathlib import Path
-from typing import Union, Dict
+from typing import Union, Dict, Iterator
 
 import yaml
 import click
@@ -45,6 +45,12 @@ if "MALEXPORT_CFG" in os.environ:
 default_data_dir.mkdir(exist_ok=True, parents=True)
 default_conf_dir.mkdir(exist_ok=True, parents=True)
 
+# JSON files in the data directory can be stored zstd compressed, with this suffix
+ZSTD_SUFFIX = ".zst"
+
+# a dictionary trained on the JSON files in a directory, used to compress them
+ZSTD_DICT_NAME = "zstd.dict"
+
 
 def _expand_path(pathish: PathIsh, is_dir: bool = True) -> Path:
     """
@@ -71,6 +77,49 @@ def _expand_file(pathish: PathIsh) -> Path:
     return _expand_path(pathish, is_dir=False)
 
 
+def compressed_path(path: PathIsh) -> Path:
+    p = Path(path)
+    return p.with_name(p.name + ZSTD_SUFFIX)
+
+
+def stored_path(path: PathIsh) -> Path:
+    """
+    Given the path to a JSON file, returns whichever of the plain or
+    compressed (.zst) file exists. If neither exist, returns the plain path
+    """
+    p = Path(path)
+    if p.exists():
+        return p
+    zst = compressed_path(p)
+    if zst.exists():
+        return zst
+    return p
+
+
+def json_exists(path: PathIsh) -> bool:
+    return stored_path(path).exists()
+
+
+def iter_json_files(directory: PathIsh) -> Iterator[Path]:
+    """
+    Yields the (plain) path of each JSON file in a directory,
+    whether or not it's stored compressed
+    """
+    d = Path(directory)
+    if not d.exists():
+        return
+    seen = set()
+    for p in d.iterdir():
+        name = p.name
+        if name.endswith(".json" + ZSTD_SUFFIX):
+            name = name[: -len(ZSTD_SUFFIX)]
+        elif not name.endswith(".json"):
+            continue
+        if name not in seen:
+            seen.add(name)
+            yield d / name
+
+
 class LocalDir:
     def __init__(self, application_base: Path, config_base: Path, username: str):
         self.application_base: Path = _expand_path(application_base)
@@ -0,0 +1,168 @@
+"""
+Incremental, deduplicated backups of a data directory
+
+Each file is stored once, as a compressed blob named by the hash of its
+contents, and each snapshot is a manifest which maps the files in the data
+directory to those blobs. Creating a snapshot only has to hash/store the
+files which changed since the previous one
+"""
+
+import zlib
+import hashlib
+import zipfile
+from pathlib import Path
+from datetime import datetime
+from typing import NamedTuple, List, Optional, Callable
+
+from .paths import PathIsh, default_zip_base, _expand_path
+from .manifest import Manifest, ManifestEntry
+from .common import write_file
+from .log import logger
+
+SNAPSHOT_SUFFIX = ".json"
+# the directory in the store which has the snapshot manifests
+SNAPSHOT_DIR = "snapshots"
+COMPRESSION_LEVEL = 6
+
+
+class SnapshotResult(NamedTuple):
+    name: str
+    files: int
+    new_blobs: int
+    new_bytes: int
+
+
+class SnapshotStore:
+    """
+    A directory of snapshots for one account. By default, the snapshots are
+    stored in malexport_zips/<username>/snapshots, next to the zip backups,
+    and the files in malexport_zips/<username>/blobs
+    """
+
+    def __init__(self, base: PathIsh) -> None:
+        self.base = _expand_path(base)
+        self.blob_dir = _expand_path(self.base / "blobs")
+        self.snapshot_dir = _expand_path(self.base / SNAPSHOT_DIR)
+
+    @classmethod
+    def from_username(cls, username: str) -> "SnapshotStore":
+        return cls(default_zip_base / username)
+
+    @classmethod
+    def from_snapshot_path(cls, path: Path) -> "SnapshotStore":
+        """
+        The store which a snapshot file (see snapshot_paths) is in
+        """
+        return cls(path.parent.parent)
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def snapshots(self) -> List[str]:
+        """Names of the snapshots, oldest first"""
+        return sorted(
+            p.name[: -len(SNAPSHOT_SUFFIX)]
+            for p in self.snapshot_dir.glob(f"*{SNAPSHOT_SUFFIX}")
+        )
+
+    def load(self, name: str) -> Manifest:
+        path = self.snapshot_dir / f"{name}{SNAPSHOT_SUFFIX}"
+        if not path.exists():
+            raise FileNotFoundError(f"No snapshot named {name} in {self.snapshot_dir}")
+        return Manifest.load(path)
+
+    def latest(self) -> Optional[str]:
+        names = self.snapshots()
+        return names[-1] if names else None
+
+    def read_blob(self, digest: str) -> bytes:
+        return zlib.decompress(self.blob_path(digest).read_bytes())
+
+    def _store_blob(self, data: bytes, digest: str) -> int:
+        path = self.blob_path(digest)
+        if path.exists():
+            return 0
+        path.parent.mkdir(exist_ok=True)
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        write_file(path, compressed)
+        return len(compressed)
+
+    def create(self, data_dir: PathIsh, name: str) -> SnapshotResult:
+        """
+        Snapshot the data directory. Files with the same size/mtime as
+        in the previous snapshot aren't read, and blobs which
+        are already stored aren't written again
+        """
+        base = Path(data_dir)
+        latest = self.latest()
+        previous = self.load(latest) if latest is not None else None
+        manifest = Manifest.scan(base, previous=previous)
+        new_blobs, new_bytes = 0, 0
+        for rel, ent in manifest.files.items():
+            if self.blob_path(ent.sha256).exists():
+                continue
+            data = (base / rel).read_bytes()
+            digest = hashlib.sha256(data).hexdigest()
+            if digest != ent.sha256:
+                # changed since it was scanned, store what was just read
+                manifest.files[rel] = ManifestEntry(
+                    size=len(data), mtime_ns=ent.mtime_ns, sha256=digest
+                )
+            written = self._store_blob(data, digest)
+            if written > 0:
+                new_blobs += 1
+                new_bytes += written
+        manifest.save(self.snapshot_dir / f"{name}{SNAPSHOT_SUFFIX}")
+        logger.info(
+            f"Created snapshot {name}: {len(manifest.files)} files, {new_blobs} new blobs ({new_bytes} bytes)"
+        )
+        return SnapshotResult(
+            name=name,
+            files=len(manifest.files),
+            new_blobs=new_blobs,
+            new_bytes=new_bytes,
+        )
+
+    def export_zip(self, name: str, zip_path: PathIsh) -> None:
+        """
+        Write a snapshot as a zip file, like the ones created
+        by 'malexport recover-deleted backup'
+        """
+        manifest = self.load(name)
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for rel, ent in sorted(manifest.files.items()):
+                mtime = datetime.fromtimestamp(ent.mtime_ns / 1e9)
+                info = zipfile.ZipInfo(f"./{rel}", date_time=mtime.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_DEFLATED
+                zf.writestr(info, self.read_blob(ent.sha256))
+
+    def restore(
+        self,
+        name: str,
+        target_dir: PathIsh,
+        include: Optional[Callable[[str], bool]] = None,
+    ) -> Path:
+        """
+        Write the files from a snapshot to a directory. If include is
+        given, only writes the files (relative paths) it returns True for
+        """
+        target = _expand_path(target_dir)
+        for rel, ent in self.load(name).files.items():
+            if include is not None and not include(rel):
+                continue
+            path = target / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(self.read_blob(ent.sha256))
+        return target
+
+
+def snapshot_paths(base: PathIsh) -> List[Path]:
+    """
+    The snapshot files in a store (e.g. malexport_zips/<username>), oldest
+    first, without creating the store if it doesn't exist
+    """
+    return sorted(Path(base).glob(f"{SNAPSHOT_DIR}/*{SNAPSHOT_SUFFIX}"))
+
+
+def is_snapshot_path(path: Path) -> bool:
+    return path.suffix == SNAPSHOT_SUFFIX and path.parent.name == SNAPSHOT_DIR
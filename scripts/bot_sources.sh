@@ -30,7 +30,7 @@ mal_open_aired() {
 }
 
 mal_my_anime_ids() {
-	malexport parse xml "${MALEXPORT_DIR}/${MAL_USERNAME}"/animelist.xml | jq '.entries | .[] | .anime_id' -r | sort
+	malexport parse xml "${MALEXPORT_DIR}/${MAL_USERNAME}"/animelist.xml.gz | jq '.entries | .[] | .anime_id' -r | sort
 }
 
 mal_all_anime_ids() {
@@ -0,0 +1,70 @@
+"""
+Measures how much memory is used to hold the combined data for
+multiple accounts, with and without sharing repeated values
+(statuses, media types, genres, studios, seasons) across entries
+
+Runs once with MALEXPORT_INTERN_VALUES=0 and once with
+MALEXPORT_INTERN_VALUES=1, each in a separate process
+
+python3 ./scripts/combine_memory.py -u user1 -u user2 -u user3
+"""
+
+import os
+import sys
+import time
+import subprocess
+import tracemalloc
+from typing import List, Tuple
+
+import click
+
+
+def measure(usernames: List[str]) -> Tuple[int, int, float]:
+    from malexport.parse.combine import combine
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    # hold onto everything, like you would when analyzing multiple accounts
+    results = [combine(username) for username in usernames]
+    took = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(results) == len(usernames)
+    return current, peak, took
+
+
+@click.command(help=__doc__)
+@click.option(
+    "-u",
+    "--username",
+    "usernames",
+    multiple=True,
+    required=True,
+    help="Accounts to combine",
+)
+@click.option("--child", is_flag=True, hidden=True)
+def main(usernames: Tuple[str, ...], child: bool) -> None:
+    if child:
+        current, peak, took = measure(list(usernames))
+        click.echo(f"{current} {peak} {took}")
+        return
+
+    user_args = [arg for u in usernames for arg in ("-u", u)]
+    for intern in ("0", "1"):
+        env = dict(os.environ, MALEXPORT_INTERN_VALUES=intern)
+        out = subprocess.check_output(
+            [sys.executable, __file__, "--child", *user_args], env=env, text=True
+        )
+        current, peak, took = out.split()
+        click.echo(
+            "MALEXPORT_INTERN_VALUES={}: retained {:.2f} MB, peak {:.2f} MB, took {:.2f}s".format(
+                intern,
+                int(current) / 1024**2,
+                int(peak) / 1024**2,
+                float(took),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
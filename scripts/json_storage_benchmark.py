@@ -0,0 +1,71 @@
+"""
+Compares reading the JSON files for an account stored as plain JSON
+against reading them zstd compressed
+
+Copies the data directory to a temporary directory, and then times
+reading every JSON file (with malexport.common.read_json):
+
+- as plain JSON
+- compressed, without any dictionaries
+- compressed, with a dictionary trained for directories with lots of files
+
+python3 ./scripts/json_storage_benchmark.py -u username
+"""
+
+import os
+import time
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List
+
+import click
+from malexport.__main__ import USERNAME
+from malexport.paths import LocalDir, iter_json_files, stored_path
+from malexport import common
+from malexport.common import read_json, rewrite_data_dir
+
+
+def json_files(data_dir: Path) -> List[Path]:
+    return [p for root, _, _ in os.walk(data_dir) for p in iter_json_files(Path(root))]
+
+
+def best_of(files: List[Path], runs: int) -> float:
+    times: List[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for f in files:
+            read_json(f)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@click.command(help=__doc__)
+@USERNAME
+@click.option("-r", "--runs", default=5, help="number of times to read the files")
+def main(username: str, runs: int) -> None:
+    data_dir = LocalDir.from_username(username).data_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / username
+        shutil.copytree(data_dir, copy)
+        files = json_files(copy)
+        rewrite_data_dir(copy, compress=False)
+        size = sum(stored_path(f).stat().st_size for f in files)
+        click.echo(f"Reading {len(files)} files ({size / 1024**2:.2f} MB of JSON)")
+
+        min_files = common.ZSTD_DICT_MIN_FILES
+        for name, compress, dict_min_files in (
+            ("plain", False, min_files),
+            ("zstd", True, len(files) + 1),
+            ("zstd+dictionary", True, min_files),
+        ):
+            common.ZSTD_DICT_MIN_FILES = dict_min_files
+            on_disk = rewrite_data_dir(copy, compress=compress).after
+            took = best_of(files, runs)
+            click.echo(
+                f"{name:>16}: {on_disk / 1024**2:8.2f} MB on disk {took * 1000:8.1f}ms {len(files) / took:10.0f} files/s {size / 1024**2 / took:8.1f} MB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
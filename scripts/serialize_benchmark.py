@@ -0,0 +1,81 @@
+"""
+Compares how fast the combined data for an account can be serialized to JSON
+
+Repeats the combined anime/manga entries till there are --count entries,
+and then times:
+
+- the previous approach (orjson, calling _asdict on each NamedTuple)
+- malexport.common.serialize
+- malexport.common.write_json_array, streaming to /dev/null
+- simplejson, which is used if orjson isn't installed
+
+python3 ./scripts/serialize_benchmark.py -u username
+"""
+
+import os
+import time
+from itertools import cycle, islice
+from typing import Any, Callable, List
+
+import click
+import simplejson
+from malexport.__main__ import USERNAME
+from malexport.common import (
+    serialize,
+    write_json_array,
+    default_encoder,
+    _default_encoder,
+    HAS_ORJSON,
+)
+from malexport.parse.combine import combine
+
+
+def best_of(func: Callable[[], Any], runs: int) -> float:
+    times: List[float] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+@click.command(help=__doc__)
+@USERNAME
+@click.option("-c", "--count", default=10_000, help="number of entries to serialize")
+@click.option("-r", "--runs", default=5, help="number of times to run each")
+def main(username: str, count: int, runs: int) -> None:
+    anime, manga = combine(username)
+    entries: List[Any] = list(islice(cycle([*anime, *manga]), count))
+    size = len(serialize(entries).encode("utf-8"))
+    click.echo(f"Serializing {len(entries)} entries ({size / 1024**2:.2f} MB)")
+
+    def _devnull() -> None:
+        with open(os.devnull, "w") as f:
+            write_json_array(entries, f)
+
+    funcs = {
+        "serialize": lambda: serialize(entries),
+        "write_json_array": _devnull,
+        "simplejson": lambda: simplejson.dumps(
+            entries, default=default_encoder, namedtuple_as_object=True
+        ),
+    }
+    if HAS_ORJSON:
+        import orjson  # type: ignore[import]
+
+        funcs = {
+            "orjson+_asdict": lambda: orjson.dumps(
+                entries, default=_default_encoder
+            ).decode("utf-8"),
+            **funcs,
+        }
+
+    for name, func in funcs.items():
+        took = best_of(func, runs)
+        click.echo(
+            f"{name:>20}: {took * 1000:8.1f}ms {len(entries) / took:10.0f} entries/s {size / 1024**2 / took:8.1f} MB/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,54 +6,68 @@ it can imported to anilist without cloudflare timing out
 """
 
 from functools import partial
-from typing import Tuple
+from typing import Optional, IO, Any, Iterator
 from pathlib import Path
 
 import click
 import lxml.etree as ET
 from malexport.list_type import ListType
 from malexport.paths import LocalDir
-from malexport.exporter import ExportDownloader
+from malexport.parse.xml import open_xml, export_path
 
 REMOVE_ATTRS = set(["my_tags"])
 
 
-def remove_attrs(
+def has_activity(entry: Any, media_type: ListType) -> bool:
+    # if this has some sort of activity
+    has_score = str(entry.find("my_score").text).strip() != "0"
+    start_date = str(entry.find("my_start_date").text).strip()
+    has_start_date: bool = len(start_date) > 0 and not start_date.startswith("0000")
+    completed: bool = str(entry.find("my_status").text).strip() == "Completed"
+    # episodes or chapters
+    tag_name = (
+        "my_watched_episodes" if media_type == ListType.ANIME else "my_read_chapters"
+    )
+    has_progress: bool = str(entry.find(tag_name).text).strip() != "0"
+    return has_start_date or has_score or completed or has_progress
+
+
+def _free(entry: Any) -> None:
+    # free the parsed entry (and any previous ones)
+    entry.clear()
+    while entry.getprevious() is not None:
+        del entry.getparent()[0]
+
+
+def iter_entries(
     xml_file: Path, media_type: ListType, filter_activity: bool
-) -> Tuple[str, int]:
-    tree = ET.parse(str(xml_file))
-    root = tree.getroot()
-    root.remove(root.find("myinfo"))
-    for entry in root.findall(media_type.value):
-        for attr in entry:
-            if attr.tag in REMOVE_ATTRS:
-                entry.remove(attr)
-        if not filter_activity:
-            continue
-        # if this has some sort of activity
-        has_score = str(entry.find("my_score").text).strip() != "0"
-        start_date = str(entry.find("my_start_date").text).strip()
-        has_start_date: bool = len(start_date) > 0 and not start_date.startswith("0000")
-        completed: bool = str(entry.find("my_status").text).strip() == "Completed"
-        # episodes or chapters
-        tag_name = (
-            "my_watched_episodes"
-            if media_type == ListType.ANIME
-            else "my_read_chapters"
-        )
-        has_progress: bool = str(entry.find(tag_name).text).strip() != "0"
-        if has_start_date or has_score or completed or has_progress:
-            continue
-        root.remove(entry)
-    return ET.tostring(root, encoding="unicode"), len(root.findall(media_type.value))
-
-
-def extract_xml_range(xml_data: str, media_type: ListType, in_range: range) -> str:
-    tree = ET.fromstring(xml_data)
-    for i, tag in enumerate(tree.findall(media_type.value)):
-        if i not in in_range:
-            tree.remove(tag)
-    return str(ET.tostring(tree, encoding="unicode"))
+) -> Iterator[Any]:
+    """
+    Yields each entry to keep, with REMOVE_ATTRS removed
+
+    An entry's tail (the whitespace after it) is only parsed once the
+    parser reaches the next element, so each entry is yielded once the
+    next one is found (or the file ends), to keep the original whitespace
+    """
+    pending: Any = None
+    with open_xml(xml_file) as f:
+        for _, entry in ET.iterparse(f, events=("end",), tag=media_type.value):
+            if pending is not None:
+                yield pending
+                _free(pending)
+                pending = None
+            if not filter_activity or has_activity(entry, media_type):
+                for attr in list(entry):
+                    if attr.tag in REMOVE_ATTRS:
+                        entry.remove(attr)
+                    elif attr.text == "":
+                        # write empty CDATA blocks as self-closing tags
+                        attr.text = None
+                pending = entry
+            else:
+                _free(entry)
+        if pending is not None:
+            yield pending
 
 
 def run_type(
@@ -63,15 +77,32 @@ def run_type(
     in_dir: Path,
     filter_activity: bool,
 ) -> None:
-    cleaned_tree, element_count = remove_attrs(xml_file, media_type, filter_activity)
+    """
+    Reads through the export once, writing each entry to the current chunk
+    file as its parsed, and starting a new file every chunk_size entries
+    """
     m = media_type.value
-    lower, upper = 0, chunk_size
-    while lower < element_count:
-        target = in_dir / f"{m}_{str(upper // chunk_size).zfill(3)}.xml"
-        click.echo(f"Chunking {m} from {lower} to {upper} to {str(target)}")
-        chunked_xml = extract_xml_range(cleaned_tree, media_type, range(lower, upper))
-        target.write_text(chunked_xml)
-        lower, upper = upper, upper + chunk_size
+    count = 0
+    chunk: Optional[IO[str]] = None
+    for entry in iter_entries(xml_file, media_type, filter_activity):
+        if count % chunk_size == 0:
+            if chunk is not None:
+                chunk.write("</myanimelist>")
+                chunk.close()
+            lower = count
+            target = in_dir / f"{m}_{str(lower // chunk_size + 1).zfill(3)}.xml"
+            click.echo(
+                f"Chunking {m} from {lower} to {lower + chunk_size} to {str(target)}"
+            )
+            chunk = target.open("w")
+            # keep the whitespace at the start of the root element
+            chunk.write("<myanimelist>" + (entry.getparent().text or ""))
+        assert chunk is not None
+        chunk.write(ET.tostring(entry, encoding="unicode"))
+        count += 1
+    if chunk is not None:
+        chunk.write("</myanimelist>")
+        chunk.close()
 
 
 @click.command(help=__doc__)
@@ -91,24 +122,44 @@ def run_type(
     default=False,
     help="Removes any items which don't have activity (a score, start date, on my completed, or has some episode/chapter progress)",
 )
+@click.option(
+    "--anime-file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="Anime export to chunk (.xml or .xml.gz), instead of the one in the data directory",
+)
+@click.option(
+    "--manga-file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="Manga export to chunk (.xml or .xml.gz), instead of the one in the data directory",
+)
 def main(
-    username: str, chunk_size: int, to_dir: Path, remove_items_without_activity: bool
+    username: str,
+    chunk_size: int,
+    to_dir: Path,
+    remove_items_without_activity: bool,
+    anime_file: Optional[Path],
+    manga_file: Optional[Path],
 ) -> None:
-    ex = ExportDownloader(LocalDir.from_username(username))
+    data_dir = LocalDir.from_username(username).data_dir
+    to_dir.mkdir(parents=True, exist_ok=True)
     run_with_opts = partial(
         run_type,
         chunk_size=chunk_size,
         in_dir=to_dir,
         filter_activity=remove_items_without_activity,
     )
-    if ex.animelist_path.exists():
-        run_with_opts(ex.animelist_path, ListType.ANIME)
+    animelist_path = anime_file or export_path(data_dir, ListType.ANIME)
+    mangalist_path = manga_file or export_path(data_dir, ListType.MANGA)
+    if animelist_path.exists():
+        run_with_opts(animelist_path, ListType.ANIME)
     else:
-        print(f"{ex.animelist_path} doesn't exist, run 'malexport update export' first")
-    if ex.mangalist_path.exists():
-        run_with_opts(ex.mangalist_path, ListType.MANGA)
+        print(f"{animelist_path} doesn't exist, run 'malexport update export' first")
+    if mangalist_path.exists():
+        run_with_opts(mangalist_path, ListType.MANGA)
     else:
-        print(f"{ex.mangalist_path} doesn't exist, run 'malexport update export' first")
+        print(f"{mangalist_path} doesn't exist, run 'malexport update export' first")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from malexport.parse import recover_deleted_entries
+from malexport.parse.recover_deleted_entries import ApprovedIndex
+
+COMMIT = "9c0cbdeac567671c0970c79ee99531edc2d89b0b"
+
+
+@pytest.fixture
+def index(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ApprovedIndex:
+    repo = tmp_path / "mal-id-cache"
+    (repo / "cache").mkdir(parents=True)
+    (repo / "cache" / "anime_cache.json").write_text(
+        json.dumps({"sfw": [1, 5, 20], "nsfw": [7]})
+    )
+    (repo / "cache" / "manga_cache.json").write_text(
+        json.dumps({"sfw": [2, 1000], "nsfw": []})
+    )
+    monkeypatch.setattr(recover_deleted_entries, "repo_dir", repo)
+    return ApprovedIndex(tmp_path / "approved.idx")
+
+
+def test_round_trip(index: ApprovedIndex) -> None:
+    index.build(COMMIT)
+    with index:
+        approved = index.load(COMMIT)
+        assert approved is not None
+        assert sorted(approved.anime) == [1, 5, 7, 20]
+        assert sorted(approved.manga) == [2, 1000]
+        assert len(approved.anime) == 4
+        assert 5 in approved.anime and 6 not in approved.anime
+        # built from another commit, so its stale
+        assert index.load("0" * 40) is None
+
+
+def test_wrong_magic(index: ApprovedIndex) -> None:
+    index.build(COMMIT)
+    data = index.path.read_bytes()
+    index.path.write_bytes(b"MALIDX1\n" + data[len(ApprovedIndex.MAGIC) :])
+    assert index.load(COMMIT) is None
+    index.path.write_bytes(b"garbage")
+    assert index.load(COMMIT) is None
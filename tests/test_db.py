@@ -0,0 +1,50 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List
+
+from malexport.db import build_db, query, SOURCES
+
+
+def _friend(username: str) -> Dict[str, Any]:
+    return {
+        "user": {
+            "url": f"https://myanimelist.net/profile/{username}",
+            "username": username,
+            "images": {"jpg": {"image_url": ""}},
+        },
+        "last_online": "2022-01-01T00:00:00+00:00",
+        "friends_since": "2021-01-01T00:00:00+00:00",
+    }
+
+
+def _friends(db_path: Path) -> List[str]:
+    return [
+        row["friend"]
+        for row in query("SELECT friend FROM friends ORDER BY friend", db_path=db_path)
+    ]
+
+
+def test_rebuild_changed_sources(tmp_path: Path) -> None:
+    data_dir = tmp_path / "user"
+    data_dir.mkdir()
+    friends_path = data_dir / "friends.json"
+    friends_path.write_text(json.dumps([_friend("a")]))
+    db_path = tmp_path / "db.sqlite"
+
+    assert build_db("user", db_path, data_dir) == [s.name for s in SOURCES]
+    assert _friends(db_path) == ["a"]
+
+    # nothing changed, so nothing is loaded again
+    assert build_db("user", db_path, data_dir) == []
+
+    friends_path.write_text(json.dumps([_friend("a"), _friend("b")]))
+    st = friends_path.stat()
+    os.utime(friends_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert build_db("user", db_path, data_dir) == ["friends"]
+    assert _friends(db_path) == ["a", "b"]
+
+    # same size, only the mtime changed
+    os.utime(friends_path, ns=(st.st_atime_ns, st.st_mtime_ns + 2 * 10**9))
+    assert build_db("user", db_path, data_dir) == ["friends"]
+    assert _friends(db_path) == ["a", "b"]
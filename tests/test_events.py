@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from malexport.events import EventLog, Event
+
+
+def test_emit_after_partial_write(tmp_path: Path) -> None:
+    log = EventLog(tmp_path)
+    log.emit_many([Event(100, "history.added", {"id": 1})])
+
+    # killed while writing the next event, so the line is incomplete
+    with log.path.open("ab") as f:
+        f.write(b'{"at": 200, "type": "history.ad')
+
+    log.emit_many([Event(300, "history.added", {"id": 2})])
+
+    assert [e.data["id"] for e in log.since()] == [1, 2]
+    assert [e.at for e in log.since(200)] == [300]
+
+
+def test_since_boundaries(tmp_path: Path) -> None:
+    log = EventLog(tmp_path)
+    # several events at the same time, so the search has to find the first one
+    times = [100, 100, 200, 200, 200, 300, 400, 400]
+    log.emit_many([Event(at, "list.changed", {"n": n}) for n, at in enumerate(times)])
+
+    for since in [0, 99, 100, 101, 199, 200, 201, 300, 399, 400, 401, 10**10]:
+        expected = [n for n, at in enumerate(times) if at >= since]
+        assert [e.data["n"] for e in log.since(since)] == expected, since
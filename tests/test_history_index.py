@@ -0,0 +1,82 @@
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Set, Tuple
+
+from malexport.parse.history import (
+    History,
+    HistoryIndex,
+    filter_histories,
+    iter_history_from_dir,
+)
+
+Row = Tuple[str, int, str, int, datetime]
+
+
+def _rows(histories: Iterable[History]) -> Set[Row]:
+    return {
+        (h.list_type, h.mal_id, h.title, e.number, e.at)
+        for h in histories
+        for e in h.entries
+    }
+
+
+def _write_history(data_dir: Path) -> None:
+    anime_dir = data_dir / "history" / "anime"
+    anime_dir.mkdir(parents=True)
+    for mal_id in range(1, 11):
+        episodes = [[ep, 1600000000 + mal_id * 86400 + ep * 3600] for ep in range(5)]
+        (anime_dir / f"{mal_id}.json").write_text(
+            json.dumps({"title": f"anime {mal_id}", "episodes": episodes})
+        )
+    (data_dir / "manga_history.json").write_text(
+        json.dumps(
+            {
+                str(mal_id): {
+                    "title": f"manga {mal_id}",
+                    "episodes": [[1, 1600000000 + mal_id * 86400]],
+                }
+                for mal_id in range(3, 8)
+            }
+        )
+    )
+
+
+def test_filtered_index_matches_filtered_parse(tmp_path: Path) -> None:
+    data_dir = tmp_path / "data"
+    _write_history(data_dir)
+    index_file = tmp_path / "index.idx"
+    everything = list(iter_history_from_dir(data_dir))
+
+    since = datetime.fromtimestamp(1600000000 + 3 * 86400, tz=timezone.utc)
+    until = datetime.fromtimestamp(1600000000 + 7 * 86400 + 3600, tz=timezone.utc)
+    for kwargs in (
+        {"since": since},
+        {"until": until},
+        {"since": since, "until": until},
+        {"since": since, "list_type": "manga"},
+        {"mal_id": 4},
+        {"since": since, "until": until, "list_type": "anime", "mal_id": 5},
+    ):
+        # the first query builds/saves the index, the rest load it
+        index = HistoryIndex.from_dir(data_dir, index_file=index_file)
+        assert _rows(index.histories(**kwargs)) == _rows(
+            filter_histories(everything, **kwargs)
+        ), kwargs
+    assert index_file.exists()
+
+
+def test_index_rebuilt_when_history_changes(tmp_path: Path) -> None:
+    data_dir = tmp_path / "data"
+    _write_history(data_dir)
+    index_file = tmp_path / "index.idx"
+    assert len(HistoryIndex.from_dir(data_dir, index_file=index_file)) == 55
+
+    path = data_dir / "history" / "anime" / "1.json"
+    path.write_text(json.dumps({"title": "anime 1", "episodes": [[1, 1500000000]]}))
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    index = HistoryIndex.from_dir(data_dir, index_file=index_file)
+    assert len(index) == 51
+    assert _rows(index.histories()) == _rows(iter_history_from_dir(data_dir))
@@ -0,0 +1,32 @@
+from pathlib import Path
+
+from malexport.common import serialize_bytes
+from malexport.list_history import ListHistory
+
+
+def test_record_after_partial_write(tmp_path: Path) -> None:
+    hist = ListHistory(tmp_path / "animelist.jsonl")
+    first = {1: {"status": 1, "score": 0}, 2: {"status": 6, "score": 0}}
+    hist.record(first, at=100)
+
+    # killed while writing the next record, so the line is incomplete
+    partial = serialize_bytes({"at": 200, "keyframe": False, "set": {"1": {}}})
+    with hist.path.open("ab") as f:
+        f.write(partial[: len(partial) // 2])
+
+    # the partial line is ignored when reading
+    assert hist.state_at() == first
+    assert hist.timestamps() == [100]
+
+    second = {1: {"status": 2, "score": 9}, 3: {"status": 1, "score": 0}}
+    changes = hist.record(second, at=300)
+    assert set(changes.added) == {3}
+    assert set(changes.removed) == {2}
+    assert changes.changed == {1: {"status": (1, 2), "score": (0, 9)}}
+
+    # the partial line was removed before appending, so everything can be parsed
+    assert hist.path.read_bytes().endswith(b"\n")
+    assert len(hist.path.read_bytes().splitlines()) == 2
+    assert hist.timestamps() == [100, 300]
+    assert hist.state_at() == second
+    assert hist.state_at(100) == first
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import pytest
+
+from malexport.common import (
+    ZSTD_DICT_NAME,
+    read_json,
+    write_json,
+    serialize,
+    rewrite_json_dir,
+)
+from malexport.paths import compressed_path
+
+pytest.importorskip("zstandard")
+
+
+def test_write_compressed(tmp_path: Path) -> None:
+    path = tmp_path / "data.json"
+    data = {"id": 1, "entries": [[1, 1600000000], [2, 1600003600]]}
+    write_json(path, serialize(data), compress=True)
+    assert not path.exists() and compressed_path(path).exists()
+    assert read_json(path) == data
+
+    # writing it plain removes the compressed copy
+    write_json(path, serialize(data), compress=False)
+    assert path.exists() and not compressed_path(path).exists()
+    assert read_json(path) == data
+
+
+def test_rewrite_dir_with_dictionary(tmp_path: Path) -> None:
+    expected = {}
+    for i in range(200):
+        data = {
+            "id": i,
+            "title": f"Entry {i}",
+            "episodes": [[ep, 1600000000 + i * 86400 + ep] for ep in range(i % 7)],
+        }
+        expected[i] = data
+        write_json(tmp_path / f"{i}.json", serialize(data), compress=False)
+
+    stats = rewrite_json_dir(tmp_path, compress=True)
+    assert stats.files == 200
+    assert (tmp_path / ZSTD_DICT_NAME).exists()
+    for i, data in expected.items():
+        assert read_json(tmp_path / f"{i}.json") == data
+
+    rewrite_json_dir(tmp_path, compress=False)
+    assert not (tmp_path / ZSTD_DICT_NAME).exists()
+    for i, data in expected.items():
+        assert (tmp_path / f"{i}.json").exists()
+        assert read_json(tmp_path / f"{i}.json") == data
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from malexport.exporter.work_queue import (
+    WorkQueue,
+    CrawlCheckpoint,
+    TIER_RECENT,
+    TIER_MISSING,
+    TIER_STALE,
+)
+
+
+def test_queue_order(tmp_path: Path) -> None:
+    queue = WorkQueue(tmp_path / "queue")
+    queue.push(1, TIER_STALE, 300)
+    queue.push(2, TIER_STALE, 100)
+    queue.push(3, TIER_MISSING)
+    queue.push(4, TIER_RECENT)
+    # already queued, moves up to the earlier tier
+    queue.push(1, TIER_RECENT)
+    # already queued in an earlier tier, ignored
+    queue.push(3, TIER_STALE, 0)
+
+    first = queue.pop()
+    assert first is not None and first.id == 1
+    queue.done(first.id)
+    queue.save()
+
+    loaded = WorkQueue.load(queue.path)
+    assert 1 not in loaded and len(loaded) == 3
+    assert loaded.staleness_key(1) > 0
+    order = []
+    while (item := loaded.pop()) is not None:
+        order.append(item.id)
+    assert order == [4, 3, 2]
+
+
+def test_resume_checkpoint(tmp_path: Path) -> None:
+    path = tmp_path / "checkpoint"
+    checkpoint = CrawlCheckpoint(path)
+    checkpoint.start([1, 2, 3, 4])
+    checkpoint.complete(1, {"title": "one"})
+    checkpoint.complete(2)
+    checkpoint.close()
+    # killed while writing the next line
+    with path.open("ab") as f:
+        f.write(b'{"id": 3, "da')
+
+    resumed = CrawlCheckpoint(path)
+    assert resumed.load()
+    assert resumed.completed == {1: {"title": "one"}, 2: None}
+    assert resumed.remaining() == [3, 4]
+    resumed.complete(3)
+    resumed.close()
+
+    again = CrawlCheckpoint(path)
+    assert again.load()
+    assert again.remaining() == [4]
+    again.finish()
+    assert not path.exists()
+    assert not CrawlCheckpoint(path).load()